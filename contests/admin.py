@@ -17,7 +17,7 @@ class ContestAdmin(admin.ModelAdmin):
     fieldsets = (
         ('基本信息', {'fields': ('title', 'description', 'created_by', 'is_public')}),
         ('时间设置', {'fields': ('start_time', 'end_time', 'duration')}),
-        ('其他设置', {'fields': ('password', 'max_participants')}),
+        ('其他设置', {'fields': ('password', 'max_participants', 'judge_policy')}),
     )
 
 
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-17 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contests', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contest',
+            name='judge_policy',
+            field=models.CharField(choices=[('run_all', '运行全部测试点（OI）'), ('stop_on_failure', '遇错即停（ACM）')], default='run_all', max_length=20, verbose_name='判题策略'),
+        ),
+    ]
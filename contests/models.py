@@ -12,6 +12,11 @@ class Contest(models.Model):
         ('finished', '已结束'),
     ]
 
+    JUDGE_POLICY_CHOICES = [
+        ('run_all', '运行全部测试点（OI）'),
+        ('stop_on_failure', '遇错即停（ACM）'),
+    ]
+
     title = models.CharField(max_length=200, verbose_name='竞赛标题')
     description = models.TextField(verbose_name='竞赛描述')
     start_time = models.DateTimeField(verbose_name='开始时间')
@@ -21,6 +26,7 @@ class Contest(models.Model):
     is_public = models.BooleanField(default=True, verbose_name='是否公开')
     password = models.CharField(max_length=50, blank=True, verbose_name='密码')
     max_participants = models.PositiveIntegerField(null=True, blank=True, verbose_name='最大参与人数')
+    judge_policy = models.CharField(max_length=20, choices=JUDGE_POLICY_CHOICES, default='run_all', verbose_name='判题策略')
     problems = models.ManyToManyField('problems.Problem', through='ContestProblem', verbose_name='题目')
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='创建者')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
@@ -0,0 +1,203 @@
+"""
+运行准入控制 - 同时运行的用户程序按内存和 CPU 装箱，放不下时等待
+
+判题进程同时运行多个用户程序时（异步判题进程、测试用例并发），如果不加控制，
+八个内存限制 1GB 的 Java 程序可能同时启动，把主机推入 swap，所有提交的计时都会失真。
+每次运行测试用例之前向准入控制器预留资源，资源足够时才启动，运行结束后归还:
+
+    内存: 题目内存限制 × JudgeConfig.memory_limit_multiplier + 运行时开销（JVM 自身的内存，见 jvm.py）
+    CPU:  每次运行占用一个 CPU 槽位
+    语言: 每种语言同时运行的数量上限（JUDGE_ADMISSION_LANGUAGE_LIMITS，如 "java:4,python:8"）
+
+总量为 JUDGE_ADMISSION_MEMORY(MB) 和 JUDGE_ADMISSION_CPUS，为 0 时按主机（cgroup）可用内存的 80%
+和可用 CPU 数计算。监督进程模式下每个判题子进程分得总量的 1/N（见 set_admission_share）。
+单次运行需要的内存超过总量时，等到没有其他运行时按总量预留，避免永远无法启动。
+大的运行等待超过 JUDGE_ADMISSION_MAX_WAIT 秒后，不再让后来的小运行插队，直到它启动为止。
+
+开启 CPU 绑定（JUDGE_CPU_PINNING，见 affinity.py）时 CPU 槽位就是本进程分到的判题 CPU，
+每次运行分配一个空闲的 CPU 并绑定到它（判题进程本身不绑定）。
+"""
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from django.conf import settings
+from .affinity import get_cpu_layout, run_on
+
+logger = logging.getLogger(__name__)
+
+# 自动计算时使用的可用内存比例，其余留给操作系统、判题进程本身和编译
+AUTO_MEMORY_FRACTION = 0.8
+
+
+def parse_language_limits(value: str) -> Dict[str, int]:
+    """解析 "java:4,python:8" 形式的语言并发上限"""
+    limits = {}
+    for item in (value or '').split(','):
+        language, _, limit = item.partition(':')
+        if language.strip() and limit.strip():
+            limits[language.strip()] = int(limit)
+    return limits
+
+
+class AdmissionController:
+    """进程内的准入控制器（线程安全）"""
+
+    def __init__(self, memory: int, cpus: int, language_limits: Optional[Dict[str, int]] = None,
+                 max_wait: float = 5, cores: Optional[List[int]] = None):
+        """
+        memory: 内存总量(MB)，cpus: CPU 槽位数，max_wait: 等待多久后禁止其他运行插队（秒）
+        cores: 每次运行独占其中一个 CPU，指定时 CPU 槽位数为 len(cores)
+        """
+        self.memory = max(1, memory)
+        self.cpus = len(cores) if cores else max(1, cpus)
+        self.cores = list(cores) if cores else None
+        self.free_cores = list(cores) if cores else []
+        self.language_limits = language_limits or {}
+        self.max_wait = max_wait
+        self.reserved_memory = 0
+        self.reserved_cpus = 0
+        self.running: Dict[str, int] = {}
+        self.waiting: List[float] = []          # 正在等待的运行开始等待的时间
+        self.admitted = 0
+        self.delayed = 0                        # 需要等待才启动的运行数
+        self.wait_time = 0.0
+        self._condition = threading.Condition()
+
+    def _fits(self, memory: int, language: str, since: float) -> bool:
+        limit = self.language_limits.get(language)
+        if limit and self.running.get(language, 0) >= limit:
+            return False
+        if self.reserved_cpus + 1 > self.cpus or self.reserved_memory + memory > self.memory:
+            return False
+        # 有运行等待过久时，只允许最早开始等待的运行启动
+        oldest = min(self.waiting)
+        if since != oldest and time.monotonic() - oldest > self.max_wait:
+            return False
+        return True
+
+    @contextmanager
+    def admit(self, memory: int, language: str):
+        """
+        预留 memory(MB) 内存和一个 CPU 槽位，资源不足时阻塞等待
+        返回分配给这次运行的 CPU 列表，未绑定 CPU 时为 None
+        """
+        memory = min(max(0, memory), self.memory)
+        since = time.monotonic()
+        with self._condition:
+            self.waiting.append(since)
+            try:
+                while not self._fits(memory, language, since):
+                    # 定期重新检查: 等待过久的运行会改变其他运行能否插队
+                    self._condition.wait(timeout=self.max_wait or None)
+            finally:
+                self.waiting.remove(since)
+            waited = time.monotonic() - since
+            self.reserved_memory += memory
+            self.reserved_cpus += 1
+            self.running[language] = self.running.get(language, 0) + 1
+            core = self.free_cores.pop(0) if self.cores else None
+            self.admitted += 1
+            if waited > 0.001:
+                self.delayed += 1
+                self.wait_time += waited
+        try:
+            yield [core] if core is not None else None
+        finally:
+            with self._condition:
+                self.reserved_memory -= memory
+                self.reserved_cpus -= 1
+                self.running[language] -= 1
+                if core is not None:
+                    self.free_cores.append(core)
+                self._condition.notify_all()
+
+    def stats(self) -> Dict:
+        with self._condition:
+            return {
+                'memory': self.memory,
+                'reserved_memory': self.reserved_memory,
+                'cpus': self.cpus,
+                'reserved_cpus': self.reserved_cpus,
+                'cores': self.cores,
+                'waiting': len(self.waiting),
+                'admitted': self.admitted,
+                'delayed': self.delayed,
+                'avg_wait_ms': int(self.wait_time * 1000 / self.delayed) if self.delayed else 0,
+            }
+
+
+def get_run_memory(task, run_cmd: List[str]) -> int:
+    """一次运行需要预留的内存(MB): 内存限制 × 语言的内存倍数 + JVM 自身的内存开销"""
+    from .jvm import get_jvm_memory_overhead, is_jvm_command
+
+    config = task.config
+    if config is None:
+        from .config_cache import get_judge_config
+        config = get_judge_config(task.language)
+    multiplier = getattr(config, 'memory_limit_multiplier', 1.0) or 1.0
+    overhead = get_jvm_memory_overhead(run_cmd) if run_cmd and is_jvm_command(run_cmd) else 0
+    return math.ceil(task.memory_limit * multiplier) + math.ceil(overhead / 1024)
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+_share = 1
+_slot = 0
+
+
+def set_admission_share(processes: int, slot: int = 0):
+    """
+    同一主机上有 processes 个判题进程时，每个进程只使用总量的 1/processes（在子进程中调用）
+    slot: 本进程的序号（0 ~ processes-1），绑定 CPU 时各进程分到不同的判题 CPU
+    """
+    global _controller, _share, _slot
+    with _controller_lock:
+        _share = max(1, processes)
+        _slot = slot % _share
+        _controller = None
+
+
+def get_admission_controller() -> Optional[AdmissionController]:
+    """当前进程的准入控制器，JUDGE_ADMISSION_ENABLED 关闭时返回 None"""
+    global _controller
+    if not getattr(settings, 'JUDGE_ADMISSION_ENABLED', True):
+        return None
+    with _controller_lock:
+        if _controller is None:
+            from .supervisor import get_cpu_count, get_memory_limit
+            memory = getattr(settings, 'JUDGE_ADMISSION_MEMORY', 0)
+            if memory <= 0:
+                host_memory = get_memory_limit()
+                memory = int(host_memory * AUTO_MEMORY_FRACTION) // (1024 * 1024) if host_memory else 4096
+            cpus = getattr(settings, 'JUDGE_ADMISSION_CPUS', 0) or get_cpu_count()
+            cores = None
+            layout = get_cpu_layout()
+            if layout is not None:
+                reserved, judge_cpus = layout
+                cores = judge_cpus[_slot::_share]
+                if cores:
+                    logger.info(f"判题进程 CPU 绑定: 保留 CPU {reserved}，判题 CPU {cores}")
+                else:
+                    logger.warning(f"判题 CPU {judge_cpus} 少于判题进程数 {_share}，本进程不绑定 CPU")
+            _controller = AdmissionController(
+                memory // _share,
+                max(1, cpus // _share),
+                parse_language_limits(getattr(settings, 'JUDGE_ADMISSION_LANGUAGE_LIMITS', '')),
+                getattr(settings, 'JUDGE_ADMISSION_MAX_WAIT', 5),
+                cores or None,
+            )
+        return _controller
+
+
+@contextmanager
+def admit_run(task, run_cmd: List[str]):
+    """运行一个测试用例之前预留资源（准入控制关闭时直接运行）"""
+    controller = get_admission_controller()
+    if controller is None:
+        yield
+        return
+    with controller.admit(get_run_memory(task, run_cmd), task.language) as cpus, run_on(cpus):
+        yield
@@ -0,0 +1,108 @@
+"""
+CPU 绑定 - 每次运行独占一个 CPU，保留的 CPU 不分配给运行
+
+并发运行的用户程序在 CPU 之间迁移、与判题进程和编译器争用缓存时，同一份代码的运行时间会有明显波动，
+临界的解答重判时可能在 AC 和 TLE 之间来回变化。开启 JUDGE_CPU_PINNING 后:
+
+    保留 CPU（JUDGE_CPU_RESERVED，如 "0" 或 "0-1"）: 不分配给用户程序，判题进程、编译、数据库读写总有空闲的 CPU；
+                                                 为空时全部 CPU 用于判题
+    判题 CPU（其余 CPU）: 准入控制器（admission.py）为每次运行分配一个空闲的判题 CPU，
+                        用户程序在 exec 之前用 sched_setaffinity 绑定到该 CPU，同一时间只运行一个程序
+
+只绑定运行用户程序的子进程，判题进程本身不绑定: 编译器等子进程继承判题进程的亲和性，
+绑定后所有编译都会挤在保留 CPU 上，而判题 CPU 在两次运行之间是空闲的。
+
+JUDGE_CPU_SMT_EXCLUSIVE 开启时每个物理核心只取一个逻辑 CPU 判题，同核的超线程兄弟闲置不用，
+避免两个用户程序共享同一个物理核心的执行单元。
+同一主机上有多个判题进程时判题 CPU 按进程序号分开（见 admission.set_admission_share），互不重叠。
+
+只有 Linux 支持；不支持或可用 CPU 不够时不绑定，行为与关闭时相同。
+"""
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SUPPORTS_AFFINITY = hasattr(os, 'sched_setaffinity') and hasattr(os, 'sched_getaffinity')
+
+_host_cpus: Optional[List[int]] = None
+_local = threading.local()
+
+
+def parse_cpu_list(value: str) -> List[int]:
+    """解析 "0-3,8,10-11" 形式的 CPU 列表（与 /sys 和 taskset 的格式相同）"""
+    cpus = set()
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        start, _, end = item.partition('-')
+        cpus.update(range(int(start), int(end or start) + 1))
+    return sorted(cpus)
+
+
+def get_host_cpus() -> List[int]:
+    """进程可用的 CPU（首次读取后不变）"""
+    global _host_cpus
+    if _host_cpus is None:
+        _host_cpus = sorted(os.sched_getaffinity(0)) if SUPPORTS_AFFINITY else []
+    return _host_cpus
+
+
+def get_smt_siblings(cpu: int) -> List[int]:
+    """与 cpu 同属一个物理核心的逻辑 CPU（包括它自己）"""
+    path = f'/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list'
+    try:
+        with open(path) as f:
+            return parse_cpu_list(f.read().strip())
+    except (OSError, ValueError):
+        return [cpu]
+
+
+def get_cpu_layout() -> Optional[Tuple[List[int], List[int]]]:
+    """
+    按配置划分 CPU，返回 (保留 CPU, 判题 CPU)
+    未开启、平台不支持或划分后没有判题 CPU 时返回 None
+    """
+    if not getattr(settings, 'JUDGE_CPU_PINNING', False) or not SUPPORTS_AFFINITY:
+        return None
+
+    host_cpus = get_host_cpus()
+    reserved = [cpu for cpu in parse_cpu_list(getattr(settings, 'JUDGE_CPU_RESERVED', '0')) if cpu in host_cpus]
+    judge_cpus = []
+    used = set(reserved)
+    for cpu in host_cpus:
+        if cpu in used:
+            continue
+        if getattr(settings, 'JUDGE_CPU_SMT_EXCLUSIVE', False):
+            siblings = get_smt_siblings(cpu)
+            # 兄弟线程是保留 CPU 时整个物理核心都不用于判题
+            if any(sibling in reserved for sibling in siblings):
+                continue
+            used.update(siblings)
+        judge_cpus.append(cpu)
+
+    if not judge_cpus:
+        logger.warning(f"可用的 CPU {host_cpus} 除去保留 CPU {reserved} 后没有判题 CPU，不绑定 CPU")
+        return None
+    return reserved, judge_cpus
+
+
+@contextmanager
+def run_on(cpus: Optional[List[int]]):
+    """当前线程接下来启动的用户程序绑定到 cpus（为 None 时不绑定）"""
+    previous = getattr(_local, 'cpus', None)
+    _local.cpus = cpus
+    try:
+        yield
+    finally:
+        _local.cpus = previous
+
+
+def get_run_cpus() -> Optional[List[int]]:
+    """当前线程启动的用户程序应绑定的 CPU（runner 和 zygote 在子进程 exec 之前设置）"""
+    return getattr(_local, 'cpus', None)
@@ -5,3 +5,6 @@ class JudgeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'judge'
     verbose_name = '判题系统'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,479 @@
+"""
+异步判题进程 - 一个进程同时判多个提交，判题的各个阶段组成流水线
+
+同步的 JudgeWorker 一次只判一个提交，要占满一台主机需要启动多个各自加载 Django 的进程；
+并且领取、编译、运行、保存依次进行，一个耗时 20 秒的 javac 会让其他已经可以运行的提交一起等待。
+AsyncJudgeWorker 在 asyncio 事件循环中把判题拆成四个阶段，阶段之间用有界队列连接:
+
+    领取 ──> 编译池 ──> 运行池 ──> 保存
+    领取: 领取队列项并读取判题所需的数据（JudgeTask），编译队列已满时暂停领取
+    编译池: 引擎的 compile_task，并发数 JUDGE_ASYNC_COMPILE_CONCURRENCY；编译失败的提交直接进入保存阶段
+    运行池: 引擎的 run_compiled，并发数 JUDGE_ASYNC_CONCURRENCY（默认按 CPU 数和内存计算，
+            与 supervisor.get_auto_process_count 相同）；每个测试用例运行前还要通过准入控制（admission.py）
+    保存: 把已判完的结果攒成一批（最多 JUDGE_ASYNC_PERSIST_BATCH 个），在一个事务中写入
+
+下游阶段的队列已满时上游阶段阻塞，已领取但尚未判完的提交数因此有上限。
+编译和运行在各自的线程池中执行，线程大部分时间阻塞在 wait4 和管道读写上，不持有 GIL；
+数据库读写在少量数据库线程中执行（JUDGE_ASYNC_DB_THREADS），每个线程使用自己的数据库连接。
+所有已领取的提交共用一个心跳协程延长租约。各阶段的队列深度、进行中的数量和平均等待时间
+每隔 JUDGE_ASYNC_STATS_INTERVAL 秒写入日志（见 stats()）。
+
+用户程序没有改用 asyncio.create_subprocess_exec: asyncio 的子进程监视器用 waitpid 回收子进程，
+拿不到 wait4 返回的 rusage（CPU 时间和峰值内存），也无法配合 runner 的跳板进程和 cgroup。
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from django.conf import settings
+from django.db import connections, transaction
+from .admission import get_admission_controller
+from .engine_factory import JudgeEngineFactory
+from .judge_task import CompiledTask, JudgeOutcome, JudgeTask
+from .notify import QueueListener
+from .scheduler import get_scheduler
+from .supervisor import get_auto_process_count
+from .tasks import (
+    build_judge_task, claim_next_queue_item, extend_lease, fail_queue_item, get_worker_id,
+    recover_expired_leases, save_judge_result, start_judging,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_async_concurrency() -> int:
+    """运行池的并发数（JUDGE_ASYNC_CONCURRENCY，0 表示自动计算）"""
+    concurrency = getattr(settings, 'JUDGE_ASYNC_CONCURRENCY', 0)
+    return concurrency if concurrency > 0 else get_auto_process_count()
+
+
+def get_async_compile_concurrency(run_concurrency: int) -> int:
+    """编译池的并发数（JUDGE_ASYNC_COMPILE_CONCURRENCY，0 表示运行池并发数的一半）"""
+    concurrency = getattr(settings, 'JUDGE_ASYNC_COMPILE_CONCURRENCY', 0)
+    return concurrency if concurrency > 0 else max(1, run_concurrency // 2)
+
+
+@dataclass(slots=True)
+class Job:
+    """流水线中的一个提交"""
+    queue_item: object
+    submission: object = None
+    task: Optional[JudgeTask] = None
+    compiled: Optional[CompiledTask] = None
+    result: Optional[Dict] = None
+    error: Optional[Exception] = None
+    judge_time: float = 0.0     # 编译和运行的耗时（秒），不含排队时间
+
+
+class Stage:
+    """流水线的一个阶段: 有界队列和固定数量的工作协程，并记录队列深度等指标"""
+
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.active = 0
+        self.processed = 0
+        self.peak_depth = 0
+        self.wait_time = 0.0    # 已取出的任务在队列中等待的总时间（秒）
+
+    async def put(self, job: Job):
+        """放入队列，队列已满时等待"""
+        await self.queue.put((time.monotonic(), job))
+        self.peak_depth = max(self.peak_depth, self.queue.qsize())
+
+    async def get(self) -> Job:
+        enqueued_at, job = await self.queue.get()
+        self._taken(enqueued_at)
+        return job
+
+    def get_nowait(self) -> Job:
+        enqueued_at, job = self.queue.get_nowait()
+        self._taken(enqueued_at)
+        return job
+
+    def _taken(self, enqueued_at: float):
+        self.wait_time += time.monotonic() - enqueued_at
+        self.active += 1
+
+    def done(self):
+        """一个取出的任务已处理完（已交给下一阶段）"""
+        self.active -= 1
+        self.processed += 1
+        self.queue.task_done()
+
+    def stats(self) -> Dict:
+        return {
+            'queued': self.queue.qsize(),
+            'queue_size': self.queue.maxsize,
+            'active': self.active,
+            'workers': self.workers,
+            'processed': self.processed,
+            'peak_depth': self.peak_depth,
+            'avg_wait_ms': int(self.wait_time * 1000 / (self.processed + self.active))
+            if self.processed + self.active else 0,
+        }
+
+
+class AsyncJudgeWorker:
+    """在一个进程中以流水线方式并发领取并判题，接口与 worker.JudgeWorker 相同"""
+
+    def __init__(self, worker_id: Optional[str] = None, concurrency: Optional[int] = None,
+                 compile_concurrency: Optional[int] = None,
+                 interval: float = 2, max_interval: float = 30,
+                 max_iterations: Optional[int] = None, max_submissions: Optional[int] = None, stdout=None):
+        self.worker_id = worker_id or get_worker_id()
+        self.concurrency = max(1, concurrency or get_async_concurrency())
+        self.compile_concurrency = max(1, compile_concurrency or get_async_compile_concurrency(self.concurrency))
+        self.db_threads = max(1, getattr(settings, 'JUDGE_ASYNC_DB_THREADS', 2))
+        self.queue_size = getattr(settings, 'JUDGE_ASYNC_QUEUE_SIZE', 0)
+        self.persist_batch = max(1, getattr(settings, 'JUDGE_ASYNC_PERSIST_BATCH', 20))
+        self.interval = interval
+        self.max_interval = max(interval, max_interval)
+        self.max_iterations = max_iterations
+        # 处理了这么多提交后退出，由监督进程重新启动（回收内存）
+        self.max_submissions = max_submissions
+        self.stdout = stdout
+        self.total_processed = 0
+        self.total_claimed = 0
+        self.total_finished = 0
+        self.stopping = False
+        self.cap_reached = False
+        self.idle = False
+        self.listener: Optional[QueueListener] = None
+        self.engine = None
+        self.running: Dict[int, int] = {}   # 已领取未保存的队列项 id -> 提交 id
+        self.stages: Dict[str, Stage] = {}
+        self._intake: Optional[asyncio.Semaphore] = None
+        self._db_executor: Optional[ThreadPoolExecutor] = None
+        self._compile_executor: Optional[ThreadPoolExecutor] = None
+        self._run_executor: Optional[ThreadPoolExecutor] = None
+        self._listen_executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def recycled(self) -> bool:
+        """
+        是否因达到 max_submissions 而退出
+        按领取数判断（与停止领取的条件相同）: 部分提交系统错误或租约被收回时 total_processed 会少于领取数，
+        此时仍要以 EXIT_RECYCLE 退出，由监督进程重新启动
+        """
+        return self.cap_reached
+
+    def stop(self):
+        """
+        请求停止: 已领取的提交判完后退出，不再领取新的提交
+        可在信号处理函数中调用
+        """
+        self.stopping = True
+        if self.listener is not None:
+            self.listener.interrupt()
+
+    def _should_stop(self) -> bool:
+        # 已领取的提交数达到上限后不再领取，判完后退出
+        if self.max_submissions and self.total_claimed >= self.max_submissions:
+            self.cap_reached = True
+        return self.stopping or self.cap_reached
+
+    def stats(self) -> Dict[str, Dict]:
+        """各阶段的指标: 队列中的数量、队列容量、进行中的数量、并发数、已处理数、队列峰值深度、平均等待时间"""
+        return {name: stage.stats() for name, stage in self.stages.items()}
+
+    def run(self) -> int:
+        """运行事件循环，返回处理的提交总数"""
+        self.engine = JudgeEngineFactory.create_engine()
+        self.listener = QueueListener(self.worker_id)
+        self._db_executor = ThreadPoolExecutor(max_workers=self.db_threads, thread_name_prefix='judge-db')
+        self._compile_executor = ThreadPoolExecutor(max_workers=self.compile_concurrency,
+                                                    thread_name_prefix='judge-compile')
+        self._run_executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='judge-run')
+        # 等待入队通知会阻塞，使用单独的线程，不占用数据库线程
+        self._listen_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='judge-listen')
+        self._write(
+            f'异步判题进程 {self.worker_id} 启动，编译并发数: {self.compile_concurrency}，'
+            f'运行并发数: {self.concurrency}，数据库线程: {self.db_threads}，唤醒方式: {self.listener.mode}'
+        )
+
+        try:
+            asyncio.run(self._main())
+        finally:
+            self.listener.close()
+            for executor in (self._listen_executor, self._compile_executor, self._run_executor):
+                executor.shutdown(wait=True)
+            self._close_db_connections()
+            self._db_executor.shutdown(wait=True)
+
+        return self.total_processed
+
+    async def _main(self):
+        def queue_size(workers: int) -> int:
+            return self.queue_size if self.queue_size > 0 else workers
+
+        compile_stage = Stage('compile', self.compile_concurrency, queue_size(self.compile_concurrency))
+        run_stage = Stage('run', self.concurrency, queue_size(self.concurrency))
+        persist_stage = Stage('persist', 1, queue_size(self.persist_batch))
+        self.stages = {'compile': compile_stage, 'run': run_stage, 'persist': persist_stage}
+        # 编译队列中的空位，领取阶段只在有空位时领取
+        self._intake = asyncio.Semaphore(compile_stage.queue.maxsize)
+
+        workers = (
+            [asyncio.create_task(self._compile_worker()) for _ in range(compile_stage.workers)] +
+            [asyncio.create_task(self._run_worker()) for _ in range(run_stage.workers)] +
+            [asyncio.create_task(self._persist_worker()), asyncio.create_task(self._heartbeat())]
+        )
+        stats_interval = getattr(settings, 'JUDGE_ASYNC_STATS_INTERVAL', 60)
+        if stats_interval > 0:
+            workers.append(asyncio.create_task(self._report_stats(stats_interval)))
+
+        try:
+            await self._db(recover_expired_leases)
+            await self._claim()
+
+            # 按阶段顺序排空: 每个阶段处理完一个任务时已把它交给下一阶段
+            if self.running:
+                self._write(f'等待 {len(self.running)} 个已领取的提交判完')
+            for stage in self.stages.values():
+                await stage.queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._log_stats()
+
+    async def _claim(self):
+        """领取阶段: 编译队列有空位时领取一个队列项，读取判题数据后放入编译队列"""
+        scheduler = get_scheduler()
+        iteration = 0
+        wait_interval = self.interval
+
+        while not self._should_stop():
+            if self.max_iterations and iteration >= self.max_iterations:
+                break
+            iteration += 1
+
+            await self._intake.acquire()
+            if self._should_stop():
+                self._intake.release()
+                break
+
+            try:
+                queue_item = await self._db(claim_next_queue_item, self.worker_id, scheduler)
+            except Exception as e:
+                logger.error(f"领取判题队列失败: {str(e)}")
+                queue_item = None
+
+            if queue_item is not None:
+                self.total_claimed += 1
+                self.running[queue_item.id] = queue_item.submission_id
+                job = Job(queue_item)
+                try:
+                    job.submission, job.task = await self._db(self._prepare, queue_item)
+                except Exception as e:
+                    job.error = e
+                    self._intake.release()
+                    await self.stages['persist'].put(job)
+                else:
+                    await self.stages['compile'].put(job)
+                # 队列中可能还有待判题的提交，立即继续
+                wait_interval = self.interval
+                continue
+
+            self._intake.release()
+            # 等待入队通知；超时说明队列空闲，延长下一次轮询间隔。
+            # 有提交判完时也会打断等待: 调度器可能因用户的在判提交数限制暂时没有分配提交
+            loop = asyncio.get_running_loop()
+            finished = self.total_finished
+            self.idle = True
+            try:
+                notified = await loop.run_in_executor(self._listen_executor, self.listener.wait, wait_interval)
+            finally:
+                self.idle = False
+            if notified or self.total_finished != finished:
+                wait_interval = self.interval
+            else:
+                wait_interval = min(wait_interval * 2, self.max_interval)
+
+    def _prepare(self, queue_item):
+        """在数据库线程中标记提交为判题中，并读取判题所需的全部数据"""
+        submission = start_judging(queue_item)
+        # Docker 引擎不支持 JudgeTask，在运行阶段直接读取提交
+        task = build_judge_task(submission) if hasattr(self.engine, 'judge_task') else None
+        return submission, task
+
+    async def _compile_worker(self):
+        """编译阶段: 编译成功的提交进入运行队列，编译失败的直接进入保存队列"""
+        stage = self.stages['compile']
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await stage.get()
+            self._intake.release()
+            try:
+                if job.task is not None and hasattr(self.engine, 'compile_task'):
+                    start = time.monotonic()
+                    compiled = await loop.run_in_executor(self._compile_executor, self.engine.compile_task, job.task)
+                    job.judge_time += time.monotonic() - start
+                    if isinstance(compiled, JudgeOutcome):
+                        job.result = compiled.to_dict()
+                        await self.stages['persist'].put(job)
+                        continue
+                    job.compiled = compiled
+                await self.stages['run'].put(job)
+            except Exception as e:
+                job.error = e
+                await self.stages['persist'].put(job)
+            finally:
+                stage.done()
+
+    async def _run_worker(self):
+        """运行阶段: 运行全部测试用例，结果进入保存队列"""
+        stage = self.stages['run']
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await stage.get()
+            try:
+                start = time.monotonic()
+                if job.compiled is not None:
+                    outcome = await loop.run_in_executor(self._run_executor, self.engine.run_compiled, job.compiled)
+                    job.result = outcome.to_dict()
+                elif job.task is not None:
+                    outcome = await loop.run_in_executor(self._run_executor, self.engine.judge_task, job.task)
+                    job.result = outcome.to_dict()
+                else:
+                    job.result = await loop.run_in_executor(self._run_executor, self.engine.judge_submission,
+                                                            job.submission)
+                job.judge_time += time.monotonic() - start
+            except Exception as e:
+                job.error = e
+            finally:
+                job.compiled = None
+                await self.stages['persist'].put(job)
+                stage.done()
+
+    async def _persist_worker(self):
+        """保存阶段: 把已到达的结果攒成一批写入数据库"""
+        stage = self.stages['persist']
+        while True:
+            batch = [await stage.get()]
+            while len(batch) < self.persist_batch and not stage.queue.empty():
+                batch.append(stage.get_nowait())
+            try:
+                try:
+                    saved = await self._db(self._persist_batch, batch)
+                except Exception as e:
+                    # 整批提交失败（已全部回滚），逐个重新保存
+                    logger.warning(f"批量保存 {len(batch)} 个判题结果失败，逐个重试: {str(e)}")
+                    saved = [await self._db(self._persist_batch, [job]) for job in batch]
+                    saved = [item for items in saved for item in items]
+                self.total_processed += sum(saved)
+            except Exception as e:
+                logger.error(f"保存判题结果失败: {str(e)}")
+            finally:
+                for job in batch:
+                    self.running.pop(job.queue_item.id, None)
+                    self.total_finished += 1
+                    stage.done()
+                if self.idle:
+                    self.listener.interrupt()
+
+    def _persist_batch(self, batch: List[Job]) -> List[bool]:
+        """在数据库线程中的一个事务里保存一批结果（每个结果各自一个保存点），返回每个结果是否已保存"""
+        failed = []
+        saved = []
+        with transaction.atomic():
+            for job in batch:
+                submission_id = job.queue_item.submission_id
+                if job.error is not None:
+                    failed.append(job)
+                    saved.append(False)
+                    continue
+                try:
+                    owned = save_judge_result(job.queue_item, self.worker_id, job.result,
+                                              int(job.judge_time * 1000))
+                except Exception as e:
+                    job.error = e
+                    failed.append(job)
+                    saved.append(False)
+                    continue
+                if owned:
+                    logger.info(f"提交 {submission_id} 判题完成，状态: {job.result['status']}")
+                else:
+                    logger.warning(f"提交 {submission_id} 的租约已失效，丢弃本次判题结果")
+                saved.append(owned)
+
+        for job in failed:
+            logger.error(f"处理提交 {job.queue_item.submission_id} 失败: {str(job.error)}")
+            try:
+                if not fail_queue_item(job.queue_item, self.worker_id, job.error):
+                    logger.warning(f"提交 {job.queue_item.submission_id} 的租约已失效，不标记为失败")
+            except Exception as e:
+                logger.error(f"保存提交 {job.queue_item.submission_id} 的失败状态失败: {str(e)}")
+        return saved
+
+    async def _heartbeat(self):
+        """定期延长所有已领取的提交的租约，并回收其他判题进程遗留的过期租约"""
+        interval = getattr(settings, 'JUDGE_QUEUE_HEARTBEAT_INTERVAL', 15)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._db(self._extend_leases, list(self.running))
+                await self._db(recover_expired_leases)
+            except Exception as e:
+                logger.warning(f"判题队列心跳失败: {str(e)}")
+
+    def _extend_leases(self, queue_ids):
+        for queue_id in queue_ids:
+            if not extend_lease(queue_id, self.worker_id):
+                logger.warning(f"队列项 {queue_id} 的租约已失效")
+
+    async def _report_stats(self, interval: float):
+        """定期把各阶段的指标写入日志（没有新的活动时不输出）"""
+        last = None
+        while True:
+            await asyncio.sleep(interval)
+            current = (self.total_claimed, self.total_finished)
+            if current != last:
+                self._log_stats()
+            last = current
+
+    def _log_stats(self):
+        parts = [
+            f"{name} 排队 {s['queued']}/{s['queue_size']}（峰值 {s['peak_depth']}），"
+            f"进行中 {s['active']}/{s['workers']}，完成 {s['processed']}，平均等待 {s['avg_wait_ms']}ms"
+            for name, s in self.stats().items()
+        ]
+        controller = get_admission_controller()
+        if parts and controller is not None:
+            s = controller.stats()
+            parts.append(
+                f"准入 内存 {s['reserved_memory']}/{s['memory']}MB，CPU {s['reserved_cpus']}/{s['cpus']}，"
+                f"等待 {s['waiting']}，延迟启动 {s['delayed']}/{s['admitted']}（平均 {s['avg_wait_ms']}ms）"
+            )
+        if parts:
+            logger.info(f"判题流水线 {self.worker_id}: " + '；'.join(parts))
+
+    async def _db(self, func, *args):
+        """在数据库线程中执行"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, func, *args)
+
+    def _close_db_connections(self):
+        """关闭每个数据库线程各自的数据库连接"""
+        barrier = threading.Barrier(self.db_threads)
+
+        def close():
+            try:
+                barrier.wait(timeout=5)
+            except threading.BrokenBarrierError:
+                pass
+            connections.close_all()
+
+        for _ in range(self.db_threads):
+            self._db_executor.submit(close)
+
+    def _write(self, message: str):
+        if self.stdout is not None:
+            self.stdout.write(message)
+        else:
+            logger.info(message)
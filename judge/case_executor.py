@@ -0,0 +1,123 @@
+"""
+测试用例执行器 - 在有界线程池中并发运行同一提交的多个测试用例
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from problems.testdata import get_test_data_store
+from .compare import read_preview
+
+# 判题策略
+POLICY_RUN_ALL = 'run_all'                  # 运行全部测试用例（OI赛制，按测试点给分）
+POLICY_STOP_ON_FAILURE = 'stop_on_failure'  # 遇到第一个未通过的测试用例即停止（ACM/ICPC赛制）
+POLICY_DEFAULT = 'default'                  # 跟随竞赛或系统设置
+
+
+def get_judge_policy(submission) -> str:
+    """
+    获取提交的判题策略
+    优先级: 竞赛设置 > 题目设置 > 系统默认设置(JUDGE_DEFAULT_POLICY)
+    """
+    try:
+        return submission.contestsubmission.contest.judge_policy
+    except ObjectDoesNotExist:
+        pass
+
+    problem_policy = getattr(submission.problem, 'judge_policy', POLICY_DEFAULT)
+    if problem_policy and problem_policy != POLICY_DEFAULT:
+        return problem_policy
+
+    return getattr(settings, 'JUDGE_DEFAULT_POLICY', POLICY_RUN_ALL)
+
+
+def get_case_parallelism() -> int:
+    """单个提交内测试用例的并发数"""
+    return max(1, int(getattr(settings, 'JUDGE_CASE_PARALLELISM', 1)))
+
+
+def execute_test_cases(run_case: Callable[[object], Dict], test_cases: List,
+                       parallelism: Optional[int] = None,
+                       stop_on_failure: bool = False) -> List[Optional[Dict]]:
+    """
+    运行全部测试用例
+    返回结果的顺序与 test_cases 一致，与实际完成顺序无关。
+    stop_on_failure 时，第一个未通过的测试用例之后的结果为 None（跳过），
+    即使并发执行时后面的用例已经运行完毕，保证结果确定。
+    """
+    if parallelism is None:
+        parallelism = get_case_parallelism()
+    parallelism = min(max(1, parallelism), len(test_cases) or 1)
+
+    results: List[Optional[Dict]] = []
+
+    if parallelism == 1:
+        for test_case in test_cases:
+            result = run_case(test_case)
+            results.append(result)
+            if stop_on_failure and result['status'] != 'accepted':
+                break
+        return results + [None] * (len(test_cases) - len(results))
+
+    executor = ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix='judge-case')
+    try:
+        futures = [executor.submit(run_case, test_case) for test_case in test_cases]
+        for index, future in enumerate(futures):
+            result = future.result()
+            results.append(result)
+            if stop_on_failure and result['status'] != 'accepted':
+                # 取消尚未开始的测试用例
+                for pending in futures[index + 1:]:
+                    pending.cancel()
+                break
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return results + [None] * (len(test_cases) - len(results))
+
+
+def prepare_test_case_files(test_case, data_dir: str) -> Tuple[str, str, str]:
+    """
+    获取测试用例（judge_task.TestCaseData）的输入和标准答案文件，用户程序直接以输入文件作为标准输入，输出写入输出文件
+    直接指定的文件和未压缩的测试数据直接使用，压缩的数据解压到 data_dir
+    返回: (输入文件, 标准答案文件, 输出文件)
+    """
+    store = get_test_data_store()
+    input_file = test_case.input_file or store.local_path(test_case.input_hash, data_dir)
+    answer_file = test_case.output_file or store.local_path(test_case.output_hash, data_dir)
+    output_file = os.path.join(data_dir, f'{test_case.id}.out')
+    return input_file, answer_file, output_file
+
+
+def remove_test_case_files(data_dir: str, *paths: str):
+    """删除测试用例在 data_dir 中产生的临时文件（不会删除测试数据存储中的文件）"""
+    for path in paths:
+        if os.path.dirname(path) != data_dir:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def output_preview(output_file: str) -> str:
+    """用户输出的预览（最多 JUDGE_OUTPUT_PREVIEW_SIZE 字节）"""
+    limit = getattr(settings, 'JUDGE_OUTPUT_PREVIEW_SIZE', 4096)
+    text, truncated = read_preview(output_file, limit)
+    return text + '\n...' if truncated else text
+
+
+def skipped_test_result(test_case) -> Dict:
+    """被跳过的测试用例结果"""
+    return {
+        'test_case_id': test_case.id,
+        'input': test_case.input_preview,
+        'expected_output': test_case.output_preview,
+        'actual_output': '',
+        'status': 'skipped',
+        'score': 0,
+        'time_used': 0,
+        'memory_used': 0,
+        'error': ''
+    }
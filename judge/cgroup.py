@@ -0,0 +1,252 @@
+"""
+cgroup v2 资源控制 - 每次运行用户程序时创建一个临时 cgroup，由内核限制并统计整个进程树的资源
+
+    memory.max   内存上限，超出时内核 OOM 杀死进程（memory.events 中的 oom_kill 计数增加）
+    cpu.max      可使用的 CPU 核数上限
+    cpu.stat     usage_usec 为整个 cgroup 消耗的 CPU 时间（微秒）
+    pids.max     进程/线程数上限
+    cgroup.kill  一次性杀死 cgroup 中的全部进程（包括调用 setsid 脱离进程组的进程）
+
+与 RLIMIT_AS 不同，memory.max 只统计实际使用的内存，JVM、Node.js 等预留大量虚拟地址空间的运行时不受影响。
+cgroup 只用于限制和检测 OOM，报告的内存仍是 wait4 返回的 ru_maxrss（与其他引擎相同）:
+memory.peak 包括输出文件、输入文件和 JVM lib/modules 的页缓存，同一程序的结果会随缓存状态和输出大小变化，
+输出多的程序还会被误判为内存超限。内存紧张时内核会先回收页缓存，只有发生 oom_kill 才判定为内存超限。
+
+cgroup v2 规定有进程的 cgroup 不能为子 cgroup 启用控制器，因此根 cgroup 是判题进程自身所在的 cgroup 时，
+先把其中的进程移到 judge-workers 叶子 cgroup，再为子 cgroup 启用 cpu、memory、pids 控制器。
+根 cgroup 需要可写（例如 systemd 的 Delegate=yes，或使用私有 cgroup 命名空间的容器）。
+这些修改只在创建 cgroup 引擎时进行（prepare_cgroup_root）；检查是否可用（is_cgroup_available）是只读的。
+"""
+import os
+import signal
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+from django.conf import settings
+
+CGROUP_MOUNT = '/sys/fs/cgroup'
+CONTROLLERS = ('cpu', 'memory', 'pids')
+WORKERS_CGROUP = 'judge-workers'
+CPU_PERIOD = 100000  # 微秒
+
+
+class CgroupError(RuntimeError):
+    """cgroup v2 不可用或配置失败"""
+
+
+def _read(path: str) -> str:
+    with open(path) as f:
+        return f.read().strip()
+
+
+def _write(path: str, value: str):
+    with open(path, 'w') as f:
+        f.write(value)
+
+
+def get_own_cgroup() -> Optional[str]:
+    """当前进程所在的 cgroup v2 目录"""
+    try:
+        with open('/proc/self/cgroup') as f:
+            for line in f:
+                if line.startswith('0::'):
+                    return os.path.join(CGROUP_MOUNT, line[3:].strip().lstrip('/'))
+    except OSError:
+        pass
+    return None
+
+
+def get_cgroup_root() -> Optional[str]:
+    """创建临时 cgroup 的父目录: JUDGE_CGROUP_ROOT，未配置时使用当前进程所在的 cgroup"""
+    root = getattr(settings, 'JUDGE_CGROUP_ROOT', '')
+    return str(root) if root else get_own_cgroup()
+
+
+_prepared_root = None
+_prepare_lock = threading.Lock()
+
+
+def check_cgroup_root() -> str:
+    """
+    只读地检查 cgroup v2 是否可用（不修改 cgroup 树，可以在列出引擎、自动选择引擎时调用）:
+    根 cgroup 存在、所需的控制器可用、根 cgroup 可写
+    返回: 根 cgroup 目录；不可用时抛出 CgroupError
+    """
+    root = get_cgroup_root()
+    if not root or not os.path.exists(os.path.join(root, 'cgroup.controllers')):
+        raise CgroupError('未找到 cgroup v2')
+
+    try:
+        available = _read(os.path.join(root, 'cgroup.controllers')).split()
+    except OSError as e:
+        raise CgroupError(f'无法读取 cgroup {root}: {str(e)}')
+    missing = [name for name in CONTROLLERS if name not in available]
+    if missing:
+        raise CgroupError(f"cgroup 控制器不可用: {', '.join(missing)}")
+
+    for path in (root, os.path.join(root, 'cgroup.subtree_control'), os.path.join(root, 'cgroup.procs')):
+        if not os.access(path, os.W_OK):
+            raise CgroupError(f'cgroup {root} 不可写')
+    return root
+
+
+def prepare_cgroup_root() -> str:
+    """
+    检查 cgroup v2 是否可用，并为子 cgroup 启用所需的控制器（会修改 cgroup 树，只在创建 cgroup 引擎时调用）
+    返回: 根 cgroup 目录；不可用时抛出 CgroupError
+    """
+    global _prepared_root
+    with _prepare_lock:
+        if _prepared_root is not None:
+            return _prepared_root
+
+        root = check_cgroup_root()
+        try:
+            enabled = _read(os.path.join(root, 'cgroup.subtree_control')).split()
+            if not all(name in enabled for name in CONTROLLERS):
+                if root == get_own_cgroup():
+                    _move_processes_to_leaf(root)
+                _write(os.path.join(root, 'cgroup.subtree_control'),
+                       ' '.join(f'+{name}' for name in CONTROLLERS))
+        except OSError as e:
+            raise CgroupError(f'无法配置 cgroup {root}: {str(e)}')
+
+        _prepared_root = root
+        return root
+
+
+def _move_processes_to_leaf(root: str):
+    """把根 cgroup 中的进程移到叶子 cgroup，之后才能为子 cgroup 启用控制器"""
+    leaf = os.path.join(root, WORKERS_CGROUP)
+    os.makedirs(leaf, exist_ok=True)
+    for pid in _read(os.path.join(root, 'cgroup.procs')).split():
+        try:
+            _write(os.path.join(leaf, 'cgroup.procs'), pid)
+        except (ProcessLookupError, OSError):
+            # 进程已退出，或是无法移动的内核线程
+            pass
+
+
+def is_cgroup_available() -> bool:
+    """cgroup v2 是否可用（只读检查，见 check_cgroup_root）"""
+    try:
+        check_cgroup_root()
+        return True
+    except CgroupError:
+        return False
+
+
+class JudgeCgroup:
+    """
+    一次运行使用的临时 cgroup
+    用法:
+        with JudgeCgroup(root, memory_limit) as cgroup:
+            # 在子进程 exec 之前调用 cgroup.attach()
+            ...
+            usage = cgroup.usage()
+    """
+
+    def __init__(self, root: str, memory_limit: int, cpus: Optional[float] = None,
+                 pids_max: Optional[int] = None):
+        """memory_limit: 内存限制(MB)"""
+        self.root = root
+        self.memory_limit = memory_limit
+        self.cpus = cpus if cpus is not None else getattr(settings, 'JUDGE_CGROUP_CPUS', 1)
+        self.pids_max = pids_max if pids_max is not None else getattr(settings, 'JUDGE_CGROUP_PIDS_MAX', 64)
+        self.path = os.path.join(root, f'judge-run-{os.getpid()}-{uuid.uuid4().hex[:12]}')
+        self.procs_path = os.path.join(self.path, 'cgroup.procs')
+
+    def __enter__(self):
+        self.create()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.remove()
+        return False
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def create(self):
+        try:
+            os.mkdir(self.path)
+            _write(self._file('memory.max'), str(self.memory_limit * 1024 * 1024))
+            if os.path.exists(self._file('memory.swap.max')):
+                # 不允许换出到交换分区，否则超出内存限制的程序只会变慢而不会被判为 MLE
+                _write(self._file('memory.swap.max'), '0')
+            if self.cpus:
+                _write(self._file('cpu.max'), f'{int(self.cpus * CPU_PERIOD)} {CPU_PERIOD}')
+            if self.pids_max:
+                _write(self._file('pids.max'), str(self.pids_max))
+        except OSError as e:
+            self.remove()
+            raise CgroupError(f'创建 cgroup 失败: {str(e)}')
+
+    def attach(self):
+        """把当前进程加入 cgroup（在子进程 fork 之后、exec 之前调用）"""
+        with open(self.procs_path, 'w') as f:
+            f.write(str(os.getpid()))
+
+    def kill(self):
+        """杀死 cgroup 中的全部进程"""
+        try:
+            _write(self._file('cgroup.kill'), '1')
+            return
+        except FileNotFoundError:
+            pass  # 内核早于 5.14，逐个杀死
+        except OSError:
+            return
+
+        try:
+            pids = _read(self.procs_path).split()
+        except OSError:
+            return
+        for pid in pids:
+            try:
+                os.kill(int(pid), signal.SIGKILL)
+            except (ProcessLookupError, ValueError):
+                pass
+
+    def usage(self) -> Dict:
+        """
+        读取资源使用情况
+        返回: {
+            'cpu_time'      CPU 时间(ms)
+            'oom_killed'    是否因超出 memory.max 被内核杀死
+        }
+        """
+        cpu_time = 0
+        for line in _read(self._file('cpu.stat')).splitlines():
+            key, _, value = line.partition(' ')
+            if key == 'usage_usec':
+                cpu_time = int(value) // 1000
+                break
+
+        oom_killed = False
+        try:
+            for line in _read(self._file('memory.events')).splitlines():
+                key, _, value = line.partition(' ')
+                if key == 'oom_kill' and int(value) > 0:
+                    oom_killed = True
+        except (OSError, ValueError):
+            pass
+
+        return {
+            'cpu_time': cpu_time,
+            'oom_killed': oom_killed,
+        }
+
+    def remove(self):
+        """杀死残留进程并删除 cgroup（进程退出后 cgroup 才能删除，稍等片刻重试）"""
+        if not os.path.isdir(self.path):
+            return
+        self.kill()
+        for _ in range(50):
+            try:
+                os.rmdir(self.path)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.01)
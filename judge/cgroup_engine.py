@@ -0,0 +1,49 @@
+"""
+cgroup v2 判题引擎 - 在沙箱引擎的基础上，把每次运行放入临时 cgroup（见 cgroup.py）
+
+    - 内存由 memory.max 限制，不使用 RLIMIT_AS，JVM、Node.js 可以正常运行；
+      报告的内存与其他引擎相同，为 wait4 的 ru_maxrss（memory.peak 包括页缓存，见 cgroup.py）
+    - CPU 时间读取 cpu.stat，包括用户程序的全部线程和子进程
+    - 进程数由 pids.max 限制，超时或输出超限时通过 cgroup.kill 杀死全部进程
+"""
+import resource
+from typing import Dict, List, Optional, Tuple
+from .cgroup import JudgeCgroup, is_cgroup_available, prepare_cgroup_root
+from .sandbox_engine import SandboxEngine
+from .zygote import WarmProgram
+
+
+class CgroupEngine(SandboxEngine):
+    """cgroup v2 判题引擎 - 由内核精确限制和统计内存、CPU 时间和进程数"""
+    
+    def __init__(self):
+        super().__init__()
+        # cgroup v2 不可用时抛出 CgroupError
+        self.cgroup_root = prepare_cgroup_root()
+    
+    @staticmethod
+    def is_available() -> bool:
+        """当前主机是否可以使用 cgroup 引擎"""
+        return is_cgroup_available()
+    
+    def resource_limits(self, time_limit: int, memory_limit: int,
+                        output_limit: Optional[int] = None) -> List[Tuple[int, int, int]]:
+        """用户程序的资源限制；内存和进程数由 cgroup 限制，不设置 RLIMIT_AS"""
+        file_size = self.file_size_limit(output_limit)
+        return [
+            # 文件大小限制
+            (resource.RLIMIT_FSIZE, file_size, file_size),
+            # 文件描述符限制
+            (resource.RLIMIT_NOFILE, 100, 100),
+        ]
+    
+    def run_limited_process(self, command: List[str], input_bytes: Optional[bytes],
+                            time_limit: int, memory_limit: int, output_limit: Optional[int],
+                            input_file: Optional[str], output_file: Optional[str],
+                            warm_program: Optional[WarmProgram] = None, cgroup=None) -> Dict:
+        """在临时 cgroup 中运行进程"""
+        with JudgeCgroup(self.cgroup_root, memory_limit) as cgroup:
+            return super().run_limited_process(
+                command, input_bytes, time_limit, memory_limit, output_limit,
+                input_file, output_file, warm_program, cgroup
+            )
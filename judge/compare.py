@@ -0,0 +1,94 @@
+"""
+输出比较 - 以文件为单位分块比较标准答案与用户输出，不把整个输出读入内存
+
+比较规则与 JudgeEngine.compare_output 一致：统一换行符（\\r\\n、\\r -> \\n），忽略首尾空白。
+每次只读取 CHUNK_SIZE 字节，尾部空白暂存到遇到后续内容时再输出，因此内存占用与输出大小无关
+（只有连续的空白段需要暂存）。
+"""
+from typing import BinaryIO, Iterator, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+# 与 str.strip() 对 ASCII 字符的处理一致
+WHITESPACE = b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'
+
+
+def _normalized_chunks(stream: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """逐块产生规范化后的内容，不包含首尾空白，产生的块均非空"""
+    started = False
+    pending_cr = False
+    pending_space = b''
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+
+        # \r\n 可能跨越块边界，块末尾的 \r 留到下一块处理
+        if pending_cr:
+            chunk = b'\r' + chunk
+            pending_cr = False
+        if chunk.endswith(b'\r'):
+            chunk = chunk[:-1]
+            pending_cr = True
+        chunk = chunk.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+
+        if not started:
+            chunk = chunk.lstrip(WHITESPACE)
+            if not chunk:
+                continue
+            started = True
+
+        content = chunk.rstrip(WHITESPACE)
+        if not content:
+            pending_space += chunk
+            continue
+
+        yield pending_space + content if pending_space else content
+        pending_space = chunk[len(content):]
+
+
+def compare_streams(expected: BinaryIO, actual: BinaryIO, chunk_size: int = CHUNK_SIZE) -> bool:
+    """分块比较两个二进制流规范化后的内容"""
+    expected_chunks = _normalized_chunks(expected, chunk_size)
+    actual_chunks = _normalized_chunks(actual, chunk_size)
+    expected_view = memoryview(b'')
+    actual_view = memoryview(b'')
+
+    while True:
+        if not expected_view:
+            chunk = next(expected_chunks, None)
+            expected_view = memoryview(chunk) if chunk is not None else None
+        if not actual_view:
+            chunk = next(actual_chunks, None)
+            actual_view = memoryview(chunk) if chunk is not None else None
+
+        if expected_view is None or actual_view is None:
+            return expected_view is None and actual_view is None
+
+        size = min(len(expected_view), len(actual_view))
+        if expected_view[:size] != actual_view[:size]:
+            return False
+        expected_view = expected_view[size:]
+        actual_view = actual_view[size:]
+
+
+def compare_output_files(expected_path: str, actual_path: str) -> bool:
+    """比较标准答案文件与用户输出文件"""
+    with open(expected_path, 'rb') as expected, open(actual_path, 'rb') as actual:
+        return compare_streams(expected, actual)
+
+
+def read_preview(path: str, limit: int) -> Tuple[str, bool]:
+    """
+    读取文件开头最多 limit 字节用于展示
+    返回: (文本, 是否被截断)
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read(limit + 1)
+    except OSError:
+        return '', False
+    truncated = len(data) > limit
+    return data[:limit].decode('utf-8', errors='ignore' if truncated else 'replace'), truncated
+
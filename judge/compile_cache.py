@@ -0,0 +1,223 @@
+"""
+编译产物缓存 - 以 源码 + 语言 + 编译命令 的哈希为键，在多个判题进程之间共享
+
+缓存目录结构:
+    <cache_dir>/<key[:2]>/<key>/meta.json   编译结果（是否成功、错误信息、产物列表）
+    <cache_dir>/<key[:2]>/<key>/files/N     编译产物
+
+条目先写入临时目录再原子 rename 到位，读者要么看到完整条目，要么看不到；
+淘汰时同样先 rename 再删除。命中时更新 meta.json 的 mtime，按 mtime 做 LRU 淘汰。
+缓存总大小记录在 <cache_dir>/.size 中，每次写入条目时累加；只有总大小超过容量时才扫描全部条目淘汰，
+扫描后用实际大小校正记录（其他进程并发写入造成的少量偏差会在下次扫描时校正）。
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import List, Optional, Tuple
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 产物文件名和错误信息中与具体临时路径相关的部分，用占位符保存
+STEM_PLACEHOLDER = '\x00stem\x00'
+FILE_PLACEHOLDER = '\x00file\x00'
+DIR_PLACEHOLDER = '\x00dir\x00'
+
+
+class CompileCache:
+    """磁盘编译缓存"""
+
+    META_FILE = 'meta.json'
+    FILES_DIR = 'files'
+    LOCK_FILE = '.evict.lock'
+    SIZE_FILE = '.size'
+
+    def __init__(self, cache_dir: Optional[str] = None, max_size: Optional[int] = None):
+        judge_dir = getattr(settings, 'JUDGE_DIR', '/tmp/judge')
+        self.cache_dir = str(cache_dir or getattr(
+            settings, 'JUDGE_COMPILE_CACHE_DIR', os.path.join(judge_dir, 'compile_cache')
+        ))
+        if max_size is None:
+            max_size = getattr(settings, 'JUDGE_COMPILE_CACHE_MAX_SIZE', 1024) * 1024 * 1024
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(code: str, language: str, compile_command: str) -> str:
+        """计算缓存键"""
+        digest = hashlib.sha256()
+        for part in (language, compile_command or '', code):
+            data = part.encode('utf-8')
+            digest.update(len(data).to_bytes(8, 'little'))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def lookup(self, key: str, code_file: str) -> Optional[Tuple[bool, str]]:
+        """
+        查找缓存，命中时把编译产物恢复到 code_file 所在目录
+        返回: (编译是否成功, 错误信息)，未命中返回 None
+        """
+        entry = self.entry_dir(key)
+        meta_path = os.path.join(entry, self.META_FILE)
+        file_dir = os.path.dirname(code_file)
+        file_stem = os.path.splitext(os.path.basename(code_file))[0]
+
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+
+            for index, name in enumerate(meta['artifacts']):
+                shutil.copy2(
+                    os.path.join(entry, self.FILES_DIR, str(index)),
+                    os.path.join(file_dir, name.replace(STEM_PLACEHOLDER, file_stem))
+                )
+
+            # 更新访问时间，供 LRU 淘汰使用
+            os.utime(meta_path)
+        except (OSError, ValueError, KeyError):
+            # 条目不存在、正在被淘汰或已损坏，按未命中处理
+            return None
+
+        error = meta.get('error', '')
+        error = error.replace(FILE_PLACEHOLDER, code_file).replace(DIR_PLACEHOLDER, file_dir)
+        return meta['success'], error
+
+    def store(self, key: str, code_file: str, success: bool, error: str, artifacts: List[str]):
+        """保存编译结果；artifacts 为编译在 code_file 所在目录生成的文件名"""
+        file_dir = os.path.dirname(code_file)
+        file_stem = os.path.splitext(os.path.basename(code_file))[0]
+        entry = self.entry_dir(key)
+        if os.path.exists(entry):
+            return
+
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        temp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=self.cache_dir)
+        try:
+            os.makedirs(os.path.join(temp_dir, self.FILES_DIR))
+            names = []
+            size = 0
+            for index, name in enumerate(artifacts):
+                src = os.path.join(file_dir, name)
+                shutil.copy2(src, os.path.join(temp_dir, self.FILES_DIR, str(index)))
+                size += os.path.getsize(src)
+                names.append(name.replace(file_stem, STEM_PLACEHOLDER) if file_stem else name)
+
+            error = (error or '').replace(code_file, FILE_PLACEHOLDER).replace(file_dir, DIR_PLACEHOLDER)
+            size += len(error.encode('utf-8'))
+            with open(os.path.join(temp_dir, self.META_FILE), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'success': success,
+                    'error': error,
+                    'artifacts': names,
+                    'size': size,
+                }, f)
+
+            try:
+                os.rename(temp_dir, entry)
+            except OSError:
+                # 其他进程已经写入了同一个条目
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                return
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+        total_size = self._update_size(size)
+        if total_size is None or total_size > self.max_size:
+            self.evict()
+
+    def _update_size(self, delta: int = 0, total: Optional[int] = None) -> Optional[int]:
+        """
+        在 .size 中累加 delta，或指定 total 时直接写入总大小
+        返回更新后的总大小；记录不存在或无法加锁（Windows）时返回 None，由调用方扫描全部条目
+        """
+        if fcntl is None:
+            return None
+        try:
+            with open(os.path.join(self.cache_dir, self.SIZE_FILE), 'a+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.seek(0)
+                content = f.read().strip()
+                if total is None:
+                    if not content.isdigit():
+                        return None
+                    total = int(content) + delta
+                f.seek(0)
+                f.truncate()
+                f.write(str(total))
+                return total
+        except OSError:
+            return None
+
+    def evict(self):
+        """缓存超出容量时按 LRU 淘汰到容量的 80%"""
+        lock_file = None
+        if fcntl is not None:
+            lock_file = open(os.path.join(self.cache_dir, self.LOCK_FILE), 'w')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # 已有其他进程在淘汰
+                lock_file.close()
+                return
+
+        try:
+            entries = []
+            total_size = 0
+            for shard in os.listdir(self.cache_dir):
+                shard_dir = os.path.join(self.cache_dir, shard)
+                if shard.startswith('.') or not os.path.isdir(shard_dir):
+                    continue
+                for key in os.listdir(shard_dir):
+                    meta_path = os.path.join(shard_dir, key, self.META_FILE)
+                    try:
+                        with open(meta_path, 'r', encoding='utf-8') as f:
+                            size = json.load(f).get('size', 0)
+                        entries.append((os.path.getmtime(meta_path), size, os.path.join(shard_dir, key)))
+                        total_size += size
+                    except (OSError, ValueError):
+                        continue
+
+            if total_size > self.max_size:
+                target_size = self.max_size * 0.8
+                entries.sort()
+                for _, size, path in entries:
+                    if total_size <= target_size:
+                        break
+                    trash = os.path.join(self.cache_dir, f'.trash-{os.path.basename(path)}-{os.getpid()}')
+                    try:
+                        os.rename(path, trash)
+                    except OSError:
+                        continue
+                    shutil.rmtree(trash, ignore_errors=True)
+                    total_size -= size
+
+            # 用扫描得到的实际大小校正记录
+            self._update_size(total=int(total_size))
+        except OSError as e:
+            logger.warning(f"编译缓存淘汰失败: {str(e)}")
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+
+
+def get_compile_cache() -> Optional[CompileCache]:
+    """按配置创建编译缓存，未启用时返回 None"""
+    if not getattr(settings, 'JUDGE_COMPILE_CACHE_ENABLED', True):
+        return None
+    try:
+        return CompileCache()
+    except OSError as e:
+        logger.warning(f"编译缓存不可用: {str(e)}")
+        return None
@@ -0,0 +1,91 @@
+"""
+判题语言配置缓存 - 每个判题进程在内存中缓存已启用的 JudgeConfig
+
+保存或删除 JudgeConfig 时（见 signals.py）更新 Django 缓存中的版本号；各进程每隔
+JUDGE_CONFIG_CACHE_CHECK_INTERVAL 秒读取一次版本号，发现变化后重新加载全部配置。
+缓存后端为进程内的 LocMemCache 时版本号无法跨进程传递，因此另外每隔
+JUDGE_CONFIG_CACHE_MAX_AGE 秒无条件重新加载一次。
+
+判题任务携带语言配置时（judge_task.JudgeTask.config），判题期间在当前线程中覆盖缓存，不访问数据库。
+"""
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Optional
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_CACHE_KEY = 'judge:config_version'
+
+
+class JudgeConfigCache:
+    """进程内的 JudgeConfig 缓存（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._configs: Optional[Dict[str, object]] = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+
+    def get(self, language: str):
+        """获取已启用的语言配置，不存在时返回 None"""
+        return self._get_configs().get(language)
+
+    def invalidate(self):
+        """丢弃本进程的缓存，下次访问时重新加载"""
+        with self._lock:
+            self._configs = None
+
+    def _get_configs(self) -> Dict[str, object]:
+        now = time.monotonic()
+        check_interval = getattr(settings, 'JUDGE_CONFIG_CACHE_CHECK_INTERVAL', 5)
+        max_age = getattr(settings, 'JUDGE_CONFIG_CACHE_MAX_AGE', 60)
+
+        with self._lock:
+            configs = self._configs
+            if configs is not None and now - self._checked_at < check_interval:
+                return configs
+
+            version = cache.get(VERSION_CACHE_KEY)
+            if configs is None or version != self._version or now - self._loaded_at >= max_age:
+                from .models import JudgeConfig
+                configs = {
+                    config.language: config
+                    for config in JudgeConfig.objects.filter(is_enabled=True)
+                }
+                self._configs = configs
+                self._version = version
+                self._loaded_at = now
+            self._checked_at = now
+            return configs
+
+
+_judge_config_cache = JudgeConfigCache()
+_overrides = threading.local()
+
+
+def get_judge_config(language: str):
+    """获取已启用的语言配置（带进程内缓存）"""
+    override = getattr(_overrides, 'configs', {}).get(language)
+    if override is not None:
+        return override
+    return _judge_config_cache.get(language)
+
+
+@contextmanager
+def override_judge_config(config):
+    """在当前线程中使用指定的语言配置（具有 language、compile_command、run_command 等属性）"""
+    configs = getattr(_overrides, 'configs', {})
+    _overrides.configs = dict(configs, **{config.language: config})
+    try:
+        yield
+    finally:
+        _overrides.configs = configs
+
+
+def bump_config_version():
+    """配置发生变化：更新共享版本号，并丢弃本进程的缓存"""
+    cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+    _judge_config_cache.invalidate()
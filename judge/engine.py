@@ -4,11 +4,20 @@ import shlex
 import subprocess
 import tempfile
 import time
-import psutil
-import signal
 from typing import Dict, List, Tuple, Optional
 from django.conf import settings
 from .models import JudgeConfig
+from .config_cache import get_judge_config
+from .compile_cache import CompileCache, get_compile_cache
+from .runner import run_process
+from .compare import compare_output_files
+from .workspace import get_workspace_pool
+from .admission import admit_run
+from .judge_task import CompiledTask, JudgeOutcome, JudgeTask, TestCaseData
+from .case_executor import (
+    POLICY_STOP_ON_FAILURE, execute_test_cases, output_preview,
+    prepare_test_case_files, remove_test_case_files, skipped_test_result
+)
 
 
 class JudgeEngine:
@@ -17,6 +26,7 @@ class JudgeEngine:
     def __init__(self):
         self.judge_dir = getattr(settings, 'JUDGE_DIR', '/tmp/judge')
         self.ensure_judge_dir()
+        self.compile_cache = get_compile_cache()
     
     def ensure_judge_dir(self):
         """确保判题目录存在"""
@@ -59,22 +69,21 @@ class JudgeEngine:
         return shlex.split(command_str, posix=platform.system() != 'Windows')
 
     def get_judge_config(self, language: str) -> Optional[JudgeConfig]:
-        """获取编程语言配置"""
-        try:
-            return JudgeConfig.objects.get(language=language, is_enabled=True)
-        except JudgeConfig.DoesNotExist:
-            return None
+        """获取编程语言配置（进程内缓存，配置修改后几秒内生效）"""
+        return get_judge_config(language)
     
-    def create_temp_file(self, code: str, language: str) -> str:
-        """创建临时文件"""
+    def create_temp_file(self, code: str, language: str, temp_dir: Optional[str] = None) -> str:
+        """创建临时文件（temp_dir 未指定时创建新的临时目录）"""
         config = self.get_judge_config(language)
         if not config:
             raise ValueError(f"不支持的语言: {language}")
         
-        # 创建临时文件
+        # 每个提交使用独立的临时目录，便于识别编译产物
+        if temp_dir is None:
+            temp_dir = tempfile.mkdtemp(dir=self.judge_dir)
         fd, temp_path = tempfile.mkstemp(
             suffix=config.file_extension,
-            dir=self.judge_dir,
+            dir=temp_dir,
             text=True
         )
         
@@ -104,20 +113,45 @@ class JudgeEngine:
             if not compile_cmd:
                 return False, "缺少编译命令"
             
+            # 查找编译缓存
+            cache_key = None
+            if self.compile_cache:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    cache_key = CompileCache.make_key(f.read(), language, config.compile_command)
+                cached = self.compile_cache.lookup(cache_key, file_path)
+                if cached is not None:
+                    return cached
+            
+            file_dir = context['file_dir']
+            files_before = set(os.listdir(file_dir))
+            
             # 执行编译
             result = subprocess.run(
                 compile_cmd,
                 capture_output=True,
                 text=False,
                 timeout=30,  # 编译超时30秒
-                cwd=self.judge_dir
+                cwd=file_dir
             )
             
             if result.returncode == 0:
-                return True, ""
+                success, error = True, ""
             else:
-                stderr = result.stderr.decode('utf-8', errors='replace') if result.stderr else ''
-                return False, stderr
+                success = False
+                error = result.stderr.decode('utf-8', errors='replace') if result.stderr else ''
+            
+            # 编译成功和编译错误都写入缓存
+            if cache_key:
+                artifacts = [] if not success else [
+                    name for name in sorted(set(os.listdir(file_dir)) - files_before)
+                    if os.path.isfile(os.path.join(file_dir, name))
+                ]
+                try:
+                    self.compile_cache.store(cache_key, file_path, success, error, artifacts)
+                except OSError:
+                    pass
+            
+            return success, error
                 
         except subprocess.TimeoutExpired:
             return False, "编译超时"
@@ -141,95 +175,45 @@ class JudgeEngine:
 
             if not run_cmd:
                 return "", "缺少运行命令", 0, 0, "system_error"
+        except Exception as e:
+            return "", f"运行错误: {str(e)}", 0, 0, "system_error"
+        
+        return self.execute(run_cmd, context['file_dir'], input_data, time_limit, memory_limit)
+    
+    def execute(self, run_cmd: List[str], cwd: str, input_data: Optional[str],
+                time_limit: int, memory_limit: int,
+                output_limit: Optional[int] = None,
+                input_file: Optional[str] = None,
+                output_file: Optional[str] = None) -> Tuple[str, str, int, int, str]:
+        """
+        执行已构建好的运行命令（不访问数据库，可在线程池中并发调用）
+        指定 input_file/output_file 时标准输入/输出直接使用文件，返回的输出为空
+        返回: (输出, 错误信息, 运行时间, 内存使用, 状态)
+        """
+        try:
+            # 运行并通过 wait4 获取 CPU 时间和峰值内存
+            input_bytes = None if input_file else (input_data or '').encode('utf-8')
+            result = run_process(run_cmd, cwd, input_bytes, time_limit, memory_limit,
+                                 output_limit=output_limit,
+                                 input_file=input_file,
+                                 output_file=output_file)
             
-            # 记录开始时间
-            start_time = time.time()
+            stdout_text = result['stdout'].decode('utf-8', errors='replace')
+            stderr_text = result['stderr'].decode('utf-8', errors='replace')
+            run_time = result['time_used']
+            max_memory = result['memory_used']
+            status = result['status']
             
-            # 启动进程
-            if platform.system() == 'Windows':
-                # Windows系统不支持preexec_fn
-                process = subprocess.Popen(
-                    run_cmd,
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=False,
-                    cwd=self.judge_dir
-                )
-            else:
-                # Unix系统使用preexec_fn创建新的进程组
-                process = subprocess.Popen(
-                    run_cmd,
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=False,
-                    cwd=self.judge_dir,
-                    preexec_fn=os.setsid
-                )
+            if status == 'time_limit_exceeded':
+                return "", "运行超时", run_time, max_memory, status
             
-            # 监控进程
-            max_memory = 0
+            if status == 'memory_limit_exceeded':
+                return "", "内存超限", run_time, max_memory, status
             
-            try:
-                # 发送输入数据
-                input_bytes = (input_data or '').encode('utf-8')
-                stdout, stderr = process.communicate(
-                    input=input_bytes,
-                    timeout=time_limit / 1000.0  # 转换为秒
-                )
-                
-                # 计算运行时间
-                end_time = time.time()
-                run_time = int((end_time - start_time) * 1000)  # 转换为毫秒
-                
-                # 检查内存使用
-                try:
-                    process_info = psutil.Process(process.pid)
-                    max_memory = int(process_info.memory_info().rss / 1024)  # 转换为KB
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    max_memory = 0
-                
-                stdout_text = stdout.decode('utf-8', errors='replace') if stdout else ''
-                stderr_text = stderr.decode('utf-8', errors='replace') if stderr else ''
-
-                # 检查是否超时
-                if run_time > time_limit:
-                    return "", "运行超时", run_time, max_memory, "time_limit_exceeded"
-                
-                # 检查内存限制
-                if max_memory > memory_limit * 1024:  # 转换为KB
-                    return "", "内存超限", run_time, max_memory, "memory_limit_exceeded"
-                
-                # 检查是否有运行时错误
-                if process.returncode != 0:
-                    return stdout_text, stderr_text, run_time, max_memory, "runtime_error"
-                
-                return stdout_text, stderr_text, run_time, max_memory, "accepted"
-                
-            except subprocess.TimeoutExpired:
-                # 超时处理
-                try:
-                    if platform.system() == 'Windows':
-                        # Windows系统直接终止进程
-                        process.terminate()
-                        process.wait(timeout=5)
-                    else:
-                        # Unix系统终止进程组
-                        os.killpg(os.getpgid(process.pid), signal.SIGTERM)
-                        process.wait(timeout=5)
-                except:
-                    try:
-                        if platform.system() == 'Windows':
-                            process.kill()
-                        else:
-                            os.killpg(os.getpgid(process.pid), signal.SIGKILL)
-                    except:
-                        pass
-                
-                end_time = time.time()
-                run_time = int((end_time - start_time) * 1000)
-                return "", "运行超时", run_time, max_memory, "time_limit_exceeded"
+            if status == 'output_limit_exceeded':
+                return "", "输出超限", run_time, max_memory, status
+            
+            return stdout_text, stderr_text, run_time, max_memory, status
                 
         except Exception as e:
             return "", f"运行错误: {str(e)}", 0, 0, "system_error"
@@ -242,115 +226,170 @@ class JudgeEngine:
         
         return expected == actual
     
-    def judge_submission(self, submission) -> Dict:
-        """判题主函数"""
-        from .models import JudgeResult
-        
+    def judge_test_case(self, test_case: TestCaseData, run_cmd: List[str], cwd: str,
+                        task: JudgeTask, data_dir: str) -> Dict:
+        """运行单个测试用例并比较输出（输入、输出和标准答案均通过文件传递）"""
+        input_file, answer_file, output_file = prepare_test_case_files(test_case, data_dir)
         try:
-            # 获取题目和测试用例
-            problem = submission.problem
-            test_cases = problem.test_cases.filter(is_sample=False)
+            # 主机上有足够的内存和 CPU 时才启动
+            with admit_run(task, run_cmd):
+                _, error, run_time, memory, status = self.execute(
+                    run_cmd,
+                    cwd,
+                    None,
+                    task.time_limit,
+                    task.memory_limit,
+                    task.output_limit,
+                    input_file=input_file,
+                    output_file=output_file
+                )
+            
+            # 分块比较输出文件与标准答案文件
+            if status == 'accepted':
+                if compare_output_files(answer_file, output_file):
+                    test_status = 'accepted'
+                    score = 10
+                else:
+                    test_status = 'wrong_answer'
+                    score = 0
+            else:
+                test_status = status
+                score = 0
             
-            if not test_cases.exists():
-                return {
-                    'status': 'system_error',
-                    'score': 0,
-                    'error_message': '没有找到测试用例',
-                    'test_results': []
-                }
+            # 超时、超内存、超输出时不展示输出
+            if status in ('accepted', 'runtime_error'):
+                actual_output = output_preview(output_file)
+            else:
+                actual_output = ''
+        finally:
+            remove_test_case_files(data_dir, input_file, answer_file, output_file)
+        
+        return {
+            'test_case_id': test_case.id,
+            'input': test_case.input_preview,
+            'expected_output': test_case.output_preview,
+            'actual_output': actual_output,
+            'status': test_status,
+            'score': score,
+            'time_used': run_time,
+            'memory_used': memory,
+            'error': error if error else ''
+        }
+    
+    def judge_submission(self, submission, parallelism: Optional[int] = None) -> Dict:
+        """判题主函数（从数据库读取提交，见 tasks.build_judge_task）"""
+        from .tasks import build_judge_task
+        return self.judge_task(build_judge_task(submission), parallelism).to_dict()
+    
+    def judge_task(self, task: JudgeTask, parallelism: Optional[int] = None) -> JudgeOutcome:
+        """判题（只使用任务中的数据，不访问数据库）"""
+        compiled = self.compile_task(task)
+        if isinstance(compiled, JudgeOutcome):
+            return compiled
+        return self.run_compiled(compiled, parallelism)
+    
+    def compile_task(self, task: JudgeTask):
+        """
+        判题的编译阶段: 取得工作区并编译
+        返回: 编译成功时为 CompiledTask（之后必须调用 run_compiled），否则为最终的 JudgeOutcome
+        """
+        try:
+            if not task.test_cases:
+                return JudgeOutcome(status='system_error', error_message='没有找到测试用例')
             
-            # 创建临时文件
-            temp_file = self.create_temp_file(submission.code, submission.language)
+            # 从工作区池取得工作区，测试数据和用户输出放在代码目录之外
+            workspace_pool = get_workspace_pool()
+            workspace = workspace_pool.acquire()
             
             try:
-                # 编译代码
-                compile_success, compile_error = self.compile_code(temp_file, submission.language)
-                if not compile_success:
-                    return {
-                        'status': 'compile_error',
-                        'score': 0,
-                        'error_message': compile_error,
-                        'test_results': []
-                    }
-                
-                # 运行测试用例
-                test_results = []
-                total_score = 0
-                max_score = test_cases.count() * 10  # 每个测试用例10分
-                max_time = 0
-                max_memory = 0
-                final_status = 'accepted'
-                
-                for test_case in test_cases:
-                    # 运行代码
-                    output, error, run_time, memory, status = self.run_code(
-                        temp_file,
-                        submission.language,
-                        test_case.input_data,
-                        problem.time_limit,
-                        problem.memory_limit
-                    )
-                    
-                    # 更新最大时间和内存
-                    max_time = max(max_time, run_time)
-                    max_memory = max(max_memory, memory)
+                with task.language_config():
+                    temp_file = self.create_temp_file(task.code, task.language, workspace.code_dir)
                     
-                    # 比较输出
-                    if status == 'accepted':
-                        if self.compare_output(test_case.expected_output, output):
-                            test_status = 'accepted'
-                            score = 10
-                            total_score += score
-                        else:
-                            test_status = 'wrong_answer'
-                            final_status = 'wrong_answer'
-                            score = 0
+                    # 编译代码
+                    compile_start = time.time()
+                    compile_success, compile_error = self.compile_code(temp_file, task.language)
+                    compile_time = int((time.time() - compile_start) * 1000)
+                    if not compile_success:
+                        outcome = JudgeOutcome(status='compile_error', compile_time=compile_time,
+                                               error_message=compile_error)
+                    elif not workspace.within_quota():
+                        outcome = JudgeOutcome(status='compile_error', compile_time=compile_time,
+                                               error_message='编译产物超过工作区大小限制')
                     else:
-                        test_status = status
-                        final_status = status
-                        score = 0
+                        # 运行命令只构建一次
+                        config = self.get_judge_config(task.language)
+                        run_cmd = self.build_command(config.run_command, self.build_command_context(temp_file))
+                        if run_cmd:
+                            sandbox = {
+                                'workspace': workspace,
+                                'temp_dir': workspace.code_dir,
+                                'data_dir': workspace.data_dir,
+                                'code_file': temp_file,
+                            }
+                            return CompiledTask(task=task, sandbox=sandbox, run_cmd=run_cmd,
+                                                compile_time=compile_time)
+                        outcome = JudgeOutcome(status='system_error', error_message='缺少运行命令')
+            except Exception:
+                workspace_pool.release(workspace)
+                raise
+            
+            workspace_pool.release(workspace)
+            return outcome
                     
-                    test_results.append({
-                        'test_case_id': test_case.id,
-                        'input': test_case.input_data,
-                        'expected_output': test_case.expected_output,
-                        'actual_output': output,
-                        'status': test_status,
-                        'score': score,
-                        'time_used': run_time,
-                        'memory_used': memory,
-                        'error': error if error else ''
-                    })
-                
-                # 计算最终得分
-                final_score = int((total_score / max_score) * 100) if max_score > 0 else 0
-                
-                return {
-                    'status': final_status,
-                    'score': final_score,
-                    'time_used': max_time,
-                    'memory_used': max_memory,
-                    'error_message': '',
-                    'test_results': test_results
-                }
-                
-            finally:
-                # 清理临时文件
-                try:
-                    os.unlink(temp_file)
-                    # 清理可能的可执行文件
-                    if submission.language == 'cpp':
-                        context = self.build_command_context(temp_file)
-                        executable_path = context.get('executable_path')
-                        if executable_path and os.path.exists(executable_path):
-                            os.unlink(executable_path)
-                except Exception:
-                    pass
+        except Exception as e:
+            return JudgeOutcome(status='system_error', error_message=f"系统错误: {str(e)}")
+    
+    def run_compiled(self, compiled: CompiledTask, parallelism: Optional[int] = None) -> JudgeOutcome:
+        """判题的运行阶段: 运行全部测试用例并汇总结果，结束后归还工作区"""
+        task = compiled.task
+        sandbox = compiled.sandbox
+        try:
+            test_cases = task.test_cases
+            
+            # 运行测试用例（可并发，结果顺序与测试用例顺序一致）
+            # ACM 赛制下遇到第一个未通过的测试用例即停止，其余标记为 skipped
+            stop_on_failure = task.policy == POLICY_STOP_ON_FAILURE
+            case_results = execute_test_cases(
+                lambda test_case: self.judge_test_case(
+                    test_case, compiled.run_cmd, sandbox['temp_dir'], task, sandbox['data_dir']
+                ),
+                test_cases,
+                parallelism,
+                stop_on_failure
+            )
+            test_results = [
+                result if result is not None else skipped_test_result(test_case)
+                for test_case, result in zip(test_cases, case_results)
+            ]
+            
+            total_score = 0
+            max_score = len(test_cases) * 10  # 每个测试用例10分
+            max_time = 0
+            max_memory = 0
+            final_status = 'accepted'
+            
+            for test_result in test_results:
+                # 更新最大时间和内存
+                max_time = max(max_time, test_result['time_used'])
+                max_memory = max(max_memory, test_result['memory_used'])
+                total_score += test_result['score']
+                if test_result['status'] not in ('accepted', 'skipped'):
+                    final_status = test_result['status']
+            
+            # 计算最终得分
+            final_score = int((total_score / max_score) * 100) if max_score > 0 else 0
+            
+            return JudgeOutcome(
+                status=final_status,
+                score=final_score,
+                time_used=max_time,
+                memory_used=max_memory,
+                compile_time=compiled.compile_time,
+                test_results=test_results
+            )
                     
         except Exception as e:
-            return {
-                'status': 'system_error',
-                'score': 0,
-                'error_message': f"系统错误: {str(e)}",
-                'test_results': []
-            }
+            return JudgeOutcome(status='system_error', error_message=f"系统错误: {str(e)}")
+        finally:
+            # 清空并归还工作区（源文件、编译产物及测试数据）
+            get_workspace_pool().release(sandbox['workspace'])
@@ -6,6 +6,8 @@ import platform
 from django.conf import settings
 from .engine import JudgeEngine
 from .sandbox_engine import SandboxEngine
+from .cgroup import CgroupError
+from .cgroup_engine import CgroupEngine
 from .docker_engine import DockerJudgeEngine
 
 
@@ -24,19 +26,25 @@ class JudgeEngineFactory:
                 # Windows系统使用基础引擎
                 return JudgeEngine()
             else:
-                # Linux系统优先使用Docker引擎
+                # Linux系统优先使用Docker引擎，其次是cgroup引擎
                 try:
                     docker_engine = DockerJudgeEngine()
                     if docker_engine.test_connection():
                         return docker_engine
-                    else:
-                        return SandboxEngine()
                 except:
-                    return SandboxEngine()
+                    pass
+                if CgroupEngine.is_available():
+                    try:
+                        return CgroupEngine()
+                    except CgroupError:
+                        pass
+                return SandboxEngine()
         
         # 根据配置选择引擎
         elif engine_type == 'docker':
             return DockerJudgeEngine()
+        elif engine_type == 'cgroup':
+            return CgroupEngine()
         elif engine_type == 'sandbox':
             return SandboxEngine()
         elif engine_type == 'basic':
@@ -58,6 +66,9 @@ class JudgeEngineFactory:
         except:
             pass
         
+        if CgroupEngine.is_available():
+            engines.append('cgroup')
+        
         return engines
     
     @staticmethod
@@ -67,6 +78,8 @@ class JudgeEngineFactory:
             if engine_type == 'docker':
                 engine = DockerJudgeEngine()
                 return engine.test_connection()
+            elif engine_type == 'cgroup':
+                return CgroupEngine.is_available()
             elif engine_type == 'sandbox':
                 engine = SandboxEngine()
                 return True  # 沙箱引擎总是可用
@@ -0,0 +1,112 @@
+"""
+判题任务数据 - 判题引擎的输入和输出，不依赖数据库
+
+JudgeTask 包含判一次提交所需的全部信息（代码、语言配置、限制、判题策略和测试用例），
+JudgeOutcome 为判题结果。两者都只包含普通数据，可以 pickle 后交给其他进程或其他主机上的引擎，
+引擎判题期间不访问数据库。从 Submission 构建 JudgeTask 见 tasks.build_judge_task，
+离线批量判题见 judge_local 命令。
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from .config_cache import override_judge_config
+
+
+@dataclass(slots=True)
+class LanguageConfig:
+    """语言配置（JudgeConfig 的快照）"""
+    language: str
+    compile_command: str
+    run_command: str
+    file_extension: str
+    warm_runner: bool = False
+    memory_limit_multiplier: float = 1.0
+
+    @classmethod
+    def from_model(cls, config) -> 'LanguageConfig':
+        return cls(
+            language=config.language,
+            compile_command=config.compile_command,
+            run_command=config.run_command,
+            file_extension=config.file_extension,
+            warm_runner=config.warm_runner,
+            memory_limit_multiplier=config.memory_limit_multiplier,
+        )
+
+
+@dataclass(slots=True)
+class TestCaseData:
+    """
+    测试用例
+    测试数据来自测试数据存储（input_hash/output_hash），或直接指定文件（input_file/output_file）
+    """
+    id: int
+    input_hash: str = ''
+    output_hash: str = ''
+    input_file: str = ''
+    output_file: str = ''
+    input_preview: str = ''
+    output_preview: str = ''
+
+
+@dataclass(slots=True)
+class JudgeTask:
+    """
+    一次判题
+    time_limit: CPU 时间限制(ms)，memory_limit: 内存限制(MB)，output_limit: 输出限制(MB)，None 表示默认值
+    config: 语言配置，为 None 时按 language 读取已启用的 JudgeConfig
+    """
+    code: str
+    language: str
+    time_limit: int
+    memory_limit: int
+    test_cases: List[TestCaseData]
+    output_limit: Optional[int] = None
+    policy: str = 'run_all'
+    config: Optional[LanguageConfig] = None
+    submission_id: Optional[int] = None
+
+    @contextmanager
+    def language_config(self):
+        """判题期间使用任务携带的语言配置"""
+        if self.config is None:
+            yield
+            return
+        with override_judge_config(self.config):
+            yield
+
+
+@dataclass(slots=True)
+class CompiledTask:
+    """
+    编译成功、等待运行测试用例的判题任务（引擎的 compile_task 返回，run_compiled 运行）
+    sandbox 为本进程的判题工作区，不能交给其他进程；run_compiled 结束后归还
+    """
+    task: JudgeTask
+    sandbox: Dict
+    run_cmd: List[str]
+    compile_time: int = 0
+
+
+@dataclass(slots=True)
+class JudgeOutcome:
+    """判题结果，test_results 中每项为一个测试用例的结果字典"""
+    status: str
+    score: int = 0
+    time_used: int = 0
+    memory_used: int = 0
+    compile_time: int = 0
+    error_message: str = ''
+    test_results: List[Dict] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        """转换为 tasks.save_judge_result 使用的结果字典"""
+        return {
+            'status': self.status,
+            'score': self.score,
+            'time_used': self.time_used,
+            'memory_used': self.memory_used,
+            'compile_time': self.compile_time,
+            'error_message': self.error_message,
+            'test_results': self.test_results,
+        }
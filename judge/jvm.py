@@ -0,0 +1,401 @@
+"""
+JVM 启动加速 - 为 Java 提交维护 AppCDS（类数据共享）归档，并为每次运行附加 JVM 参数
+
+Java 程序每个测试用例都要启动一次 JVM，大部分时间花在加载、解析和校验 JDK 的类上。
+每台判题机用一个预热程序记录解题常用的 JDK 类（-XX:DumpLoadedClassList），生成静态 CDS 归档（-Xshare:dump），
+之后每次运行通过 -XX:SharedArchiveFile 直接映射归档中已解析的类数据。
+
+归档目录结构:
+    <JUDGE_JVM_DIR>/<key>/judge.jsa   CDS 归档
+    <JUDGE_JVM_DIR>/<key>/meta.json   生成结果: 可用的 JVM 参数、是否使用归档、JVM 自身的内存开销
+key 由 JDK 路径、lib/modules 的大小和修改时间以及 JVM 参数计算，JDK 升级或参数修改后自动重新生成。
+多个判题进程通过文件锁保证同一归档只生成一次；生成失败同样会记录，JDK 变化之前不再重试。
+
+内存: 堆大小由 -Xmx 限制为题目的内存限制，JVM 自身的开销（运行空程序时的内存峰值）不计入内存限制，
+也从报告的内存中扣除。JVM 预留的虚拟地址空间远大于实际使用的内存，因此不使用 RLIMIT_AS 限制 JVM。
+"""
+import hashlib
+import json
+import logging
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+from django.conf import settings
+from .runner import run_process
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FILE = 'judge.jsa'
+META_FILE = 'meta.json'
+LOCK_FILE = '.build.lock'
+BUILD_TIMEOUT = 120  # 秒，生成归档每一步的超时时间
+# 归档格式或预热程序修改后递增，使已有的归档失效
+BUILD_VERSION = 1
+
+# JVM 警告默认输出到标准输出，会被当作程序输出；统一改为输出到标准错误
+LOG_OPTIONS = ['-Xlog:disable', '-Xlog:all=warning:stderr']
+
+# 预热程序: 使用解题常用的输入输出、集合、排序、字符串、大数和 Stream API，记录加载的 JDK 类
+WARMUP_CLASS = 'JudgeWarmup'
+WARMUP_SOURCE = '''\
+import java.io.*;
+import java.math.*;
+import java.util.*;
+import java.util.function.*;
+import java.util.stream.*;
+
+public class JudgeWarmup {
+    public static void main(String[] args) throws IOException {
+        BufferedReader reader = new BufferedReader(new InputStreamReader(System.in));
+        StringTokenizer tokenizer = new StringTokenizer(reader.readLine());
+        int n = Integer.parseInt(tokenizer.nextToken());
+        long m = Long.parseLong(tokenizer.nextToken());
+        Scanner scanner = new Scanner(reader);
+        double d = scanner.nextDouble();
+        String word = scanner.next();
+        PrintWriter out = new PrintWriter(new BufferedWriter(new OutputStreamWriter(System.out)));
+
+        int[] a = new int[n];
+        for (int i = 0; i < n; i++) {
+            a[i] = (int) ((m * i) % 1000);
+        }
+        Arrays.sort(a);
+        long[] b = new long[n];
+        Arrays.fill(b, m);
+        Arrays.sort(b);
+        Integer[] boxed = new Integer[n];
+        for (int i = 0; i < n; i++) {
+            boxed[i] = a[i];
+        }
+        Arrays.sort(boxed, Collections.reverseOrder());
+
+        List<Integer> list = new ArrayList<>(Arrays.asList(boxed));
+        Collections.sort(list);
+        list.sort((x, y) -> Integer.compare(y, x));
+        LinkedList<Integer> linked = new LinkedList<>(list);
+        Map<String, Integer> hashMap = new HashMap<>();
+        TreeMap<Integer, Integer> treeMap = new TreeMap<>();
+        for (int x : list) {
+            hashMap.merge(String.valueOf(x), 1, Integer::sum);
+            treeMap.put(x, treeMap.getOrDefault(x, 0) + 1);
+        }
+        Set<Integer> hashSet = new HashSet<>(list);
+        TreeSet<Integer> treeSet = new TreeSet<>(list);
+        Deque<Integer> deque = new ArrayDeque<>();
+        PriorityQueue<long[]> heap = new PriorityQueue<>((x, y) -> Long.compare(x[0], y[0]));
+        for (int x : treeSet) {
+            deque.addLast(x);
+            heap.add(new long[]{x, m});
+        }
+        long polled = 0;
+        while (!heap.isEmpty()) {
+            polled += heap.poll()[0];
+        }
+        for (Map.Entry<String, Integer> entry : hashMap.entrySet()) {
+            polled += entry.getValue();
+        }
+        BitSet bits = new BitSet(n);
+        bits.set(1);
+
+        long sum = list.stream().mapToLong(Integer::longValue).sum();
+        String joined = IntStream.range(0, n).mapToObj(Integer::toString).collect(Collectors.joining(" "));
+        List<Integer> even = list.stream().filter(x -> x % 2 == 0).sorted().collect(Collectors.toList());
+        Map<Integer, Long> groups = list.stream().collect(Collectors.groupingBy(x -> x % 3, Collectors.counting()));
+        Optional<Integer> max = list.stream().max(Integer::compare);
+        Function<Integer, Integer> twice = x -> x * 2;
+        Supplier<String> supplier = () -> word;
+
+        BigInteger big = BigInteger.valueOf(m).pow(5).mod(BigInteger.valueOf(1000000007L));
+        BigDecimal decimal = new BigDecimal(d).setScale(3, RoundingMode.HALF_UP);
+        StringBuilder builder = new StringBuilder(word).reverse();
+        builder.append(Math.max(n, 1)).append(Math.abs(-d)).append(Math.sqrt(d)).append(Math.pow(2, 10));
+        char[] chars = word.toCharArray();
+        Arrays.sort(chars);
+
+        out.println(String.format("%d %.3f %s", sum, d, builder));
+        out.println(joined);
+        out.println(String.join(",", word, word.toUpperCase(), new String(chars), supplier.get()));
+        out.println(Arrays.toString(a) + " " + even.size() + " " + groups + " " + max.orElse(0));
+        out.println(big + " " + decimal + " " + twice.apply(n) + " " + polled + " " + bits.cardinality());
+        out.printf("%d %d %d %d%n", hashSet.size(), linked.peekFirst(), deque.peekLast(), treeMap.firstKey());
+        out.flush();
+        System.out.println(Character.isDigit(word.charAt(0)) + " " + word.substring(1) + " " + Double.parseDouble("1.5"));
+    }
+}
+'''
+WARMUP_INPUT = b'8 7\n3.5 judge\n'
+
+# 测量 JVM 自身内存开销的空程序
+EMPTY_CLASS = 'JudgeEmpty'
+EMPTY_SOURCE = '''\
+public class JudgeEmpty {
+    public static void main(String[] args) {
+        System.out.println();
+    }
+}
+'''
+
+
+def is_jvm_command(command: List[str]) -> bool:
+    """是否为启动 JVM 的运行命令"""
+    return bool(command) and os.path.basename(command[0]) in ('java', 'java.exe')
+
+
+def get_jvm_options() -> List[str]:
+    """每次运行附加的 JVM 参数（JUDGE_JVM_OPTIONS）"""
+    return shlex.split(getattr(settings, 'JUDGE_JVM_OPTIONS', ''))
+
+
+def get_jvm_dir() -> str:
+    judge_dir = getattr(settings, 'JUDGE_DIR', '/tmp/judge')
+    return str(getattr(settings, 'JUDGE_JVM_DIR', '') or os.path.join(judge_dir, 'jvm'))
+
+
+def resolve_java(java: str) -> Optional[str]:
+    """java 可执行文件的真实路径（解析 PATH 和 /etc/alternatives 等符号链接）"""
+    path = java if os.path.isabs(java) else shutil.which(java)
+    return os.path.realpath(path) if path else None
+
+
+def runtime_key(java_path: str) -> str:
+    """归档的键: JDK 路径、lib/modules（JDK 的类库）的大小和修改时间、JVM 参数"""
+    java_home = os.path.dirname(os.path.dirname(java_path))
+    modules = os.path.join(java_home, 'lib', 'modules')
+    stat = os.stat(modules if os.path.exists(modules) else java_path)
+    digest = hashlib.sha256()
+    for part in (str(BUILD_VERSION), java_path, str(stat.st_size), str(stat.st_mtime_ns),
+                 str(getattr(settings, 'JUDGE_JVM_CDS_ENABLED', True)), ' '.join(get_jvm_options())):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()[:16]
+
+
+_runtimes: Dict[str, Dict] = {}
+_runtimes_lock = threading.Lock()
+
+
+def get_jvm_runtime(java: str) -> Optional[Dict]:
+    """
+    获取（必要时生成）指定 java 的运行参数
+    返回: {
+        'options'           每次运行附加的 JVM 参数（已验证当前 JDK 支持）
+        'archive'           CDS 归档路径，未生成时为 None
+        'memory_overhead'   JVM 自身的内存开销(KB)
+    }
+    找不到 java 时返回 None
+    """
+    java_path = resolve_java(java)
+    if not java_path:
+        return None
+    try:
+        key = runtime_key(java_path)
+    except OSError:
+        return None
+
+    with _runtimes_lock:
+        runtime = _runtimes.get(key)
+        if runtime is None:
+            runtime = _load_or_build(java_path, key)
+            _runtimes[key] = runtime
+        return runtime
+
+
+def build_jvm_command(command: List[str], memory_limit: int) -> List[str]:
+    """
+    为 JVM 运行命令附加参数: CDS 归档、JUDGE_JVM_OPTIONS 和堆大小限制
+    memory_limit: 内存限制(MB)，作为最大堆大小
+    """
+    runtime = get_jvm_runtime(command[0])
+    options = []
+    if runtime is not None:
+        options.extend(runtime['options'])
+        if runtime['archive']:
+            options.extend(['-Xshare:auto', f"-XX:SharedArchiveFile={runtime['archive']}"])
+    options.append(f'-Xmx{memory_limit}m')
+    return command[:1] + options + command[1:]
+
+
+def get_jvm_memory_overhead(command: List[str]) -> int:
+    """不计入内存限制的 JVM 自身内存开销(KB)，JUDGE_JVM_MEMORY_OVERHEAD(MB) 为 0 时使用测得的值"""
+    configured = getattr(settings, 'JUDGE_JVM_MEMORY_OVERHEAD', 0)
+    if configured:
+        return configured * 1024
+    runtime = get_jvm_runtime(command[0])
+    return runtime['memory_overhead'] if runtime is not None else 0
+
+
+def _load_or_build(java_path: str, key: str) -> Dict:
+    jvm_dir = get_jvm_dir()
+    entry = os.path.join(jvm_dir, key)
+    runtime = _load_meta(entry)
+    if runtime is not None:
+        return runtime
+
+    os.makedirs(jvm_dir, exist_ok=True)
+    lock_file = open(os.path.join(jvm_dir, LOCK_FILE), 'w')
+    try:
+        if fcntl is not None:
+            # 其他判题进程正在生成时等待其完成
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        runtime = _load_meta(entry)
+        if runtime is not None:
+            return runtime
+
+        start_time = time.monotonic()
+        work_dir = tempfile.mkdtemp(prefix='.build-', dir=jvm_dir)
+        try:
+            meta = _build(java_path, work_dir)
+            with open(os.path.join(work_dir, META_FILE), 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.rename(work_dir, entry)
+        except OSError as e:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            logger.warning(f"生成 JVM 运行参数失败: {str(e)}")
+            return {'options': [], 'archive': None, 'memory_overhead': 0}
+
+        logger.info(
+            f"JVM 运行参数已生成: {java_path}，CDS 归档: {'是' if meta['archive'] else '否'}，"
+            f"JVM 内存开销: {meta['memory_overhead']}KB，耗时 {time.monotonic() - start_time:.1f}秒"
+        )
+        _remove_stale_entries(jvm_dir, java_path, key)
+        return _load_meta(entry)
+    finally:
+        lock_file.close()
+
+
+def _load_meta(entry: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(entry, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return {
+        'options': meta['options'],
+        'archive': os.path.join(entry, ARCHIVE_FILE) if meta['archive'] else None,
+        'memory_overhead': meta['memory_overhead'],
+    }
+
+
+def _build(java_path: str, work_dir: str) -> Dict:
+    """在 work_dir 中编译预热程序、生成归档并测量 JVM 内存开销，返回 meta.json 的内容"""
+    options = get_jvm_options()
+    meta = {'java': java_path, 'options': [], 'archive': False, 'memory_overhead': 0,
+            'created_at': time.time()}
+
+    class_dir = os.path.join(work_dir, 'classes')
+    if not _compile_programs(java_path, class_dir):
+        return meta
+
+    archive = os.path.join(work_dir, ARCHIVE_FILE)
+    if getattr(settings, 'JUDGE_JVM_CDS_ENABLED', True):
+        _dump_archive(java_path, options, class_dir, work_dir, archive)
+
+    # 依次尝试: 归档 + 参数、仅参数、不加参数，使用第一组能正常运行的参数（旧版本 JDK 可能不支持部分参数）
+    candidates = []
+    if os.path.exists(archive):
+        candidates.append((options + LOG_OPTIONS, ['-Xshare:on', f'-XX:SharedArchiveFile={archive}'], True))
+    candidates.append((options + LOG_OPTIONS, [], False))
+    candidates.append(([], [], False))
+    for candidate_options, archive_options, use_archive in candidates:
+        result = run_process(
+            [java_path] + candidate_options + archive_options + ['-cp', class_dir, EMPTY_CLASS],
+            work_dir, b'', 10000, 4096
+        )
+        if result['status'] == 'accepted':
+            meta['options'] = candidate_options
+            meta['archive'] = use_archive
+            meta['memory_overhead'] = result['memory_used']
+            break
+        logger.warning(
+            f"JVM 参数不可用: {' '.join(candidate_options + archive_options)}: "
+            f"{result['stderr'].decode('utf-8', errors='replace')[:500]}"
+        )
+
+    shutil.rmtree(class_dir, ignore_errors=True)
+    if not meta['archive'] and os.path.exists(archive):
+        os.remove(archive)
+    for name in os.listdir(work_dir):
+        if name not in (ARCHIVE_FILE, META_FILE):
+            os.remove(os.path.join(work_dir, name))
+    return meta
+
+
+def _run(command: List[str], cwd: str, input_data: bytes = b'') -> bool:
+    try:
+        result = subprocess.run(command, cwd=cwd, input=input_data, capture_output=True,
+                                timeout=BUILD_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"{' '.join(command[:3])} 执行失败: {str(e)}")
+        return False
+    if result.returncode != 0:
+        logger.warning(
+            f"{' '.join(command[:3])} 执行失败: {result.stderr.decode('utf-8', errors='replace')[:500]}"
+        )
+        return False
+    return True
+
+
+def _compile_programs(java_path: str, class_dir: str) -> bool:
+    """用同一个 JDK 的 javac 编译预热程序和空程序"""
+    javac = os.path.join(os.path.dirname(java_path), 'javac')
+    if not os.path.exists(javac):
+        javac = shutil.which('javac')
+    if not javac:
+        logger.warning("未找到 javac，无法生成 CDS 归档")
+        return False
+
+    source_dir = os.path.dirname(class_dir)
+    sources = []
+    for class_name, source in ((WARMUP_CLASS, WARMUP_SOURCE), (EMPTY_CLASS, EMPTY_SOURCE)):
+        path = os.path.join(source_dir, f'{class_name}.java')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(source)
+        sources.append(path)
+    os.makedirs(class_dir, exist_ok=True)
+    return _run([javac, '-encoding', 'UTF-8', '-d', class_dir] + sources, source_dir)
+
+
+def _dump_archive(java_path: str, options: List[str], class_dir: str, work_dir: str, archive: str):
+    """运行预热程序记录加载的类，只为 JDK 的类生成静态 CDS 归档"""
+    class_list = os.path.join(work_dir, 'classes.lst')
+    if not _run([java_path, '-Xshare:off', f'-XX:DumpLoadedClassList={class_list}'] + options +
+                ['-cp', class_dir, WARMUP_CLASS], work_dir, WARMUP_INPUT):
+        return
+
+    # 去掉预热程序自身的类（默认包中的类名不含 '/'）以及引用它们的 lambda 代理，
+    # 归档中只有 JDK 的类，用户程序的类路径不受归档限制
+    jdk_list = os.path.join(work_dir, 'jdk-classes.lst')
+    with open(class_list, 'r', encoding='utf-8') as src, open(jdk_list, 'w', encoding='utf-8') as dst:
+        for line in src:
+            name = line.split(' ', 1)[0].strip()
+            if line.startswith('#') or line.startswith('@lambda-form-invoker') or \
+                    ('/' in name and not name.startswith('@')):
+                dst.write(line)
+
+    _run([java_path, '-Xshare:dump', f'-XX:SharedClassListFile={jdk_list}',
+          f'-XX:SharedArchiveFile={archive}'] + options, work_dir)
+
+
+def _remove_stale_entries(jvm_dir: str, java_path: str, key: str):
+    """删除同一 java 的旧归档（JDK 升级或参数修改之前生成的）"""
+    for name in os.listdir(jvm_dir):
+        if name == key or name.startswith('.'):
+            continue
+        entry = os.path.join(jvm_dir, name)
+        try:
+            with open(os.path.join(entry, META_FILE), 'r', encoding='utf-8') as f:
+                if json.load(f).get('java') != java_path:
+                    continue
+        except (OSError, ValueError):
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
@@ -0,0 +1,309 @@
+import json
+import multiprocessing
+import os
+import platform
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from judge.case_executor import POLICY_RUN_ALL, POLICY_STOP_ON_FAILURE
+from judge.compare import read_preview
+from judge.judge_task import JudgeOutcome, JudgeTask, LanguageConfig, TestCaseData
+from judge.models import JudgeConfig
+from judge.supervisor import get_cpu_count
+
+# 解答所在的子目录名表示期望的判题结果
+EXPECTED_STATUS_ALIASES = {
+    'accepted': 'accepted', 'ac': 'accepted',
+    'wrong_answer': 'wrong_answer', 'wa': 'wrong_answer',
+    'time_limit_exceeded': 'time_limit_exceeded', 'tle': 'time_limit_exceeded',
+    'memory_limit_exceeded': 'memory_limit_exceeded', 'mle': 'memory_limit_exceeded',
+    'output_limit_exceeded': 'output_limit_exceeded', 'ole': 'output_limit_exceeded',
+    'runtime_error': 'runtime_error', 're': 'runtime_error',
+    'compile_error': 'compile_error', 'ce': 'compile_error',
+}
+
+# 判题子进程中的引擎
+_engine = None
+
+
+def _create_engine(engine_type: str):
+    settings.JUDGE_ENGINE = engine_type
+    from judge.engine_factory import JudgeEngineFactory
+    return JudgeEngineFactory.create_engine()
+
+
+def _init_worker(engine_type: str, jobs: int, slots):
+    global _engine
+    import django
+    django.setup()
+    # 各判题进程平分运行准入额度，绑定 CPU 时按序号分到不同的判题 CPU
+    with slots.get_lock():
+        slot = slots.value
+        slots.value += 1
+    from judge.admission import set_admission_share
+    set_admission_share(jobs, slot)
+    _engine = _create_engine(engine_type)
+
+
+def _judge(task: JudgeTask) -> JudgeOutcome:
+    # 多个解答并行判题，单个解答内的测试用例顺序运行
+    return _engine.judge_task(task, parallelism=1)
+
+
+def _natural_key(name: str):
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+
+class Command(BaseCommand):
+    help = '离线批量判题: 用题目的测试数据并行评测一个目录中的全部解答，不写入数据库'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'solutions',
+            type=str,
+            help='解答目录（递归查找，按扩展名识别语言）；子目录名为 accepted/wa/tle 等时作为期望的判题结果'
+        )
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument(
+            '--problem',
+            type=int,
+            help='使用该题目（ID）的测试数据和限制'
+        )
+        source.add_argument(
+            '--data',
+            type=str,
+            help='测试数据目录: 每组为 <名称>.in 和 <名称>.out（或 .ans）'
+        )
+        parser.add_argument('--time-limit', type=int, default=None, help='时间限制(ms)，默认使用题目设置或 1000')
+        parser.add_argument('--memory-limit', type=int, default=None, help='内存限制(MB)，默认使用题目设置或 256')
+        parser.add_argument('--output-limit', type=int, default=None, help='输出限制(MB)')
+        parser.add_argument(
+            '--policy',
+            choices=[POLICY_RUN_ALL, POLICY_STOP_ON_FAILURE],
+            default=POLICY_RUN_ALL,
+            help='判题策略'
+        )
+        parser.add_argument(
+            '--engine',
+            choices=['auto', 'cgroup', 'sandbox', 'basic'],
+            default='auto',
+            help='判题引擎，auto 表示 cgroup 可用时使用 cgroup 引擎，否则使用沙箱引擎'
+        )
+        parser.add_argument(
+            '--language',
+            type=str,
+            default=None,
+            help='只评测该语言（JudgeConfig.language）扩展名的解答；多种语言使用同一扩展名时必须指定'
+        )
+        parser.add_argument('--jobs', type=int, default=None, help='并行判题的进程数（默认 CPU 数）')
+        parser.add_argument('--json', action='store_true', help='每个解答输出一行 JSON（包含每个测试用例的结果）')
+
+    def handle(self, *args, **options):
+        root = os.path.abspath(options['solutions'])
+        if not os.path.isdir(root):
+            raise CommandError(f'解答目录不存在: {root}')
+
+        # 只读取数据库，判题子进程不访问数据库
+        if options['problem'] is not None:
+            test_cases, limits = self.load_problem(options['problem'])
+        else:
+            test_cases, limits = self.load_data_dir(options['data']), {}
+        if not test_cases:
+            raise CommandError('没有找到测试数据')
+
+        time_limit = options['time_limit'] or limits.get('time_limit') or 1000
+        memory_limit = options['memory_limit'] or limits.get('memory_limit') or 256
+        output_limit = options['output_limit'] or limits.get('output_limit')
+
+        configs = {
+            config.language: LanguageConfig.from_model(config)
+            for config in JudgeConfig.objects.filter(is_enabled=True)
+        }
+        if options['language'] is not None:
+            if options['language'] not in configs:
+                raise CommandError(
+                    f"语言不存在或未启用: {options['language']}（已启用: {', '.join(sorted(configs))}）"
+                )
+            configs = {options['language']: configs[options['language']]}
+
+        # 扩展名 -> 使用该扩展名的语言
+        extensions: Dict[str, List[str]] = {}
+        for language, config in sorted(configs.items()):
+            extensions.setdefault(config.file_extension, []).append(language)
+
+        solutions = self.find_solutions(root, extensions)
+        if not solutions:
+            raise CommandError(f"目录中没有可识别的解答（支持的扩展名: {', '.join(sorted(extensions))}）")
+
+        ambiguous = sorted({os.path.splitext(path)[1] for path in solutions
+                            if len(extensions[os.path.splitext(path)[1]]) > 1})
+        if ambiguous:
+            raise CommandError('多种语言使用同一扩展名，请用 --language 指定语言: ' + '，'.join(
+                f"{extension} ({', '.join(extensions[extension])})" for extension in ambiguous
+            ))
+
+        tasks = []
+        for path in solutions:
+            config = configs[extensions[os.path.splitext(path)[1]][0]]
+            with open(path, 'r', encoding='utf-8') as f:
+                code = f.read()
+            tasks.append(JudgeTask(
+                code=code,
+                language=config.language,
+                time_limit=time_limit,
+                memory_limit=memory_limit,
+                output_limit=output_limit,
+                test_cases=test_cases,
+                policy=options['policy'],
+                config=config,
+            ))
+
+        engine_type = options['engine']
+        if engine_type == 'auto':
+            from judge.cgroup_engine import CgroupEngine
+            if platform.system() == 'Windows':
+                engine_type = 'basic'
+            else:
+                engine_type = 'cgroup' if CgroupEngine.is_available() else 'sandbox'
+        try:
+            # 在启动判题进程之前检查引擎是否可用
+            _create_engine(engine_type)
+        except Exception as e:
+            raise CommandError(f'无法创建 {engine_type} 判题引擎: {str(e)}')
+        jobs = max(1, min(options['jobs'] or get_cpu_count(), len(tasks)))
+
+        if not options['json']:
+            self.stdout.write(
+                f'{len(tasks)} 个解答，{len(test_cases)} 个测试用例，{engine_type} 引擎，{jobs} 个进程，'
+                f'时间限制 {time_limit}ms，内存限制 {memory_limit}MB'
+            )
+
+        start_time = time.monotonic()
+        outcomes = self.run(tasks, engine_type, jobs, root, solutions, options['json'])
+        elapsed = time.monotonic() - start_time
+
+        mismatches = []
+        for path, outcome in zip(solutions, outcomes):
+            expected = self.expected_status(root, path)
+            if expected and outcome.status != expected:
+                mismatches.append((os.path.relpath(path, root), expected, outcome.status))
+
+        if options['json']:
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} 个解答的判题结果与期望不符')
+            return
+
+        counts: Dict[str, int] = {}
+        for outcome in outcomes:
+            counts[outcome.status] = counts.get(outcome.status, 0) + 1
+        self.stdout.write(
+            f"\n完成，用时 {elapsed:.1f}秒: " +
+            '，'.join(f'{status} {count}' for status, count in sorted(counts.items()))
+        )
+        if mismatches:
+            for name, expected, actual in mismatches:
+                self.stdout.write(self.style.ERROR(f'  {name}: 期望 {expected}，实际 {actual}'))
+            raise CommandError(f'{len(mismatches)} 个解答的判题结果与期望不符')
+
+    def run(self, tasks: List[JudgeTask], engine_type: str, jobs: int, root: str,
+            solutions: List[str], as_json: bool) -> List[JudgeOutcome]:
+        """在进程池中判题，按完成顺序输出每个解答的结果，返回与 tasks 顺序一致的结果"""
+        # 子进程不继承数据库连接
+        connections.close_all()
+        start_methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in start_methods else 'spawn')
+
+        outcomes: List[Optional[JudgeOutcome]] = [None] * len(tasks)
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context,
+                                 initializer=_init_worker, initargs=(engine_type, jobs, context.Value('i', 0))) as executor:
+            futures = {executor.submit(_judge, task): index for index, task in enumerate(tasks)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    outcome = JudgeOutcome(status='system_error', error_message=f'判题进程错误: {str(e)}')
+                outcomes[index] = outcome
+                self.report(os.path.relpath(solutions[index], root), outcome,
+                            self.expected_status(root, solutions[index]), as_json)
+        return outcomes
+
+    def report(self, name: str, outcome: JudgeOutcome, expected: Optional[str], as_json: bool):
+        if as_json:
+            self.stdout.write(json.dumps(dict(outcome.to_dict(), solution=name, expected=expected),
+                                         ensure_ascii=False))
+            return
+
+        line = (f'{name:<40} {outcome.status:<22} {outcome.score:>3}分 '
+                f'{outcome.time_used:>6}ms {outcome.memory_used:>8}KB')
+        if expected and outcome.status != expected:
+            self.stdout.write(self.style.ERROR(f'{line}  期望 {expected}'))
+        elif outcome.status == 'accepted':
+            self.stdout.write(self.style.SUCCESS(line))
+        else:
+            self.stdout.write(line)
+        if outcome.status in ('compile_error', 'system_error') and outcome.error_message:
+            self.stdout.write(f'    {outcome.error_message.strip().splitlines()[0][:200]}')
+
+    def load_problem(self, problem_id: int):
+        """读取题目的测试用例和限制"""
+        from problems.models import Problem
+        from judge.tasks import build_test_cases
+        try:
+            problem = Problem.objects.get(pk=problem_id)
+        except Problem.DoesNotExist:
+            raise CommandError(f'题目不存在: {problem_id}')
+        limits = {
+            'time_limit': problem.time_limit,
+            'memory_limit': problem.memory_limit,
+            'output_limit': problem.output_limit,
+        }
+        return build_test_cases(problem), limits
+
+    def load_data_dir(self, data_dir: str) -> List[TestCaseData]:
+        """读取测试数据目录中的 <名称>.in 和 <名称>.out/.ans"""
+        data_dir = os.path.abspath(data_dir)
+        if not os.path.isdir(data_dir):
+            raise CommandError(f'测试数据目录不存在: {data_dir}')
+
+        preview_size = getattr(settings, 'TEST_DATA_PREVIEW_SIZE', 4096)
+        test_cases = []
+        for name in sorted(os.listdir(data_dir), key=_natural_key):
+            stem, extension = os.path.splitext(name)
+            if extension != '.in':
+                continue
+            answers = [os.path.join(data_dir, stem + ext) for ext in ('.out', '.ans')]
+            answer = next((path for path in answers if os.path.isfile(path)), None)
+            if answer is None:
+                self.stderr.write(f'跳过 {name}: 没有对应的 .out/.ans 文件')
+                continue
+            input_file = os.path.join(data_dir, name)
+            test_cases.append(TestCaseData(
+                id=len(test_cases) + 1,
+                input_file=input_file,
+                output_file=answer,
+                input_preview=read_preview(input_file, preview_size)[0],
+                output_preview=read_preview(answer, preview_size)[0],
+            ))
+        return test_cases
+
+    def find_solutions(self, root: str, extensions: Dict[str, List[str]]) -> List[str]:
+        """递归查找扩展名属于已启用语言的解答文件"""
+        solutions = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames, key=_natural_key):
+                if os.path.splitext(name)[1] in extensions:
+                    solutions.append(os.path.join(dirpath, name))
+        return solutions
+
+    def expected_status(self, root: str, path: str) -> Optional[str]:
+        """解答所在子目录名对应的期望判题结果"""
+        relative_dir = os.path.relpath(os.path.dirname(path), root)
+        if relative_dir == '.':
+            return None
+        return EXPECTED_STATUS_ALIASES.get(relative_dir.split(os.sep)[0].lower())
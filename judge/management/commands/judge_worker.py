@@ -1,7 +1,11 @@
-import time
 import logging
-from django.core.management.base import BaseCommand
-from judge.tasks import process_judge_queue
+import signal
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from judge.async_worker import AsyncJudgeWorker
+from judge.supervisor import JudgeSupervisor, get_auto_process_count
+from judge.workspace import check_workspace_root
+from judge.worker import JudgeWorker
 
 logger = logging.getLogger(__name__)
 
@@ -12,9 +16,15 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument(
             '--interval',
-            type=int,
+            type=float,
             default=2,
-            help='处理间隔时间（秒）'
+            help='空闲时的初始轮询间隔（秒），没有新提交时按指数退避到 --max-interval'
+        )
+        parser.add_argument(
+            '--max-interval',
+            type=float,
+            default=30,
+            help='最大轮询间隔（秒）'
         )
         parser.add_argument(
             '--max-iterations',
@@ -22,35 +32,120 @@ class Command(BaseCommand):
             default=None,
             help='最大迭代次数（None表示无限循环）'
         )
+        parser.add_argument(
+            '--worker-id',
+            type=str,
+            default=None,
+            help='判题进程标识，记录在领取的队列项上（默认 主机名:进程号；多进程时加上 -<序号>）'
+        )
+        parser.add_argument(
+            '--processes',
+            type=str,
+            default='1',
+            help='判题子进程数，auto 表示按 CPU 数和内存自动计算；大于 1 时以监督进程方式运行'
+        )
+        parser.add_argument(
+            '--max-submissions',
+            type=int,
+            default=None,
+            help='每个进程处理多少个提交后退出（监督进程模式下会重新启动，默认 JUDGE_WORKER_MAX_SUBMISSIONS）'
+        )
+        parser.add_argument(
+            '--async',
+            action='store_true',
+            dest='async_mode',
+            help='异步判题: 一个进程同时判多个提交（数量见 --concurrency），通常不再需要 --processes'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help='异步判题时每个进程同时运行的提交数（默认 JUDGE_ASYNC_CONCURRENCY，0 表示按 CPU 数和内存自动计算）'
+        )
+        parser.add_argument(
+            '--compile-concurrency',
+            type=int,
+            default=None,
+            help='异步判题时每个进程同时编译的提交数（默认 JUDGE_ASYNC_COMPILE_CONCURRENCY，0 表示运行并发数的一半）'
+        )
+        parser.add_argument(
+            '--drain-timeout',
+            type=float,
+            default=600,
+            help='监督进程收到 SIGTERM 后等待子进程判完手上提交的最长时间（秒）'
+        )
 
     def handle(self, *args, **options):
         interval = options['interval']
-        max_iterations = options['max_iterations']
+        worker_options = {
+            'interval': interval,
+            'max_interval': max(interval, options['max_interval']),
+            'max_iterations': options['max_iterations'],
+        }
+        worker_class = JudgeWorker
+        if options['async_mode']:
+            worker_class = AsyncJudgeWorker
+            worker_options['concurrency'] = options['concurrency']
+            worker_options['compile_concurrency'] = options['compile_concurrency']
+        elif options['concurrency'] is not None or options['compile_concurrency'] is not None:
+            raise CommandError('--concurrency 和 --compile-concurrency 只能与 --async 一起使用')
+        
+        processes = options['processes']
+        if processes == 'auto':
+            processes = get_auto_process_count()
+        else:
+            try:
+                processes = int(processes)
+            except ValueError:
+                raise CommandError('--processes 应为正整数或 auto')
+            if processes < 1:
+                raise CommandError('--processes 应为正整数或 auto')
+        
+        # 工作区所在的 tmpfs 放不下一个提交时拒绝启动，避免正确的程序因写满得到错误的结果
+        try:
+            check_workspace_root()
+        except (OSError, RuntimeError) as e:
+            raise CommandError(str(e))
+        
+        if processes > 1 or options['processes'] == 'auto':
+            self.run_supervisor(processes, worker_class, worker_options, options)
+        else:
+            self.run_worker(worker_class, worker_options, options)
+    
+    def run_supervisor(self, processes, worker_class, worker_options, options):
+        max_submissions = options['max_submissions']
+        if max_submissions is None:
+            max_submissions = getattr(settings, 'JUDGE_WORKER_MAX_SUBMISSIONS', 500)
         
         self.stdout.write(
-            self.style.SUCCESS(f'判题工作进程启动，间隔: {interval}秒')
+            self.style.SUCCESS(
+                f'判题监督进程启动，子进程数: {processes}，'
+                f'每个子进程处理 {max_submissions or "不限"} 个提交后重启'
+            )
         )
-        
-        iteration = 0
-        total_processed = 0
+        supervisor = JudgeSupervisor(
+            processes,
+            dict(worker_options, stdout=self.stdout),
+            max_submissions=max_submissions,
+            drain_timeout=options['drain_timeout'],
+            worker_id_prefix=options['worker_id'],
+            worker_class=worker_class,
+        )
+        supervisor.run()
+        self.stdout.write(self.style.SUCCESS('判题监督进程结束'))
+    
+    def run_worker(self, worker_class, worker_options, options):
+        worker = worker_class(
+            worker_id=options['worker_id'],
+            max_submissions=options['max_submissions'],
+            stdout=self.stdout,
+            **worker_options
+        )
+        # 收到 SIGTERM 时判完手上的提交再退出
+        signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
         
         try:
-            while True:
-                if max_iterations and iteration >= max_iterations:
-                    break
-                
-                # 处理判题队列
-                processed = process_judge_queue()
-                total_processed += processed
-                
-                if processed > 0:
-                    self.stdout.write(
-                        f'处理了 {processed} 个提交，总计: {total_processed}'
-                    )
-                
-                iteration += 1
-                time.sleep(interval)
-                
+            worker.run()
         except KeyboardInterrupt:
             self.stdout.write(
                 self.style.WARNING('\n判题工作进程已停止')
@@ -62,5 +157,5 @@ class Command(BaseCommand):
             logger.error(f'判题工作进程出错: {str(e)}')
         
         self.stdout.write(
-            self.style.SUCCESS(f'判题工作进程结束，总共处理了 {total_processed} 个提交')
+            self.style.SUCCESS(f'判题工作进程结束，总共处理了 {worker.total_processed} 个提交')
         )
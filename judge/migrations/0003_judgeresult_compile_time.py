@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-17 17:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0002_judgequeue_error_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='judgeresult',
+            name='compile_time',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='编译时间(ms)'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.24 on 2026-10-17 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0004_alter_judgeresult_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='judgequeue',
+            name='worker',
+            field=models.CharField(blank=True, max_length=100, verbose_name='判题进程'),
+        ),
+        migrations.AddIndex(
+            model_name='judgequeue',
+            index=models.Index(fields=['status', '-priority', 'created_at'], name='judge_queue_claim_idx'),
+        ),
+    ]
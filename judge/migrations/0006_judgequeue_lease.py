@@ -0,0 +1,23 @@
+# Generated by Django 4.2.24 on 2026-10-17 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0005_judgequeue_worker'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='judgequeue',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='领取次数'),
+        ),
+        migrations.AddField(
+            model_name='judgequeue',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='租约到期时间'),
+        ),
+    ]
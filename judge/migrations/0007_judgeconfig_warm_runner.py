@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0006_judgequeue_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='judgeconfig',
+            name='warm_runner',
+            field=models.BooleanField(default=False, help_text='仅支持 Python（沙箱/cgroup 引擎）：常驻解释器预先导入常用模块，每个测试用例 fork 子进程运行', verbose_name='预热运行器'),
+        ),
+    ]
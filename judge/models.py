@@ -20,6 +20,10 @@ class JudgeConfig(models.Model):
     time_limit_multiplier = models.FloatField(default=1.0, verbose_name='时间限制倍数')
     memory_limit_multiplier = models.FloatField(default=1.0, verbose_name='内存限制倍数')
     is_enabled = models.BooleanField(default=True, verbose_name='是否启用')
+    warm_runner = models.BooleanField(
+        default=False, verbose_name='预热运行器',
+        help_text='仅支持 Python（沙箱/cgroup 引擎）：常驻解释器预先导入常用模块，每个测试用例 fork 子进程运行'
+    )
 
     class Meta:
         verbose_name = '评测配置'
@@ -42,6 +46,9 @@ class JudgeQueue(models.Model):
     submission = models.OneToOneField('submissions.Submission', on_delete=models.CASCADE, verbose_name='提交记录')
     priority = models.PositiveIntegerField(default=0, verbose_name='优先级')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='队列状态')
+    worker = models.CharField(max_length=100, blank=True, verbose_name='判题进程')
+    lease_expires_at = models.DateTimeField(null=True, blank=True, verbose_name='租约到期时间')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='领取次数')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='入队时间')
     started_at = models.DateTimeField(null=True, blank=True, verbose_name='开始时间')
     completed_at = models.DateTimeField(null=True, blank=True, verbose_name='完成时间')
@@ -51,6 +58,10 @@ class JudgeQueue(models.Model):
         verbose_name = '评测队列'
         verbose_name_plural = '评测队列'
         ordering = ['-priority', 'created_at']
+        indexes = [
+            # 判题进程按 status='pending' + 优先级领取队列项
+            models.Index(fields=['status', '-priority', 'created_at'], name='judge_queue_claim_idx'),
+        ]
 
     def __str__(self):
         return f"队列 #{self.id} - {self.submission.user.username} - {self.status}"
@@ -65,6 +76,7 @@ class JudgeResult(models.Model):
         ('wrong_answer', '答案错误'),
         ('time_limit_exceeded', '超时'),
         ('memory_limit_exceeded', '内存超限'),
+        ('output_limit_exceeded', '输出超限'),
         ('runtime_error', '运行时错误'),
         ('compile_error', '编译错误'),
         ('system_error', '系统错误'),
@@ -75,6 +87,7 @@ class JudgeResult(models.Model):
     score = models.PositiveIntegerField(default=0, verbose_name='得分')
     time_used = models.PositiveIntegerField(null=True, blank=True, verbose_name='运行时间(ms)')
     memory_used = models.PositiveIntegerField(null=True, blank=True, verbose_name='内存使用(KB)')
+    compile_time = models.PositiveIntegerField(null=True, blank=True, verbose_name='编译时间(ms)')
     error_message = models.TextField(blank=True, verbose_name='错误信息')
     test_results = models.JSONField(default=list, blank=True, verbose_name='测试结果详情')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
@@ -0,0 +1,210 @@
+"""
+判题队列唤醒通知 - 新提交入队后立即唤醒空闲的判题进程，代替固定间隔轮询
+
+两种通知方式（JUDGE_QUEUE_NOTIFY，默认 auto 按数据库自动选择）:
+    postgres  PostgreSQL 的 LISTEN/NOTIFY，适用于多主机部署
+    socket    本机 Unix 数据报套接字: 每个判题进程在 JUDGE_NOTIFY_DIR 中绑定一个套接字，
+              入队时向目录中的所有套接字发送一个字节，适用于单机 SQLite 部署
+    none      不通知，判题进程只按退避间隔轮询
+
+通知只是加速手段，丢失通知不影响正确性：判题进程在等待超时后仍会轮询队列。
+"""
+import logging
+import os
+import select
+import socket
+import time
+from typing import Optional
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'judge_queue'
+SOCKET_SUFFIX = '.sock'
+
+
+def get_notify_mode() -> str:
+    """当前使用的通知方式: postgres / socket / none"""
+    mode = getattr(settings, 'JUDGE_QUEUE_NOTIFY', 'auto')
+    if mode == 'auto':
+        if connection.vendor == 'postgresql':
+            return 'postgres'
+        return 'socket' if hasattr(socket, 'AF_UNIX') else 'none'
+    return mode
+
+
+def get_notify_dir() -> str:
+    judge_dir = getattr(settings, 'JUDGE_DIR', '/tmp/judge')
+    return str(getattr(settings, 'JUDGE_NOTIFY_DIR', None) or os.path.join(judge_dir, 'notify'))
+
+
+def notify_queue():
+    """通知判题进程有新的队列项（应在事务提交后调用，见 transaction.on_commit）"""
+    try:
+        mode = get_notify_mode()
+        if mode == 'postgres':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, ''])
+        elif mode == 'socket':
+            _notify_sockets()
+    except Exception as e:
+        logger.warning(f"判题队列通知失败: {str(e)}")
+
+
+def _notify_sockets():
+    notify_dir = get_notify_dir()
+    try:
+        names = os.listdir(notify_dir)
+    except FileNotFoundError:
+        return
+
+    sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sender.setblocking(False)
+    try:
+        for name in names:
+            if not name.endswith(SOCKET_SUFFIX):
+                continue
+            path = os.path.join(notify_dir, name)
+            try:
+                sender.sendto(b'1', path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # 判题进程已退出，清理遗留的套接字文件
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                # 接收队列已满，说明该进程已有未处理的唤醒
+                pass
+    finally:
+        sender.close()
+
+
+class QueueListener:
+    """判题进程一侧的通知接收器"""
+
+    def __init__(self, worker_id: str):
+        self.worker_id = worker_id
+        self.mode = get_notify_mode()
+        self._pg_conn = None
+        self._socket: Optional[socket.socket] = None
+        self._socket_path = None
+        # interrupt() 写入的自唤醒管道，用于在信号处理函数中打断 wait()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+
+        try:
+            if self.mode == 'postgres':
+                self._connect_postgres()
+            elif self.mode == 'socket':
+                self._bind_socket()
+        except Exception as e:
+            logger.warning(f"判题队列通知不可用，退回轮询: {str(e)}")
+
+    def _connect_postgres(self):
+        # 使用独立的数据库连接，不受 ORM 连接的事务和关闭影响
+        raw = connection.get_new_connection(connection.get_connection_params())
+        raw.autocommit = True
+        with raw.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+        self._pg_conn = raw
+
+    def _bind_socket(self):
+        notify_dir = get_notify_dir()
+        os.makedirs(notify_dir, exist_ok=True)
+        safe_name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in self.worker_id)
+        path = os.path.join(notify_dir, f'{safe_name}{SOCKET_SUFFIX}')
+        if os.path.exists(path):
+            os.remove(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        sock.setblocking(False)
+        self._socket = sock
+        self._socket_path = path
+
+    def wait(self, timeout: float) -> bool:
+        """
+        等待新队列项的通知，最多 timeout 秒
+        返回: 是否收到通知（False 表示超时、被 interrupt() 打断或通知不可用）
+        """
+        if self.mode == 'postgres' and self._pg_conn is None:
+            # 连接断开后尝试重新建立
+            try:
+                self._connect_postgres()
+            except Exception:
+                pass
+
+        source = self._pg_conn if self._pg_conn is not None else self._socket
+        sources = [self._wake_r] if source is None else [source, self._wake_r]
+
+        try:
+            readable, _, _ = select.select(sources, [], [], timeout)
+            if self._wake_r in readable:
+                self._drain_wakeups()
+                return False
+            if not readable:
+                return False
+            self._drain()
+            return True
+        except Exception as e:
+            logger.warning(f"等待判题队列通知失败: {str(e)}")
+            self._close_postgres()
+            time.sleep(timeout)
+            return False
+
+    def interrupt(self):
+        """立即结束正在进行的 wait()（可在信号处理函数中调用）"""
+        try:
+            os.write(self._wake_w, b'1')
+        except OSError:
+            pass
+
+    def _drain_wakeups(self):
+        try:
+            while os.read(self._wake_r, 64):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _drain(self):
+        """清空已到达的通知，多个通知只唤醒一次"""
+        if self._pg_conn is not None:
+            if hasattr(self._pg_conn, 'poll'):  # psycopg2
+                self._pg_conn.poll()
+                self._pg_conn.notifies.clear()
+            else:  # psycopg 3
+                for _ in self._pg_conn.notifies(timeout=0):
+                    pass
+            return
+
+        while True:
+            try:
+                self._socket.recv(64)
+            except BlockingIOError:
+                return
+
+    def _close_postgres(self):
+        if self._pg_conn is not None:
+            try:
+                self._pg_conn.close()
+            except Exception:
+                pass
+            self._pg_conn = None
+
+    def close(self):
+        self._close_postgres()
+        for fd in (self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._wake_r = self._wake_w = -1
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            try:
+                os.remove(self._socket_path)
+            except OSError:
+                pass
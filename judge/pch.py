@@ -0,0 +1,258 @@
+"""
+C/C++ 预编译头 - 为常用头文件（默认 <bits/stdc++.h>）按 编译器 + 编译参数 维护 GCC 预编译头
+
+大部分 C++ 提交的第一行是 #include <bits/stdc++.h>，每次编译都要重新解析整个标准库，耗时 1~2 秒 CPU。
+GCC 查找头文件时会先查找同名的 .gch 文件，因此把预编译头放在 <entry>/include/bits/stdc++.h.gch，
+编译时加上 -I <entry>/include 即可直接加载；.gch 与本次编译不兼容时 GCC 会忽略它，继续使用原头文件。
+
+目录结构:
+    <JUDGE_PCH_DIR>/<key>/include/<header>.gch   预编译头
+    <JUDGE_PCH_DIR>/<key>/meta.json              生成结果（成功生成的头文件列表）
+key 由编译器路径、版本、编译参数和头文件列表计算，编译器升级或 JudgeConfig 中的编译命令修改后自动重新生成。
+多个判题进程通过文件锁保证同一组预编译头只生成一次；生成失败同样会记录，编译器或参数变化之前不再重试。
+
+只有在头文件是源码中第一个预处理指令（之前只有空白和注释）时才使用预编译头，
+这是 GCC 使用预编译头的前提；其他提交按原方式编译，编译结果不受影响。
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+META_FILE = 'meta.json'
+INCLUDE_DIR = 'include'
+LOCK_FILE = '.build.lock'
+BUILD_TIMEOUT = 120  # 秒，生成一个预编译头的超时时间
+
+# 支持 GCC 风格预编译头的编译器
+GCC_COMPILERS = re.compile(r'^(g\+\+|gcc|c\+\+|cc)(-\d+(\.\d+)*)?$')
+# 与生成预编译头无关的参数: 链接参数和输出文件
+LINK_OPTION_PREFIXES = ('-l', '-L', '-Wl,', '-static', '-shared', '-pthread')
+
+# 源码开头的空白、注释和第一个预处理指令
+LEADING_COMMENTS = re.compile(r'(\s+|//[^\n]*|/\*.*?\*/)*', re.S)
+INCLUDE_DIRECTIVE = re.compile(r'#[ \t]*include[ \t]*<([^>\n]+)>')
+
+
+def get_pch_headers() -> List[str]:
+    """预编译的头文件（JUDGE_PCH_HEADERS）"""
+    headers = getattr(settings, 'JUDGE_PCH_HEADERS', 'bits/stdc++.h')
+    return [header.strip() for header in headers.split(',') if header.strip()]
+
+
+def get_pch_dir() -> str:
+    judge_dir = getattr(settings, 'JUDGE_DIR', '/tmp/judge')
+    return str(getattr(settings, 'JUDGE_PCH_DIR', '') or os.path.join(judge_dir, 'pch'))
+
+
+def get_leading_include(code: str) -> Optional[str]:
+    """源码的第一个预处理指令是 #include <...> 时返回头文件名（之前只允许空白和注释）"""
+    code = code.lstrip('\ufeff')
+    start = LEADING_COMMENTS.match(code).end()
+    match = INCLUDE_DIRECTIVE.match(code, start)
+    return match.group(1).strip() if match else None
+
+
+def get_compile_flags(compile_cmd: List[str], code_file: str) -> List[str]:
+    """编译命令中影响预编译头的参数: 去掉编译器、源文件、输出文件和链接参数"""
+    flags = []
+    skip_next = False
+    for arg in compile_cmd[1:]:
+        if skip_next:
+            skip_next = False
+            continue
+        if arg == '-o':
+            skip_next = True
+            continue
+        if arg.startswith('-o') or code_file in arg or not arg.startswith('-'):
+            continue
+        if arg.startswith(LINK_OPTION_PREFIXES):
+            continue
+        flags.append(arg)
+    return flags
+
+
+_versions: Dict[tuple, Optional[str]] = {}
+_entries: Dict[str, Dict] = {}
+_lock = threading.Lock()
+
+
+def _compiler_version(compiler_path: str) -> Optional[str]:
+    """编译器版本信息，非 GCC 编译器返回 None（按可执行文件的大小和修改时间缓存）"""
+    stat = os.stat(compiler_path)
+    cache_key = (compiler_path, stat.st_size, stat.st_mtime_ns)
+    if cache_key not in _versions:
+        try:
+            result = subprocess.run([compiler_path, '--version'], capture_output=True, text=True, timeout=10)
+            version = result.stdout.strip()
+            _versions[cache_key] = version if result.returncode == 0 and 'clang' not in version.lower() else None
+        except (OSError, subprocess.TimeoutExpired):
+            _versions[cache_key] = None
+    return _versions[cache_key]
+
+
+def apply_pch(compile_cmd: List[str], code_file: str, code: str, language: str) -> List[str]:
+    """
+    源码可以使用预编译头时，返回加上预编译头目录的编译命令；否则原样返回
+    预编译头尚未生成时先生成（同一组编译器和参数只生成一次）
+    """
+    if not getattr(settings, 'JUDGE_PCH_ENABLED', True) or not compile_cmd:
+        return compile_cmd
+    if not GCC_COMPILERS.match(os.path.basename(compile_cmd[0])):
+        return compile_cmd
+    header = get_leading_include(code)
+    if header is None or header not in get_pch_headers():
+        return compile_cmd
+
+    try:
+        entry = get_pch_entry(compile_cmd[0], get_compile_flags(compile_cmd, code_file), language)
+    except OSError as e:
+        logger.warning(f"预编译头不可用: {str(e)}")
+        return compile_cmd
+    if entry is None or header not in entry['headers']:
+        return compile_cmd
+    return compile_cmd[:1] + ['-I', entry['include_dir']] + compile_cmd[1:]
+
+
+def get_pch_entry(compiler: str, flags: List[str], language: str) -> Optional[Dict]:
+    """
+    获取（必要时生成）指定编译器和参数的预编译头
+    返回: {'include_dir': 预编译头目录, 'headers': 成功生成的头文件列表}，编译器不支持时返回 None
+    """
+    compiler_path = shutil.which(compiler)
+    if not compiler_path:
+        return None
+    compiler_path = os.path.realpath(compiler_path)
+
+    with _lock:
+        version = _compiler_version(compiler_path)
+        if version is None:
+            return None
+
+        headers = get_pch_headers()
+        digest = hashlib.sha256()
+        for part in [compiler_path, version, ' '.join(flags), ','.join(headers)]:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\x00')
+        key = digest.hexdigest()[:16]
+
+        entry = _entries.get(key)
+        if entry is None:
+            entry = _load_or_build(compiler_path, flags, headers, language, key)
+            _entries[key] = entry
+        return entry
+
+
+def _load_or_build(compiler_path: str, flags: List[str], headers: List[str], language: str, key: str) -> Dict:
+    pch_dir = get_pch_dir()
+    entry_dir = os.path.join(pch_dir, key)
+    entry = _load_meta(entry_dir)
+    if entry is not None:
+        return entry
+
+    os.makedirs(pch_dir, exist_ok=True)
+    lock_file = open(os.path.join(pch_dir, LOCK_FILE), 'w')
+    try:
+        if fcntl is not None:
+            # 其他判题进程正在生成时等待其完成
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        entry = _load_meta(entry_dir)
+        if entry is not None:
+            return entry
+
+        start_time = time.monotonic()
+        work_dir = tempfile.mkdtemp(prefix='.build-', dir=pch_dir)
+        try:
+            built = [header for header in headers if _build_header(compiler_path, flags, header, work_dir)]
+            meta = {'compiler': compiler_path, 'language': language, 'flags': flags,
+                    'headers': built, 'created_at': time.time()}
+            with open(os.path.join(work_dir, META_FILE), 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.rename(work_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+
+        logger.info(
+            f"预编译头已生成: {os.path.basename(compiler_path)} {' '.join(flags)}，"
+            f"头文件: {', '.join(built) or '无'}，耗时 {time.monotonic() - start_time:.1f}秒"
+        )
+        _remove_stale_entries(pch_dir, language, key)
+        return _load_meta(entry_dir)
+    finally:
+        lock_file.close()
+
+
+def _build_header(compiler_path: str, flags: List[str], header: str, work_dir: str) -> bool:
+    """
+    生成 <work_dir>/include/<header>.gch
+    预编译的是只包含 #include <header> 的包装头文件，包装头文件不在头文件搜索路径中，
+    其中的 #include 找到的是编译器自带的头文件
+    """
+    wrapper = os.path.join(work_dir, 'src', header)
+    output = os.path.join(work_dir, INCLUDE_DIR, header + '.gch')
+    os.makedirs(os.path.dirname(wrapper), exist_ok=True)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(wrapper, 'w', encoding='utf-8') as f:
+        f.write(f'#include <{header}>\n')
+
+    try:
+        result = subprocess.run(
+            [compiler_path] + flags + ['-x', 'c++-header' if '+' in os.path.basename(compiler_path) else 'c-header',
+                                       wrapper, '-o', output],
+            capture_output=True, text=True, timeout=BUILD_TIMEOUT, cwd=work_dir
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"生成预编译头 {header} 失败: {str(e)}")
+        return False
+    finally:
+        shutil.rmtree(os.path.join(work_dir, 'src'), ignore_errors=True)
+
+    if result.returncode != 0:
+        logger.warning(f"生成预编译头 {header} 失败: {result.stderr[:500]}")
+        if os.path.exists(output):
+            os.remove(output)
+        return False
+    return True
+
+
+def _load_meta(entry_dir: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(entry_dir, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return {
+        'include_dir': os.path.join(entry_dir, INCLUDE_DIR),
+        'headers': meta['headers'],
+    }
+
+
+def _remove_stale_entries(pch_dir: str, language: str, key: str):
+    """删除同一语言的旧预编译头（编译器升级或编译命令修改之前生成的）"""
+    for name in os.listdir(pch_dir):
+        if name == key or name.startswith('.'):
+            continue
+        entry_dir = os.path.join(pch_dir, name)
+        try:
+            with open(os.path.join(entry_dir, META_FILE), 'r', encoding='utf-8') as f:
+                if json.load(f).get('language') != language:
+                    continue
+        except (OSError, ValueError):
+            continue
+        shutil.rmtree(entry_dir, ignore_errors=True)
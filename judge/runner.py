@@ -0,0 +1,470 @@
+"""
+进程运行与资源度量 - 使用 os.wait4 回收子进程，读取内核记录的 CPU 时间和峰值内存
+
+与 communicate() 之后再用 psutil 读取 RSS 不同，wait4 返回的 rusage 在子进程退出时由内核给出：
+    ru_utime + ru_stime  子进程实际消耗的 CPU 时间（不受管道和调度抖动影响）
+    ru_maxrss            子进程的峰值常驻内存（Linux 下单位为 KB）
+
+时间限制按 CPU 时间判定，另设一个较宽松的墙钟时间限制，用于处理 sleep、阻塞读等不消耗 CPU 的情况。
+
+注意: 内核在 exec 时会把旧地址空间的峰值计入 ru_maxrss，直接从判题进程 fork 出来的子进程
+会带上判题进程本身几十 MB 的 RSS。因此在 Linux 上先启动一个很小的 bash 作为跳板，由 bash 在后台
+启动用户程序后立即退出；判题进程通过 PR_SET_CHILD_SUBREAPER 收养该孙进程并用 wait4 回收，
+此时 ru_maxrss 只包含跳板（约 3MB）和用户程序本身。
+bash 会自行回收先于它退出的后台子进程，所以后台子 shell 会先阻塞在 go 管道上，
+等判题进程回收 bash 之后关闭管道，子 shell 才 exec 用户程序。
+（dash 的重定向只支持 0-9 号文件描述符，无法可靠地传递管道，因此使用 bash。）
+"""
+import ctypes
+import math
+import os
+import platform
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from django.conf import settings
+from .affinity import get_run_cpus
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Windows 及不支持 wait4 的平台退回到 communicate() + 墙钟计时
+SUPPORTS_WAIT4 = hasattr(os, 'wait4') and platform.system() != 'Windows'
+
+PR_SET_CHILD_SUBREAPER = 36
+
+TRAMPOLINE_SHELL = shutil.which('bash')
+
+# 跳板脚本: 保存标准输入（由 bash 分配空闲的文件描述符） -> 后台子 shell 等待 {go_fd} 关闭后 exec 用户程序 -> 通过 {pid_fd} 回传其 pid -> 退出
+TRAMPOLINE_SCRIPT = (
+    'exec {{saved_stdin}}<&0; '
+    '{{ read -r _ <&{go_fd}; exec "$@" 0<&$saved_stdin {{saved_stdin}}<&- {go_fd}<&-; }} {pid_fd}>&- & '
+    'echo $! >&{pid_fd}; exit 0'
+)
+
+_subreaper_enabled = None
+_subreaper_lock = threading.Lock()
+
+
+def enable_subreaper() -> bool:
+    """将当前进程设置为 child subreaper（仅 Linux），成功后孤儿孙进程会被过继给当前进程"""
+    global _subreaper_enabled
+    with _subreaper_lock:
+        if _subreaper_enabled is None:
+            _subreaper_enabled = False
+            if SUPPORTS_WAIT4 and sys.platform.startswith('linux'):
+                try:
+                    libc = ctypes.CDLL(None, use_errno=True)
+                    _subreaper_enabled = libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) == 0
+                except (OSError, AttributeError):
+                    _subreaper_enabled = False
+        return _subreaper_enabled
+
+
+def get_wall_time_limit(time_limit: int) -> int:
+    """根据 CPU 时间限制计算墙钟时间限制（毫秒）"""
+    factor = getattr(settings, 'JUDGE_WALL_TIME_FACTOR', 3.0)
+    return int(max(time_limit * factor, time_limit + 1000))
+
+
+def get_output_limit_bytes(output_limit: Optional[int]) -> int:
+    """输出限制（MB）转换为字节，未指定时使用 JUDGE_DEFAULT_OUTPUT_LIMIT"""
+    if not output_limit:
+        output_limit = getattr(settings, 'JUDGE_DEFAULT_OUTPUT_LIMIT', 64)
+    return output_limit * 1024 * 1024
+
+
+def _read_stream(stream, chunks: List[bytes], limit: int,
+                 on_exceeded: Optional[Callable[[], None]] = None):
+    """
+    流式读取子进程输出，最多保留 limit 字节
+    超出限制时调用 on_exceeded（用于立即杀死进程）；未提供时丢弃多余的输出并继续读取，避免子进程阻塞
+    """
+    size = 0
+    try:
+        while True:
+            chunk = stream.read1(65536)
+            if not chunk:
+                break
+            if size + len(chunk) > limit:
+                chunks.append(chunk[:max(0, limit - size)])
+                size = limit
+                if on_exceeded is not None:
+                    on_exceeded()
+                    break
+                continue
+            size += len(chunk)
+            chunks.append(chunk)
+    except (OSError, ValueError):
+        pass
+    finally:
+        try:
+            stream.close()
+        except OSError:
+            pass
+
+
+def _write_stream(stream, data: bytes):
+    """向子进程写入输入数据"""
+    try:
+        if data:
+            stream.write(data)
+    except (BrokenPipeError, OSError, ValueError):
+        # 子进程未读完输入就退出
+        pass
+    finally:
+        try:
+            stream.close()
+        except OSError:
+            pass
+
+
+def _kill_process_group(pid: int):
+    """终止子进程所在的进程组"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+
+def _reap_process_group(pgid: int):
+    """回收进程组中被过继过来的残留进程，避免僵尸进程堆积"""
+    for _ in range(64):
+        try:
+            pid, _ = os.waitpid(-pgid, 0)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+def _launch(command: List[str], cwd: str, child_setup: Callable[[], None],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE):
+    """
+    启动用户程序
+    stdin/stdout 为 PIPE 或已打开的文件，文件描述符直接交给子进程
+    返回: (Popen 对象, 需要 wait4 的 pid)。使用跳板时两者不同，进程组 id 均为 Popen 对象的 pid
+    """
+    if not TRAMPOLINE_SHELL or not enable_subreaper():
+        process = subprocess.Popen(
+            command,
+            stdin=stdin,
+            stdout=stdout,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+            preexec_fn=child_setup
+        )
+        return process, process.pid
+
+    pid_read, pid_write = os.pipe()
+    go_read, go_write = os.pipe()
+    try:
+        process = subprocess.Popen(
+            [TRAMPOLINE_SHELL, '-c', TRAMPOLINE_SCRIPT.format(pid_fd=pid_write, go_fd=go_read), 'judge'] + list(command),
+            stdin=stdin,
+            stdout=stdout,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+            pass_fds=(pid_write, go_read),
+            preexec_fn=child_setup
+        )
+    except Exception:
+        os.close(go_write)
+        raise
+    finally:
+        os.close(pid_write)
+        os.close(go_read)
+
+    try:
+        with os.fdopen(pid_read, 'rb') as pid_pipe:
+            pid_text = pid_pipe.read().strip()
+        process.wait()
+        target_pid = int(pid_text)
+    except (OSError, ValueError):
+        _kill_process_group(process.pid)
+        process.wait()
+        raise RuntimeError('无法启动用户程序')
+    finally:
+        # 跳板已退出，用户程序已过继给当前进程，放行
+        os.close(go_write)
+
+    return process, target_pid
+
+
+def _limit_file_size(limit: int):
+    """在子进程中限制可写文件大小（不放宽已有的限制），写超时内核发送 SIGXFSZ"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_FSIZE)
+    if soft != resource.RLIM_INFINITY:
+        limit = min(limit, soft)
+    if hard != resource.RLIM_INFINITY and hard < limit:
+        limit = hard
+    resource.setrlimit(resource.RLIMIT_FSIZE, (limit, hard))
+
+
+def _open_stdio(input_file: Optional[str], output_file: Optional[str]):
+    """打开作为标准输入/输出的文件，未指定时使用管道"""
+    stdin = open(input_file, 'rb') if input_file else subprocess.PIPE
+    try:
+        stdout = open(output_file, 'wb') if output_file else subprocess.PIPE
+    except Exception:
+        if input_file:
+            stdin.close()
+        raise
+    return stdin, stdout
+
+
+def _close_stdio(*files):
+    """关闭父进程持有的文件（子进程已继承各自的副本）"""
+    for f in files:
+        if f is not subprocess.PIPE:
+            f.close()
+
+
+def run_process(command: List[str], cwd: str, input_data: Optional[bytes],
+                time_limit: int, memory_limit: int,
+                wall_time_limit: Optional[int] = None,
+                preexec_fn: Optional[Callable[[], None]] = None,
+                output_limit: Optional[int] = None,
+                input_file: Optional[str] = None,
+                output_file: Optional[str] = None,
+                cgroup=None) -> Dict:
+    """
+    运行进程并度量资源使用
+    time_limit: CPU 时间限制(ms)，memory_limit: 内存限制(MB)，output_limit: 标准输出限制(MB)
+    input_file: 作为标准输入的文件，指定时直接把文件描述符交给子进程，忽略 input_data
+    output_file: 标准输出写入的文件，指定时返回的 stdout 为空，输出限制由 RLIMIT_FSIZE 保证
+    cgroup: 已创建的 cgroup.JudgeCgroup，指定时子进程在 exec 前加入该 cgroup，
+            CPU 时间改为读取整个 cgroup 的统计，被内核 OOM 杀死时判为内存超限（内存仍为 ru_maxrss）
+    标准输出超过 output_limit 时立即杀死进程；标准错误最多保留 JUDGE_STDERR_LIMIT 字节
+    返回: {
+        'stdout', 'stderr'      输出（bytes）
+        'time_used'             CPU 时间(ms)
+        'wall_time'             墙钟时间(ms)
+        'memory_used'           峰值内存(KB)
+        'returncode'            退出码（被信号终止时为负的信号值）
+        'status'                accepted / time_limit_exceeded / memory_limit_exceeded /
+                                output_limit_exceeded / runtime_error
+    }
+    """
+    if wall_time_limit is None:
+        wall_time_limit = get_wall_time_limit(time_limit)
+    output_limit_bytes = get_output_limit_bytes(output_limit)
+    stderr_limit = getattr(settings, 'JUDGE_STDERR_LIMIT', 64 * 1024)
+
+    if not SUPPORTS_WAIT4:
+        return _run_process_fallback(command, cwd, input_data, time_limit, memory_limit,
+                                     wall_time_limit, output_limit_bytes, stderr_limit,
+                                     input_file, output_file)
+
+    cpu_seconds = max(1, math.ceil(time_limit / 1000.0))
+    cpus = get_run_cpus()
+
+    def child_setup():
+        # 在子进程中执行（资源限制会被用户程序继承）：独立进程组，CPU 时间硬限制作为兜底
+        # （按秒取整，精确判定由 rusage 完成）
+        if cgroup is not None:
+            cgroup.attach()
+        if cpus:
+            os.sched_setaffinity(0, cpus)
+        os.setsid()
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds + 1, cpu_seconds + 2))
+        if preexec_fn is not None:
+            preexec_fn()
+        if output_file:
+            # 多留一个字节: 忽略 SIGXFSZ 的程序（如 Python）写超限时文件大小为限制 + 1，仍能判为输出超限
+            _limit_file_size(output_limit_bytes + 1)
+
+    stdin, stdout = _open_stdio(input_file, output_file)
+    start_time = time.monotonic()
+    try:
+        process, target_pid = _launch(command, cwd, child_setup, stdin, stdout)
+    finally:
+        _close_stdio(stdin, stdout)
+    pgid = process.pid
+
+    def kill_all():
+        _kill_process_group(pgid)
+        if cgroup is not None:
+            cgroup.kill()
+
+    # 输出超限时立即杀死整个进程组
+    output_exceeded = threading.Event()
+
+    def on_output_exceeded():
+        output_exceeded.set()
+        kill_all()
+
+    stdout_chunks: List[bytes] = []
+    stderr_chunks: List[bytes] = []
+    io_threads = [
+        threading.Thread(target=_read_stream, args=(process.stderr, stderr_chunks, stderr_limit), daemon=True),
+    ]
+    if process.stdin is not None:
+        io_threads.append(
+            threading.Thread(target=_write_stream, args=(process.stdin, input_data), daemon=True)
+        )
+    if process.stdout is not None:
+        io_threads.append(threading.Thread(
+            target=_read_stream,
+            args=(process.stdout, stdout_chunks, output_limit_bytes, on_output_exceeded),
+            daemon=True
+        ))
+    for thread in io_threads:
+        thread.start()
+
+    # 墙钟超时后杀死整个进程组
+    wall_timeout = threading.Event()
+
+    def on_wall_timeout():
+        wall_timeout.set()
+        kill_all()
+
+    timer = threading.Timer(wall_time_limit / 1000.0, on_wall_timeout)
+    timer.daemon = True
+    timer.start()
+
+    try:
+        _, wait_status, rusage = os.wait4(target_pid, 0)
+    finally:
+        timer.cancel()
+
+    wall_time = int((time.monotonic() - start_time) * 1000)
+    returncode = os.waitstatus_to_exitcode(wait_status)
+    if target_pid == process.pid:
+        # 已由 wait4 回收，告知 Popen 不要再次 waitpid
+        process.returncode = returncode
+
+    # 清理可能残留的子孙进程，使输出管道关闭
+    kill_all()
+    _reap_process_group(pgid)
+    for thread in io_threads:
+        thread.join(timeout=1)
+
+    # 输出写入文件时，被 SIGXFSZ 终止或超过限制即视为输出超限（恰好等于限制不算超限，与 RLIMIT_FSIZE 一致）
+    if output_file and (returncode == -signal.SIGXFSZ or
+                        os.path.getsize(output_file) > output_limit_bytes):
+        output_exceeded.set()
+
+    cpu_time = int((rusage.ru_utime + rusage.ru_stime) * 1000)
+    memory_used = rusage.ru_maxrss
+    if sys.platform == 'darwin':
+        memory_used //= 1024  # macOS 下单位为字节
+
+    oom_killed = False
+    if cgroup is not None:
+        usage = cgroup.usage()
+        cpu_time = usage['cpu_time']
+        oom_killed = usage['oom_killed']
+
+    status = get_result_status(output_exceeded.is_set(), wall_timeout.is_set(), cpu_time, time_limit,
+                               memory_used, memory_limit, returncode, oom_killed)
+
+    return {
+        'stdout': b''.join(stdout_chunks),
+        'stderr': b''.join(stderr_chunks),
+        'time_used': cpu_time,
+        'wall_time': wall_time,
+        'memory_used': memory_used,
+        'returncode': returncode,
+        'status': status,
+    }
+
+
+def get_result_status(output_exceeded: bool, wall_timeout: bool, cpu_time: int, time_limit: int,
+                      memory_used: int, memory_limit: int, returncode: int, oom_killed: bool = False) -> str:
+    """根据资源使用和退出码判定运行结果（时间单位 ms，memory_used 单位 KB，memory_limit 单位 MB）"""
+    if output_exceeded:
+        return 'output_limit_exceeded'
+    if oom_killed:
+        return 'memory_limit_exceeded'
+    if wall_timeout or cpu_time > time_limit or returncode == -signal.SIGXCPU:
+        return 'time_limit_exceeded'
+    if memory_used > memory_limit * 1024:
+        return 'memory_limit_exceeded'
+    if returncode != 0:
+        return 'runtime_error'
+    return 'accepted'
+
+
+def _run_process_fallback(command: List[str], cwd: str, input_data: Optional[bytes],
+                          time_limit: int, memory_limit: int, wall_time_limit: int,
+                          output_limit_bytes: int, stderr_limit: int,
+                          input_file: Optional[str] = None,
+                          output_file: Optional[str] = None) -> Dict:
+    """不支持 wait4 的平台：使用墙钟时间近似 CPU 时间，不度量内存"""
+    stdin, stdout = _open_stdio(input_file, output_file)
+    start_time = time.monotonic()
+    try:
+        process = subprocess.Popen(
+            command,
+            stdin=stdin,
+            stdout=stdout,
+            stderr=subprocess.PIPE,
+            cwd=cwd
+        )
+    finally:
+        _close_stdio(stdin, stdout)
+
+    output_exceeded = threading.Event()
+
+    def on_output_exceeded():
+        output_exceeded.set()
+        process.kill()
+
+    stdout_chunks: List[bytes] = []
+    stderr_chunks: List[bytes] = []
+    io_threads = [
+        threading.Thread(target=_read_stream, args=(process.stderr, stderr_chunks, stderr_limit), daemon=True),
+    ]
+    if process.stdin is not None:
+        io_threads.append(
+            threading.Thread(target=_write_stream, args=(process.stdin, input_data), daemon=True)
+        )
+    if process.stdout is not None:
+        io_threads.append(threading.Thread(
+            target=_read_stream,
+            args=(process.stdout, stdout_chunks, output_limit_bytes, on_output_exceeded),
+            daemon=True
+        ))
+    for thread in io_threads:
+        thread.start()
+
+    timed_out = False
+    try:
+        process.wait(timeout=wall_time_limit / 1000.0)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        process.kill()
+        process.wait()
+    for thread in io_threads:
+        thread.join(timeout=1)
+
+    # 没有 RLIMIT_FSIZE，只能在运行结束后检查输出文件大小
+    if output_file and os.path.getsize(output_file) > output_limit_bytes:
+        output_exceeded.set()
+
+    wall_time = int((time.monotonic() - start_time) * 1000)
+    if output_exceeded.is_set():
+        status = 'output_limit_exceeded'
+    elif timed_out or wall_time > time_limit:
+        status = 'time_limit_exceeded'
+    elif process.returncode != 0:
+        status = 'runtime_error'
+    else:
+        status = 'accepted'
+
+    return {
+        'stdout': b''.join(stdout_chunks),
+        'stderr': b''.join(stderr_chunks),
+        'time_used': wall_time,
+        'wall_time': wall_time,
+        'memory_used': 0,
+        'returncode': process.returncode,
+        'status': status,
+    }
@@ -1,16 +1,39 @@
 """
 沙箱判题引擎 - 使用进程隔离和资源限制
 """
+import logging
+import math
 import os
-import psutil
-import signal
+import platform
+import shlex
 import subprocess
-import tempfile
 import time
 import resource
 from typing import Dict, List, Tuple, Optional
 from django.conf import settings
 from .models import JudgeConfig
+from .config_cache import get_judge_config
+from .compile_cache import CompileCache, get_compile_cache
+from .runner import get_output_limit_bytes, run_process
+from .pch import apply_pch
+from .jvm import build_jvm_command, get_jvm_memory_overhead, is_jvm_command
+from .zygote import ZYGOTE_SCRIPT, WarmProgram, ZygoteError, get_zygote
+from .compare import compare_output_files
+from .workspace import get_workspace_pool
+from .admission import admit_run
+from .judge_task import CompiledTask, JudgeOutcome, JudgeTask, TestCaseData
+from .case_executor import (
+    POLICY_STOP_ON_FAILURE, execute_test_cases, output_preview,
+    prepare_test_case_files, remove_test_case_files, skipped_test_result
+)
+
+logger = logging.getLogger(__name__)
+
+# 用户程序可写文件大小的下限（字节）；输出限制更大时按输出限制放宽
+MIN_FILE_SIZE_LIMIT = 100 * 1024 * 1024
+
+# 内存分配失败时各语言写入标准错误的信息: 程序因此出错退出时判为内存超限
+MEMORY_ERROR_MARKERS = (b'java.lang.OutOfMemoryError', b'MemoryError', b'std::bad_alloc')
 
 
 class SandboxEngine:
@@ -20,6 +43,7 @@ class SandboxEngine:
         self.judge_dir = getattr(settings, 'JUDGE_DIR', '/tmp/judge')
         self.sandbox_dir = os.path.join(self.judge_dir, 'sandbox')
         self.ensure_directories()
+        self.compile_cache = get_compile_cache()
         
     def ensure_directories(self):
         """确保必要目录存在"""
@@ -27,130 +51,190 @@ class SandboxEngine:
         os.makedirs(self.sandbox_dir, exist_ok=True)
         
     def get_judge_config(self, language: str) -> Optional[JudgeConfig]:
-        """获取编程语言配置"""
-        try:
-            return JudgeConfig.objects.get(language=language, is_enabled=True)
-        except JudgeConfig.DoesNotExist:
-            return None
+        """获取编程语言配置（进程内缓存，配置修改后几秒内生效）"""
+        return get_judge_config(language)
     
-    def create_sandbox_environment(self, code: str, language: str) -> Dict[str, str]:
-        """创建沙箱环境"""
+    def build_command_context(self, code_file: str) -> Dict[str, str]:
+        """构建命令格式化上下文"""
+        file_dir = os.path.dirname(code_file)
+        file_name = os.path.basename(code_file)
+        file_stem, file_extension = os.path.splitext(file_name)
+        file_path_no_ext = os.path.splitext(code_file)[0]
+
+        return {
+            'file_path': code_file,
+            'file_dir': file_dir,
+            'dir': file_dir,
+            'file_name': file_name,
+            'file_stem': file_stem,
+            'class_name': file_stem,
+            'file_extension': file_extension,
+            'file_path_no_ext': file_path_no_ext,
+            'executable': file_path_no_ext,
+            'executable_path': file_path_no_ext,
+            'file_path_exe': file_path_no_ext,
+        }
+
+    def build_command(self, template: str, code_file: str) -> List[str]:
+        """根据模板生成命令列表"""
+        if not template:
+            return []
+
+        command_str = template.format(**self.build_command_context(code_file))
+        return shlex.split(command_str, posix=platform.system() != 'Windows')
+
+    def create_sandbox_environment(self, code: str, language: str) -> Dict:
+        """创建沙箱环境（从工作区池取得工作区，用完后调用 release_sandbox_environment 归还）"""
         config = self.get_judge_config(language)
         if not config:
             raise ValueError(f"不支持的语言: {language}")
         
-        # 创建临时目录
-        temp_dir = tempfile.mkdtemp(dir=self.sandbox_dir)
-        
-        # 写入用户代码
-        code_file = os.path.join(temp_dir, f"solution{config.file_extension}")
-        with open(code_file, 'w', encoding='utf-8') as f:
-            f.write(code)
+        workspace = get_workspace_pool().acquire()
+        try:
+            # 写入用户代码
+            code_file = os.path.join(workspace.code_dir, f"solution{config.file_extension}")
+            with open(code_file, 'w', encoding='utf-8') as f:
+                f.write(code)
+        except Exception:
+            get_workspace_pool().release(workspace)
+            raise
         
         return {
-            'temp_dir': temp_dir,
+            'workspace': workspace,
+            'temp_dir': workspace.code_dir,
+            # 测试数据和用户输出放在代码目录之外
+            'data_dir': workspace.data_dir,
             'code_file': code_file
         }
     
-    def set_resource_limits(self, time_limit: int, memory_limit: int):
-        """设置资源限制"""
-        # 设置CPU时间限制（秒）
-        resource.setrlimit(resource.RLIMIT_CPU, (time_limit // 1000, time_limit // 1000))
-        
-        # 设置内存限制（字节）
-        memory_bytes = memory_limit * 1024 * 1024  # 转换为字节
-        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
-        
-        # 设置文件大小限制
-        resource.setrlimit(resource.RLIMIT_FSIZE, (100 * 1024 * 1024, 100 * 1024 * 1024))  # 100MB
-        
-        # 设置进程数限制
-        resource.setrlimit(resource.RLIMIT_NPROC, (50, 50))
+    def release_sandbox_environment(self, sandbox: Dict):
+        """清空并归还工作区"""
+        get_workspace_pool().release(sandbox['workspace'])
+    
+    def file_size_limit(self, output_limit: Optional[int]) -> int:
+        """RLIMIT_FSIZE（字节）: 不小于 100MB，并比输出限制多一个字节（超出部分由 runner 判为输出超限）"""
+        return max(MIN_FILE_SIZE_LIMIT, get_output_limit_bytes(output_limit) + 1)
+    
+    def resource_limits(self, time_limit: int, memory_limit: int,
+                        output_limit: Optional[int] = None) -> List[Tuple[int, int, int]]:
+        """用户程序的资源限制 [(resource.RLIMIT_*, soft, hard), ...]，output_limit 单位为 MB"""
+        # CPU时间限制（秒，向上取整，精确的CPU时间由 wait4 的 rusage 判定）
+        cpu_seconds = max(1, math.ceil(time_limit / 1000.0))
+        file_size = self.file_size_limit(output_limit)
+        # 地址空间限制（字节）: 留出余量，使峰值内存可以超过内存限制并由 rusage 判为内存超限，
+        # 超出余量的分配失败时由标准错误中的信息判定（见 MEMORY_ERROR_MARKERS）
+        address_space = int(memory_limit * 1024 * 1024 * getattr(settings, 'JUDGE_ADDRESS_SPACE_FACTOR', 2.0))
+        return [
+            (resource.RLIMIT_CPU, cpu_seconds + 1, cpu_seconds + 2),
+            (resource.RLIMIT_AS, address_space, address_space),
+            # 文件大小限制
+            (resource.RLIMIT_FSIZE, file_size, file_size),
+            # 进程数限制
+            (resource.RLIMIT_NPROC, 50, 50),
+            # 文件描述符限制
+            (resource.RLIMIT_NOFILE, 100, 100),
+        ]
+    
+    def command_resource_limits(self, command: List[str], time_limit: int, memory_limit: int,
+                                output_limit: Optional[int] = None) -> List[Tuple[int, int, int]]:
+        """运行指定命令时的资源限制"""
+        limits = self.resource_limits(time_limit, memory_limit, output_limit)
+        if is_jvm_command(command):
+            # JVM 预留的虚拟地址空间远大于实际使用的内存，不能用 RLIMIT_AS 限制，堆大小由 -Xmx 限制
+            limits = [limit for limit in limits if limit[0] != resource.RLIMIT_AS]
+        return limits
+    
+    def set_resource_limits(self, limits: List[Tuple[int, int, int]]):
+        """设置资源限制（在子进程中调用）"""
+        for limit, soft, hard in limits:
+            resource.setrlimit(limit, (soft, hard))
+    
+    def get_warm_program(self, code_file: str, language: str) -> Optional[WarmProgram]:
+        """语言配置开启了预热运行器时，返回在 zygote 中运行的程序；否则返回 None"""
+        config = self.get_judge_config(language)
+        if not config or not config.warm_runner:
+            return None
+        zygote = get_zygote(self.build_command(config.run_command, ZYGOTE_SCRIPT), self.sandbox_dir)
+        if zygote is None:
+            return None
+        return WarmProgram(zygote, code_file)
+    
+    def run_limited_process(self, command: List[str], input_bytes: Optional[bytes],
+                            time_limit: int, memory_limit: int, output_limit: Optional[int],
+                            input_file: Optional[str], output_file: Optional[str],
+                            warm_program: Optional[WarmProgram] = None, cgroup=None) -> Dict:
+        """
+        在资源限制下运行进程，返回 runner.run_process 的结果
+        指定 warm_program 且输入输出均为文件时在 zygote 中运行，zygote 异常时退回普通方式
+        """
+        limits = self.command_resource_limits(command, time_limit, memory_limit, output_limit)
+        if warm_program is not None and input_file and output_file:
+            try:
+                return warm_program.run(
+                    self.sandbox_dir, time_limit, memory_limit, output_limit,
+                    input_file, output_file, limits, cgroup
+                )
+            except ZygoteError as e:
+                logger.warning(f"预热运行器出错，使用普通方式运行: {str(e)}")
         
-        # 设置文件描述符限制
-        resource.setrlimit(resource.RLIMIT_NOFILE, (100, 100))
+        # 资源限制在子进程 fork 之后、exec 之前设置
+        return run_process(
+            command,
+            self.sandbox_dir,
+            input_bytes,
+            time_limit,
+            memory_limit,
+            preexec_fn=lambda: self.set_resource_limits(limits),
+            output_limit=output_limit,
+            input_file=input_file,
+            output_file=output_file,
+            cgroup=cgroup
+        )
     
-    def run_secure_process(self, command: List[str], input_data: str, 
-                          time_limit: int, memory_limit: int) -> Dict:
-        """运行安全的进程"""
+    def run_secure_process(self, command: List[str], input_data: Optional[str], 
+                          time_limit: int, memory_limit: int,
+                          output_limit: Optional[int] = None,
+                          input_file: Optional[str] = None,
+                          output_file: Optional[str] = None,
+                          warm_program: Optional[WarmProgram] = None) -> Dict:
+        """
+        运行安全的进程
+        指定 input_file/output_file 时标准输入/输出直接使用文件，返回的 output 为空
+        """
         try:
-            # 记录开始时间
-            start_time = time.time()
-            
-            # 启动进程
-            process = subprocess.Popen(
+            # JVM 自身的内存开销不计入内存限制，也不计入报告的内存
+            overhead = get_jvm_memory_overhead(command) if is_jvm_command(command) else 0
+            result = self.run_limited_process(
                 command,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                preexec_fn=self.set_resource_limits(time_limit, memory_limit),
-                cwd=self.sandbox_dir
+                None if input_file else (input_data or '').encode('utf-8'),
+                time_limit,
+                memory_limit + math.ceil(overhead / 1024),
+                output_limit,
+                input_file,
+                output_file,
+                warm_program
             )
             
-            # 监控进程
-            max_memory = 0
-            process_info = None
+            status = result['status']
+            memory_used = max(0, result['memory_used'] - overhead)
+            if status == 'runtime_error' and any(marker in result['stderr'] for marker in MEMORY_ERROR_MARKERS):
+                # 堆超过 -Xmx，或分配超出地址空间限制
+                status = 'memory_limit_exceeded'
+            stdout = result['stdout'].decode('utf-8', errors='replace')
+            stderr = result['stderr'].decode('utf-8', errors='replace')
+            if status == 'time_limit_exceeded':
+                stdout, stderr = '', '运行超时'
+            elif status == 'output_limit_exceeded':
+                stdout, stderr = '', '输出超限'
             
-            try:
-                # 发送输入数据
-                stdout, stderr = process.communicate(
-                    input=input_data or '',
-                    timeout=time_limit / 1000.0
-                )
-                
-                # 计算运行时间
-                end_time = time.time()
-                run_time = int((end_time - start_time) * 1000)
-                
-                # 获取内存使用情况
-                try:
-                    process_info = psutil.Process(process.pid)
-                    max_memory = int(process_info.memory_info().rss / 1024)  # KB
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    max_memory = 0
-                
-                # 检查状态
-                if process.returncode == 0:
-                    status = 'accepted'
-                elif process.returncode == 124:  # timeout
-                    status = 'time_limit_exceeded'
-                elif process.returncode == 137:  # killed
-                    status = 'memory_limit_exceeded'
-                else:
-                    status = 'runtime_error'
-                
-                return {
-                    'success': True,
-                    'output': stdout,
-                    'error': stderr,
-                    'time_used': run_time,
-                    'memory_used': max_memory,
-                    'status': status
-                }
-                
-            except subprocess.TimeoutExpired:
-                # 超时处理
-                try:
-                    process.terminate()
-                    process.wait(timeout=5)
-                except:
-                    try:
-                        process.kill()
-                    except:
-                        pass
-                
-                end_time = time.time()
-                run_time = int((end_time - start_time) * 1000)
-                
-                return {
-                    'success': True,
-                    'output': '',
-                    'error': '运行超时',
-                    'time_used': run_time,
-                    'memory_used': max_memory,
-                    'status': 'time_limit_exceeded'
-                }
+            return {
+                'success': True,
+                'output': stdout,
+                'error': stderr,
+                'time_used': result['time_used'],
+                'memory_used': memory_used,
+                'status': status
+            }
                 
         except Exception as e:
             return {
@@ -174,12 +258,26 @@ class SandboxEngine:
         
         try:
             # 构建编译命令
-            compile_cmd = config.compile_command.format(
-                file_path=code_file,
-                file_dir=os.path.dirname(code_file),
-                file_name=os.path.basename(code_file),
-                file_stem=os.path.splitext(os.path.basename(code_file))[0]
-            ).split()
+            compile_cmd = self.build_command(config.compile_command, code_file)
+            if not compile_cmd:
+                return False, "缺少编译命令"
+            
+            with open(code_file, 'r', encoding='utf-8') as f:
+                code = f.read()
+            
+            # 查找编译缓存
+            cache_key = None
+            if self.compile_cache:
+                cache_key = CompileCache.make_key(code, language, config.compile_command)
+                cached = self.compile_cache.lookup(cache_key, code_file)
+                if cached is not None:
+                    return cached
+            
+            # 源码以常用头文件开头时使用预编译头（首次使用时生成）
+            compile_cmd = apply_pch(compile_cmd, code_file, code, language)
+            
+            code_dir = os.path.dirname(code_file)
+            files_before = set(os.listdir(code_dir))
             
             # 执行编译
             result = subprocess.run(
@@ -187,33 +285,67 @@ class SandboxEngine:
                 capture_output=True,
                 text=True,
                 timeout=30,
-                cwd=os.path.dirname(code_file)
+                cwd=code_dir
             )
             
-            if result.returncode == 0:
-                return True, ""
-            else:
-                return False, result.stderr
+            success = result.returncode == 0
+            error = '' if success else result.stderr
+            
+            # 编译成功和编译错误都写入缓存
+            if cache_key:
+                artifacts = [] if not success else [
+                    name for name in sorted(set(os.listdir(code_dir)) - files_before)
+                    if os.path.isfile(os.path.join(code_dir, name))
+                ]
+                try:
+                    self.compile_cache.store(cache_key, code_file, success, error, artifacts)
+                except OSError:
+                    pass
+            
+            return success, error
                 
         except subprocess.TimeoutExpired:
             return False, "编译超时"
         except Exception as e:
             return False, f"编译错误: {str(e)}"
     
-    def run_code(self, code_file: str, language: str, input_data: str,
-                time_limit: int, memory_limit: int) -> Dict:
-        """运行代码"""
+    def build_run_command(self, code_file: str, language: str,
+                          memory_limit: Optional[int] = None) -> List[str]:
+        """
+        构建运行命令（针对已编译的产物）
+        JVM 命令附加 CDS 归档、JUDGE_JVM_OPTIONS 和堆大小限制（memory_limit，MB）
+        """
         config = self.get_judge_config(language)
         if not config:
+            raise ValueError(f"不支持的语言: {language}")
+
+        run_cmd = self.build_command(config.run_command, code_file)
+        if not run_cmd:
+            raise ValueError("缺少运行命令")
+        if memory_limit and is_jvm_command(run_cmd):
+            run_cmd = build_jvm_command(run_cmd, memory_limit)
+        return run_cmd
+
+    def execute_code(self, code_file: str, language: str, input_data: str,
+                     time_limit: int, memory_limit: int) -> Dict:
+        """运行已编译的代码（不重新编译）"""
+        try:
+            run_cmd = self.build_run_command(code_file, language, memory_limit)
+        except ValueError as e:
             return {
                 'success': False,
                 'output': '',
-                'error': f"不支持的语言: {language}",
+                'error': str(e),
                 'time_used': 0,
                 'memory_used': 0,
                 'status': 'system_error'
             }
-        
+
+        return self.run_secure_process(run_cmd, input_data, time_limit, memory_limit)
+
+    def run_code(self, code_file: str, language: str, input_data: str,
+                time_limit: int, memory_limit: int) -> Dict:
+        """编译并运行代码（单次运行使用，批量评测请先 compile_code 再 execute_code）"""
         try:
             # 编译代码
             compile_success, compile_error = self.compile_code(code_file, language)
@@ -227,16 +359,7 @@ class SandboxEngine:
                     'status': 'compile_error'
                 }
             
-            # 构建运行命令
-            run_cmd = config.run_command.format(
-                file_path=code_file,
-                file_dir=os.path.dirname(code_file),
-                file_name=os.path.basename(code_file),
-                file_stem=os.path.splitext(os.path.basename(code_file))[0]
-            ).split()
-            
-            # 运行代码
-            return self.run_secure_process(run_cmd, input_data, time_limit, memory_limit)
+            return self.execute_code(code_file, language, input_data, time_limit, memory_limit)
             
         except Exception as e:
             return {
@@ -248,101 +371,161 @@ class SandboxEngine:
                 'status': 'system_error'
             }
     
-    def judge_submission(self, submission) -> Dict:
-        """判题主函数"""
+    def judge_test_case(self, test_case: TestCaseData, run_cmd: List[str], task: JudgeTask, data_dir: str,
+                        warm_program: Optional[WarmProgram] = None) -> Dict:
+        """运行单个测试用例并比较输出（输入、输出和标准答案均通过文件传递）"""
+        input_file, answer_file, output_file = prepare_test_case_files(test_case, data_dir)
         try:
-            # 获取题目和测试用例
-            problem = submission.problem
-            test_cases = problem.test_cases.filter(is_sample=False)
+            # 主机上有足够的内存和 CPU 时才启动
+            with admit_run(task, run_cmd):
+                result = self.run_secure_process(
+                    run_cmd,
+                    None,
+                    task.time_limit,
+                    task.memory_limit,
+                    task.output_limit,
+                    input_file=input_file,
+                    output_file=output_file,
+                    warm_program=warm_program
+                )
             
-            if not test_cases.exists():
-                return {
-                    'status': 'system_error',
-                    'score': 0,
-                    'error_message': '没有找到测试用例',
-                    'test_results': []
-                }
+            # 分块比较输出文件与标准答案文件
+            if result['status'] == 'accepted':
+                if compare_output_files(answer_file, output_file):
+                    test_status = 'accepted'
+                    score = 10
+                else:
+                    test_status = 'wrong_answer'
+                    score = 0
+            else:
+                test_status = result['status']
+                score = 0
             
-            # 创建沙箱环境
-            sandbox = self.create_sandbox_environment(submission.code, submission.language)
+            # 超时、超内存、超输出时不展示输出
+            if result['status'] in ('accepted', 'runtime_error'):
+                actual_output = output_preview(output_file)
+            else:
+                actual_output = ''
+        finally:
+            remove_test_case_files(data_dir, input_file, answer_file, output_file)
+        
+        return {
+            'test_case_id': test_case.id,
+            'input': test_case.input_preview,
+            'expected_output': test_case.output_preview,
+            'actual_output': actual_output,
+            'status': test_status,
+            'score': score,
+            'time_used': result['time_used'],
+            'memory_used': result['memory_used'],
+            'error': result['error']
+        }
+    
+    def judge_submission(self, submission, parallelism: Optional[int] = None) -> Dict:
+        """判题主函数（从数据库读取提交，见 tasks.build_judge_task）"""
+        from .tasks import build_judge_task
+        return self.judge_task(build_judge_task(submission), parallelism).to_dict()
+    
+    def judge_task(self, task: JudgeTask, parallelism: Optional[int] = None) -> JudgeOutcome:
+        """判题（只使用任务中的数据，不访问数据库）"""
+        compiled = self.compile_task(task)
+        if isinstance(compiled, JudgeOutcome):
+            return compiled
+        return self.run_compiled(compiled, parallelism)
+    
+    def compile_task(self, task: JudgeTask):
+        """
+        判题的编译阶段: 创建沙箱环境并编译
+        返回: 编译成功时为 CompiledTask（之后必须调用 run_compiled），否则为最终的 JudgeOutcome
+        """
+        try:
+            if not task.test_cases:
+                return JudgeOutcome(status='system_error', error_message='没有找到测试用例')
             
-            try:
-                # 运行测试用例
-                test_results = []
-                total_score = 0
-                max_score = test_cases.count() * 10
-                max_time = 0
-                max_memory = 0
-                final_status = 'accepted'
+            with task.language_config():
+                # 创建沙箱环境
+                sandbox = self.create_sandbox_environment(task.code, task.language)
                 
-                for test_case in test_cases:
-                    # 运行代码
-                    result = self.run_code(
-                        sandbox['code_file'],
-                        submission.language,
-                        test_case.input_data,
-                        problem.time_limit,
-                        problem.memory_limit
-                    )
-                    
-                    # 更新最大时间和内存
-                    max_time = max(max_time, result['time_used'])
-                    max_memory = max(max_memory, result['memory_used'])
-                    
-                    # 比较输出
-                    if result['status'] == 'accepted':
-                        if self.compare_output(test_case.expected_output, result['output']):
-                            test_status = 'accepted'
-                            score = 10
-                            total_score += score
-                        else:
-                            test_status = 'wrong_answer'
-                            final_status = 'wrong_answer'
-                            score = 0
+                try:
+                    # 编译一次，所有测试用例共用同一份编译产物
+                    compile_start = time.time()
+                    compile_success, compile_error = self.compile_code(sandbox['code_file'], task.language)
+                    compile_time = int((time.time() - compile_start) * 1000)
+                    if not compile_success:
+                        outcome = JudgeOutcome(status='compile_error', compile_time=compile_time,
+                                               error_message=compile_error)
+                    elif not sandbox['workspace'].within_quota():
+                        outcome = JudgeOutcome(status='compile_error', compile_time=compile_time,
+                                               error_message='编译产物超过工作区大小限制')
                     else:
-                        test_status = result['status']
-                        final_status = result['status']
-                        score = 0
-                    
-                    test_results.append({
-                        'test_case_id': test_case.id,
-                        'input': test_case.input_data,
-                        'expected_output': test_case.expected_output,
-                        'actual_output': result['output'],
-                        'status': test_status,
-                        'score': score,
-                        'time_used': result['time_used'],
-                        'memory_used': result['memory_used'],
-                        'error': result['error']
-                    })
+                        run_cmd = self.build_run_command(sandbox['code_file'], task.language, task.memory_limit)
+                        return CompiledTask(task=task, sandbox=sandbox, run_cmd=run_cmd, compile_time=compile_time)
+                except Exception:
+                    self.release_sandbox_environment(sandbox)
+                    raise
                 
-                # 计算最终得分
-                final_score = int((total_score / max_score) * 100) if max_score > 0 else 0
-                
-                return {
-                    'status': final_status,
-                    'score': final_score,
-                    'time_used': max_time,
-                    'memory_used': max_memory,
-                    'error_message': '',
-                    'test_results': test_results
-                }
-                
-            finally:
-                # 清理沙箱环境
-                try:
-                    import shutil
-                    shutil.rmtree(sandbox['temp_dir'])
-                except:
-                    pass
+                self.release_sandbox_environment(sandbox)
+                return outcome
                     
         except Exception as e:
-            return {
-                'status': 'system_error',
-                'score': 0,
-                'error_message': f"系统错误: {str(e)}",
-                'test_results': []
-            }
+            return JudgeOutcome(status='system_error', error_message=f"系统错误: {str(e)}")
+    
+    def run_compiled(self, compiled: CompiledTask, parallelism: Optional[int] = None) -> JudgeOutcome:
+        """判题的运行阶段: 运行全部测试用例并汇总结果，结束后归还工作区"""
+        task = compiled.task
+        sandbox = compiled.sandbox
+        try:
+            test_cases = task.test_cases
+            with task.language_config():
+                warm_program = self.get_warm_program(sandbox['code_file'], task.language)
+            
+            # 运行测试用例（可并发，结果顺序与测试用例顺序一致）
+            # ACM 赛制下遇到第一个未通过的测试用例即停止，其余标记为 skipped
+            stop_on_failure = task.policy == POLICY_STOP_ON_FAILURE
+            case_results = execute_test_cases(
+                lambda test_case: self.judge_test_case(
+                    test_case, compiled.run_cmd, task, sandbox['data_dir'], warm_program
+                ),
+                test_cases,
+                parallelism,
+                stop_on_failure
+            )
+            test_results = [
+                result if result is not None else skipped_test_result(test_case)
+                for test_case, result in zip(test_cases, case_results)
+            ]
+            
+            total_score = 0
+            max_score = len(test_cases) * 10
+            max_time = 0
+            max_memory = 0
+            final_status = 'accepted'
+            
+            for test_result in test_results:
+                # 更新最大时间和内存
+                max_time = max(max_time, test_result['time_used'])
+                max_memory = max(max_memory, test_result['memory_used'])
+                total_score += test_result['score']
+                if test_result['status'] not in ('accepted', 'skipped'):
+                    final_status = test_result['status']
+            
+            # 计算最终得分
+            final_score = int((total_score / max_score) * 100) if max_score > 0 else 0
+            
+            return JudgeOutcome(
+                status=final_status,
+                score=final_score,
+                time_used=max_time,
+                memory_used=max_memory,
+                compile_time=compiled.compile_time,
+                test_results=test_results
+            )
+                    
+        except Exception as e:
+            return JudgeOutcome(status='system_error', error_message=f"系统错误: {str(e)}")
+        finally:
+            # 清空并归还工作区
+            self.release_sandbox_environment(sandbox)
     
     def compare_output(self, expected: str, actual: str) -> bool:
         """比较输出结果"""
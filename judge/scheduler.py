@@ -0,0 +1,138 @@
+"""
+判题队列调度器 - 决定判题进程下一个领取哪个队列项
+
+调度器只给出候选队列项的顺序，真正的领取仍由 tasks.claim_next_queue_item 原子完成，
+候选项被其他进程抢先领取时依次尝试下一个。
+
+JUDGE_SCHEDULER 可选:
+    fifo  按优先级和入队时间先进先出
+    fair  公平调度（默认）:
+          1. 优先级高的先判
+          2. 等待超过 JUDGE_SCHEDULER_MAX_WAIT 秒的提交优先，避免长任务饿死
+          3. 竞赛提交先于练习提交
+          4. 按用户轮转: 每个用户的第 k 个待判提交（加上正在判的数量）排在第 k 轮，
+             刷屏的用户只会拖慢自己
+          5. 同一轮内短任务优先，耗时按题目的历史判题耗时（Problem.avg_judge_time）估计
+          正在判题的提交数达到 JUDGE_SCHEDULER_USER_MAX_INFLIGHT 的用户排在所有其他用户之后，
+          没有其他用户的提交可判时仍然调度，判题进程不会空闲
+也可以填写调度器类的完整路径（如 myapp.scheduler.MyScheduler）。
+"""
+from datetime import timedelta
+from typing import List
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Q, Subquery, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import JudgeQueue
+
+
+class FifoScheduler:
+    """先进先出调度"""
+
+    def candidates(self, limit: int = 10) -> List[int]:
+        """按调度顺序返回待处理队列项的 id"""
+        return list(
+            JudgeQueue.objects.filter(status='pending')
+            .order_by('-priority', 'created_at')
+            .values_list('id', flat=True)[:limit]
+        )
+
+
+class FairShareScheduler:
+    """按用户公平分配、竞赛优先、短任务优先的调度"""
+
+    def __init__(self):
+        self.max_inflight = getattr(settings, 'JUDGE_SCHEDULER_USER_MAX_INFLIGHT', 2)
+        self.max_wait = timedelta(seconds=getattr(settings, 'JUDGE_SCHEDULER_MAX_WAIT', 120))
+        # 每个用户最多考虑的待判提交数，限制单次调度读取的行数
+        self.per_user_window = getattr(settings, 'JUDGE_SCHEDULER_USER_WINDOW', 5)
+
+    def get_inflight_counts(self):
+        """每个用户正在判题的提交数"""
+        return dict(
+            JudgeQueue.objects.filter(status='processing')
+            .values_list('submission__user_id')
+            .annotate(count=Count('id'))
+        )
+
+    def get_pending_rows(self):
+        from contests.models import ContestSubmission
+
+        pending = JudgeQueue.objects.filter(status='pending').annotate(
+            user_id=F('submission__user_id'),
+            avg_judge_time=F('submission__problem__avg_judge_time'),
+            time_limit=F('submission__problem__time_limit'),
+            is_contest=Exists(ContestSubmission.objects.filter(submission_id=OuterRef('submission_id'))),
+        )
+
+        fields = ('id', 'priority', 'created_at', 'user_id', 'avg_judge_time', 'time_limit', 'is_contest')
+        if connection.features.supports_over_clause:
+            # 每个用户只取最早的几个待判提交
+            pending = pending.annotate(
+                user_round=Window(
+                    RowNumber(),
+                    partition_by=F('submission__user_id'),
+                    order_by=[F('priority').desc(), F('created_at').asc(), F('id').asc()],
+                )
+            ).filter(user_round__lte=self.per_user_window)
+            return list(pending.values(*fields, 'user_round'))
+
+        # 不支持窗口函数时，按用户分组统计排在每一项之前的同一用户的待判提交数，得到相同的轮次
+        # （不能只读取前若干行: 一个用户积压大量提交时，其他用户的提交会被截掉）
+        ahead = JudgeQueue.objects.filter(
+            status='pending',
+            submission__user_id=OuterRef('submission__user_id'),
+        ).filter(
+            Q(priority__gt=OuterRef('priority')) |
+            Q(priority=OuterRef('priority'), created_at__lt=OuterRef('created_at')) |
+            Q(priority=OuterRef('priority'), created_at=OuterRef('created_at'), id__lt=OuterRef('id'))
+        ).order_by().values('submission__user_id').annotate(count=Count('id')).values('count')
+        pending = pending.annotate(
+            user_round=Coalesce(Subquery(ahead, output_field=IntegerField()), 0) + 1
+        ).filter(user_round__lte=self.per_user_window)
+        return list(pending.values(*fields, 'user_round'))
+
+    def candidates(self, limit: int = 10) -> List[int]:
+        """按调度顺序返回待处理队列项的 id"""
+        inflight = self.get_inflight_counts()
+        now = timezone.now()
+
+        def sort_key(row):
+            aged = now - row['created_at'] > self.max_wait
+            # 没有历史数据的题目按时间限制估计
+            estimate = row['avg_judge_time'] or row['time_limit']
+            return (
+                -row['priority'],
+                not aged,
+                not row['is_contest'],
+                inflight.get(row['user_id'], 0) + row['user_round'],
+                estimate,
+                row['created_at'],
+                row['id'],
+            )
+
+        # 正在判题的提交数达到上限的用户排在最后: 有其他用户的提交时不会被调度，
+        # 只有这些用户有待判提交时仍然调度，避免判题进程空闲
+        def capped(row):
+            return bool(self.max_inflight) and inflight.get(row['user_id'], 0) >= self.max_inflight
+
+        rows = self.get_pending_rows()
+        rows.sort(key=lambda row: (capped(row), sort_key(row)))
+        return [row['id'] for row in rows[:limit]]
+
+
+SCHEDULERS = {
+    'fifo': FifoScheduler,
+    'fair': FairShareScheduler,
+}
+
+
+def get_scheduler():
+    """按 JUDGE_SCHEDULER 配置创建调度器"""
+    name = getattr(settings, 'JUDGE_SCHEDULER', 'fair')
+    scheduler_class = SCHEDULERS.get(name)
+    if scheduler_class is None:
+        scheduler_class = import_string(name)
+    return scheduler_class()
@@ -0,0 +1,14 @@
+"""
+判题系统信号处理
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .config_cache import bump_config_version
+from .models import JudgeConfig
+
+
+@receiver(post_save, sender=JudgeConfig)
+@receiver(post_delete, sender=JudgeConfig)
+def judge_config_changed(sender, **kwargs):
+    """语言配置修改后通知所有判题进程重新加载"""
+    bump_config_version()
@@ -0,0 +1,248 @@
+"""
+判题监督进程 - 在一台判题主机上 fork 多个判题子进程并负责它们的生命周期
+
+    - 子进程数可以按 CPU 数和内存自动计算（get_auto_process_count）
+    - 子进程异常退出后自动重启，短时间内反复崩溃时按指数退避延迟重启
+    - 子进程处理 max_submissions 个提交后主动退出并由监督进程重新启动，避免长时间运行后内存膨胀
+    - 收到 SIGTERM/SIGINT 时通知子进程排空: 正在判的提交判完后退出，超过 drain_timeout 仍未退出的强制结束
+      （被强制结束的提交由其他判题进程在租约过期后重新领取）
+"""
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Dict, Optional
+from django.conf import settings
+from django.db import connections
+from .worker import JudgeWorker
+
+logger = logging.getLogger(__name__)
+
+# 子进程因达到 max_submissions 退出时的退出码，监督进程据此立即重启
+EXIT_RECYCLE = 3
+
+# 子进程运行不到这么多秒就异常退出时视为反复崩溃，延迟重启
+CRASH_WINDOW = 10
+MAX_RESTART_DELAY = 30
+
+
+def _read_first_line(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def get_cpu_count() -> int:
+    """可用的 CPU 数（考虑 CPU 亲和性和 cgroup 配额）"""
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+
+    # cgroup v2: cpu.max 内容为 "<quota> <period>" 或 "max <period>"
+    cpu_max = _read_first_line('/sys/fs/cgroup/cpu.max')
+    if cpu_max:
+        quota, _, period = cpu_max.partition(' ')
+        if quota != 'max' and period:
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    return cpus
+
+
+def get_memory_limit() -> Optional[int]:
+    """可用内存（字节），优先使用 cgroup 限制"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        value = _read_first_line(path)
+        # cgroup v1 未限制时是一个接近 2^63 的数
+        if value and value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemTotal:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def get_auto_process_count() -> int:
+    """
+    按主机资源计算判题子进程数:
+    CPU 数 / 每个提交的测试用例并发数，并且每个进程至少预留 JUDGE_WORKER_MEMORY MB 内存
+    """
+    case_parallelism = max(1, getattr(settings, 'JUDGE_CASE_PARALLELISM', 1))
+    count = max(1, get_cpu_count() // case_parallelism)
+
+    memory = get_memory_limit()
+    worker_memory = getattr(settings, 'JUDGE_WORKER_MEMORY', 1024) * 1024 * 1024
+    if memory and worker_memory > 0:
+        count = min(count, max(1, memory // worker_memory))
+    return count
+
+
+class JudgeSupervisor:
+    """fork 并监督多个判题子进程"""
+
+    def __init__(self, processes: int, worker_options: Dict, max_submissions: Optional[int] = None,
+                 drain_timeout: float = 600, worker_id_prefix: Optional[str] = None,
+                 worker_class=JudgeWorker):
+        self.processes = processes
+        self.worker_options = worker_options
+        self.max_submissions = max_submissions
+        self.drain_timeout = drain_timeout
+        self.worker_id_prefix = worker_id_prefix
+        # 子进程中运行的判题进程类: worker.JudgeWorker 或 async_worker.AsyncJudgeWorker
+        self.worker_class = worker_class
+        self.children: Dict[int, int] = {}          # pid -> 槽位
+        self.started_at: Dict[int, float] = {}      # 槽位 -> 子进程启动时间
+        self.restart_at: Dict[int, float] = {}      # 槽位 -> 计划重启时间
+        self.restart_delay: Dict[int, float] = {}   # 槽位 -> 当前退避延迟
+        self.finished = set()                       # 正常结束、不再重启的槽位
+        self.stopping = False
+
+    def run(self):
+        previous_handlers = {
+            signum: signal.signal(signum, self._handle_stop_signal)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        logger.info(f"判题监督进程 {os.getpid()} 启动，子进程数: {self.processes}")
+
+        try:
+            for slot in range(self.processes):
+                self._spawn(slot)
+
+            while not self.stopping and (self.children or self.restart_at):
+                self._reap()
+                now = time.monotonic()
+                for slot, restart_at in list(self.restart_at.items()):
+                    if now >= restart_at:
+                        del self.restart_at[slot]
+                        self._spawn(slot)
+                time.sleep(0.2)
+
+            if self.children:
+                self._drain()
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+        logger.info("判题监督进程退出")
+
+    def _handle_stop_signal(self, signum, frame):
+        if self.stopping:
+            # 再次收到信号时不再等待排空
+            self._kill_children(signal.SIGKILL)
+            return
+        self.stopping = True
+        self._kill_children(signal.SIGTERM)
+
+    def _kill_children(self, signum: int):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _drain(self):
+        """等待子进程判完手上的提交后退出"""
+        logger.info(f"等待 {len(self.children)} 个判题子进程排空（最长 {self.drain_timeout} 秒）")
+        deadline = time.monotonic() + self.drain_timeout
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.2)
+
+        if self.children:
+            logger.warning(f"{len(self.children)} 个判题子进程排空超时，强制结束")
+            self._kill_children(signal.SIGKILL)
+            while self.children:
+                self._reap(block=True)
+
+    def _reap(self, block: bool = False):
+        """回收已退出的子进程，并按退出原因安排重启"""
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+
+            slot = self.children.pop(pid, None)
+            if slot is None:
+                continue
+            self._on_child_exit(slot, pid, status)
+            if block:
+                return
+
+    def _on_child_exit(self, slot: int, pid: int, status: int):
+        exit_code = os.waitstatus_to_exitcode(status)
+        if self.stopping:
+            return
+
+        if exit_code == EXIT_RECYCLE:
+            logger.info(f"判题子进程 {pid} 达到提交数上限，重新启动")
+            self.restart_at[slot] = time.monotonic()
+            return
+
+        if exit_code == 0:
+            self.finished.add(slot)
+            return
+
+        # 异常退出: 刚启动就崩溃时指数退避，避免反复 fork
+        uptime = time.monotonic() - self.started_at.get(slot, 0)
+        if uptime < CRASH_WINDOW:
+            delay = min(max(1.0, self.restart_delay.get(slot, 0) * 2), MAX_RESTART_DELAY)
+        else:
+            delay = 0.0
+        self.restart_delay[slot] = delay
+        self.restart_at[slot] = time.monotonic() + delay
+        logger.error(f"判题子进程 {pid} 异常退出（{exit_code}），{delay:.0f} 秒后重启")
+
+    def _spawn(self, slot: int):
+        # 子进程不能与父进程共享数据库连接和未刷新的输出缓冲
+        connections.close_all()
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        pid = os.fork()
+        if pid:
+            self.children[pid] = slot
+            self.started_at[slot] = time.monotonic()
+            return
+
+        # 子进程不继承监督进程的信号处理和子进程表
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        self.children.clear()
+
+        exit_code = 1
+        try:
+            exit_code = self._run_child(slot)
+        except BaseException:
+            logger.exception("判题子进程出错")
+        finally:
+            try:
+                connections.close_all()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(exit_code)
+
+    def _run_child(self, slot: int) -> int:
+        # 子进程平分主机的运行准入额度，绑定 CPU 时按序号分到不同的判题 CPU
+        from .admission import set_admission_share
+        set_admission_share(self.processes, slot)
+
+        worker_id = f"{self.worker_id_prefix}-{slot}" if self.worker_id_prefix else None
+        worker = self.worker_class(worker_id=worker_id, max_submissions=self.max_submissions, **self.worker_options)
+
+        # SIGTERM 由监督进程转发；终端的 Ctrl+C 会同时发给子进程，忽略它，由监督进程统一处理
+        signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        worker.run()
+        return EXIT_RECYCLE if worker.recycled else 0
@@ -1,11 +1,30 @@
 import logging
-from typing import Dict
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Cast
 from django.utils import timezone
+from problems.models import Problem
+from submissions.models import Submission
 from .models import JudgeQueue, JudgeResult
 from .engine_factory import JudgeEngineFactory
+from .case_executor import get_judge_policy
+from .config_cache import get_judge_config
+from .judge_task import JudgeTask, LanguageConfig, TestCaseData
+from .notify import notify_queue
+from .scheduler import get_scheduler
 
 logger = logging.getLogger(__name__)
 
+User = get_user_model()
+
 
 def add_to_judge_queue(submission) -> JudgeQueue:
     """添加提交到判题队列"""
@@ -26,6 +45,9 @@ def add_to_judge_queue(submission) -> JudgeQueue:
         submission.status = 'pending'
         submission.save()
         
+        # 事务提交后立即唤醒空闲的判题进程
+        transaction.on_commit(notify_queue)
+        
         logger.info(f"提交 {submission.id} 已加入判题队列")
         return queue_item
         
@@ -38,99 +60,329 @@ def add_to_judge_queue(submission) -> JudgeQueue:
         raise
 
 
-def process_judge_queue():
-    """处理判题队列"""
-    try:
-        # 获取待处理的队列项
-        queue_items = JudgeQueue.objects.filter(
-            status='pending'
-        ).order_by('-priority', 'created_at')[:10]  # 每次处理10个
+def get_worker_id() -> str:
+    """当前判题进程的标识（主机名:进程号）"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def get_lease_duration() -> timedelta:
+    """队列项租约时长，判题期间由心跳线程不断延长"""
+    return timedelta(seconds=getattr(settings, 'JUDGE_QUEUE_LEASE_SECONDS', 60))
+
+
+def _claim_fields(worker_id: str) -> Dict:
+    """领取队列项时更新的字段"""
+    now = timezone.now()
+    return {
+        'status': 'processing',
+        'worker': worker_id,
+        'started_at': now,
+        'lease_expires_at': now + get_lease_duration(),
+        'attempts': F('attempts') + 1,
+    }
+
+
+def _try_claim(queue_id: int, worker_id: str) -> bool:
+    """
+    尝试领取指定的队列项
+    支持 SKIP LOCKED 的数据库（PostgreSQL）使用 SELECT ... FOR UPDATE SKIP LOCKED，多个判题进程互不阻塞；
+    其他数据库（SQLite）使用带 status='pending' 条件的 UPDATE 做比较并交换，更新成功才算领取到
+    """
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            locked = JudgeQueue.objects.select_for_update(skip_locked=True).filter(
+                id=queue_id, status='pending'
+            ).values_list('id', flat=True).first()
+            if locked is None:
+                return False
+            JudgeQueue.objects.filter(id=queue_id).update(**_claim_fields(worker_id))
+            return True
+    
+    return JudgeQueue.objects.filter(id=queue_id, status='pending').update(**_claim_fields(worker_id)) > 0
+
+
+def claim_next_queue_item(worker_id: str, scheduler=None) -> Optional[JudgeQueue]:
+    """
+    原子地领取一个待处理的队列项，并记录领取它的判题进程和租约到期时间
+    领取顺序由调度器决定（见 scheduler.py），候选项被其他进程抢先领取时依次尝试下一个
+    """
+    scheduler = scheduler or get_scheduler()
+    for queue_id in scheduler.candidates():
+        if _try_claim(queue_id, worker_id):
+            return JudgeQueue.objects.select_related('submission').get(id=queue_id)
+    return None
+
+
+def _avg_judge_time_expression(duration: int):
+    """题目判题耗时(ms)的指数移动平均，用于 UPDATE 语句"""
+    weight = 0.2
+    return Case(
+        When(avg_judge_time=0, then=Value(duration)),
+        default=Cast(F('avg_judge_time') * (1 - weight) + duration * weight, output_field=IntegerField()),
+    )
+
+
+def save_judge_result(queue_item: JudgeQueue, worker_id: str, result: Dict, judge_duration: int) -> bool:
+    """
+    在一个事务中写入判题结果
+    只写入变化的字段，题目和用户的计数器用 F() 表达式在数据库中累加，多个判题进程并发时不会丢失计数
+    返回: False 表示租约已失效，结果被丢弃
+    """
+    submission = queue_item.submission
+    accepted = 1 if result['status'] == 'accepted' else 0
+    error_message = result.get('error_message') or ''
+    test_results = result.get('test_results', [])
+    
+    with transaction.atomic():
+        # 只有仍持有租约时才写入结果（租约过期后队列项可能已被其他进程重新领取）
+        owned = JudgeQueue.objects.filter(
+            id=queue_item.id, worker=worker_id, status='processing'
+        ).update(status='completed', completed_at=timezone.now(), lease_expires_at=None)
+        if not owned:
+            return False
+        
+        # 更新判题结果
+        JudgeResult.objects.filter(submission_id=submission.id).update(
+            status=result['status'],
+            score=result['score'],
+            time_used=result.get('time_used'),
+            memory_used=result.get('memory_used'),
+            compile_time=result.get('compile_time'),
+            error_message=error_message,
+            test_results=test_results,
+            updated_at=timezone.now(),
+        )
+        
+        # 更新提交记录
+        submission.status = result['status']
+        submission.time_used = result.get('time_used')
+        submission.memory_used = result.get('memory_used')
+        submission.score = result['score']
+        submission.error_message = error_message
+        submission.test_results = test_results
+        submission.save(update_fields=[
+            'status', 'time_used', 'memory_used', 'score', 'error_message', 'test_results'
+        ])
         
-        if not queue_items.exists():
-            return 0
+        # 更新题目统计和历史判题耗时（供短任务优先调度使用）
+        Problem.objects.filter(id=submission.problem_id).update(
+            total_submissions=F('total_submissions') + 1,
+            accepted_submissions=F('accepted_submissions') + accepted,
+            avg_judge_time=_avg_judge_time_expression(judge_duration),
+        )
+        
+        # 更新用户统计
+        User.objects.filter(id=submission.user_id).update(
+            total_submissions=F('total_submissions') + 1,
+            accepted_submissions=F('accepted_submissions') + accepted,
+        )
+    
+    return True
+
+
+def extend_lease(queue_id: int, worker_id: str) -> bool:
+    """延长租约，返回 False 表示租约已失效（已被回收或重新领取）"""
+    return JudgeQueue.objects.filter(id=queue_id, worker=worker_id, status='processing').update(
+        lease_expires_at=timezone.now() + get_lease_duration()
+    ) > 0
+
+
+class LeaseHeartbeat:
+    """判题期间定期延长队列项租约的后台线程"""
+    
+    def __init__(self, queue_id: int, worker_id: str):
+        self.queue_id = queue_id
+        self.worker_id = worker_id
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'judge-heartbeat-{queue_id}', daemon=True)
+    
+    def __enter__(self):
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+    
+    def _run(self):
+        """
+        租约失效后停止心跳（判题结果在保存时因租约失效被丢弃，见 save_judge_result）；
+        数据库暂时不可用（连接断开、SQLite 被锁）时记录日志并关闭连接，下次心跳重新连接
+        """
+        interval = getattr(settings, 'JUDGE_QUEUE_HEARTBEAT_INTERVAL', 15)
+        try:
+            while not self._stop.wait(interval):
+                try:
+                    if not extend_lease(self.queue_id, self.worker_id):
+                        logger.warning(f"队列项 {self.queue_id} 的租约已失效")
+                        break
+                except Exception as e:
+                    logger.warning(f"队列项 {self.queue_id} 心跳失败: {str(e)}")
+                    connection.close()
+        finally:
+            # 线程结束时关闭该线程的数据库连接
+            connection.close()
+
+
+def recover_expired_leases() -> int:
+    """
+    回收租约过期的队列项（判题进程崩溃或被回收）
+    未超过 JUDGE_QUEUE_MAX_ATTEMPTS 次的重新放回队列，否则标记为失败
+    返回: 回收的队列项数量
+    """
+    now = timezone.now()
+    max_attempts = getattr(settings, 'JUDGE_QUEUE_MAX_ATTEMPTS', 3)
+    # 没有租约的 processing 队列项（升级前领取的）按开始时间判断
+    expired = JudgeQueue.objects.filter(status='processing').filter(
+        Q(lease_expires_at__lt=now) |
+        Q(lease_expires_at__isnull=True, started_at__lt=now - get_lease_duration())
+    )
+    
+    recovered = 0
+    for queue_id, submission_id, attempts in expired.values_list('id', 'submission_id', 'attempts'):
+        still_expired = expired.filter(id=queue_id)
+        if attempts < max_attempts:
+            if still_expired.update(status='pending', worker='', started_at=None, lease_expires_at=None):
+                Submission.objects.filter(id=submission_id, status='judging').update(status='pending')
+                logger.warning(f"提交 {submission_id} 的判题租约已过期，重新加入队列（第 {attempts} 次）")
+                recovered += 1
+            continue
+        
+        error_message = f"判题进程多次中断（{attempts} 次），已放弃判题"
+        if still_expired.update(status='failed', error_message=error_message,
+                                completed_at=now, lease_expires_at=None):
+            Submission.objects.filter(id=submission_id).update(
+                status='system_error', error_message=error_message
+            )
+            JudgeResult.objects.filter(submission_id=submission_id).update(
+                status='system_error', error_message=error_message
+            )
+            logger.error(f"提交 {submission_id} {error_message}")
+            recovered += 1
+    
+    return recovered
+
+
+def build_test_cases(problem) -> List[TestCaseData]:
+    """读取题目的测试用例（不含样例）"""
+    return [
+        TestCaseData(
+            id=test_case.id,
+            input_hash=test_case.input_hash,
+            output_hash=test_case.output_hash,
+            input_preview=test_case.get_input_preview(),
+            output_preview=test_case.get_output_preview(),
+        )
+        for test_case in problem.test_cases.filter(is_sample=False)
+    ]
+
+
+def build_judge_task(submission) -> JudgeTask:
+    """从提交构建判题任务: 读取题目、测试用例、判题策略和语言配置，之后判题不再访问数据库"""
+    problem = submission.problem
+    config = get_judge_config(submission.language)
+    return JudgeTask(
+        code=submission.code,
+        language=submission.language,
+        time_limit=problem.time_limit,
+        memory_limit=problem.memory_limit,
+        output_limit=problem.output_limit,
+        test_cases=build_test_cases(problem),
+        policy=get_judge_policy(submission),
+        config=LanguageConfig.from_model(config) if config is not None else None,
+        submission_id=submission.id,
+    )
+
+
+def judge_submission(judge_engine, submission) -> Dict:
+    """用指定引擎判题，返回结果字典（Docker 引擎不支持 JudgeTask，直接传入提交）"""
+    if hasattr(judge_engine, 'judge_task'):
+        return judge_engine.judge_task(build_judge_task(submission)).to_dict()
+    return judge_engine.judge_submission(submission)
+
+
+def start_judging(queue_item):
+    """将已领取的队列项对应的提交标记为判题中，返回提交"""
+    submission = queue_item.submission
+    submission.status = 'judging'
+    submission.save(update_fields=['status'])
+    return submission
+
+
+def fail_queue_item(queue_item: JudgeQueue, worker_id: str, error: Exception) -> bool:
+    """
+    判题出错: 队列项标记为失败，提交和判题结果标记为系统错误
+    返回: False 表示租约已失效（队列项可能已被其他进程重新领取），不做任何修改
+    """
+    with transaction.atomic():
+        # 与 save_judge_result 相同，只有仍持有租约时才标记失败
+        owned = JudgeQueue.objects.filter(
+            id=queue_item.id, worker=worker_id, status='processing'
+        ).update(status='failed', error_message=str(error), completed_at=timezone.now(), lease_expires_at=None)
+        if not owned:
+            return False
+        
+        # 与回收过期租约相同，用定向的 update 写入，不保存可能已过时的 submission 对象
+        Submission.objects.filter(id=queue_item.submission_id).update(
+            status='system_error',
+            error_message=f"判题失败: {str(error)}",
+        )
+        
+        # 更新判题结果
+        JudgeResult.objects.filter(submission_id=queue_item.submission_id).update(
+            status='system_error',
+            error_message=f"判题失败: {str(error)}",
+            updated_at=timezone.now(),
+        )
+    return True
+
+
+def process_judge_queue(worker_id: Optional[str] = None, max_items: int = 10,
+                        should_stop: Optional[Callable[[], bool]] = None):
+    """
+    处理判题队列
+    每次领取一个队列项，判完再领取下一个（最多 max_items 个），避免一个进程囤积多个提交，
+    可以在多台主机上同时运行多个判题进程
+    should_stop: 每次领取前调用，返回 True 时不再领取新的队列项（用于停止前排空正在判的提交）
+    """
+    worker_id = worker_id or get_worker_id()
+    try:
+        recover_expired_leases()
         
         processed_count = 0
-        judge_engine = JudgeEngineFactory.create_engine()
+        judge_engine = None
+        scheduler = get_scheduler()
         
-        for queue_item in queue_items:
+        for _ in range(max_items):
+            if should_stop is not None and should_stop():
+                break
+            queue_item = claim_next_queue_item(worker_id, scheduler)
+            if queue_item is None:
+                break
+            
+            if judge_engine is None:
+                judge_engine = JudgeEngineFactory.create_engine()
+            
             try:
-                # 更新队列状态
-                queue_item.status = 'processing'
-                queue_item.started_at = timezone.now()
-                queue_item.save()
-                
-                # 更新提交状态
-                submission = queue_item.submission
-                submission.status = 'judging'
-                submission.save()
-                
-                # 执行判题
-                result = judge_engine.judge_submission(submission)
+                submission = start_judging(queue_item)
                 
-                # 更新判题结果
-                judge_result = JudgeResult.objects.get(submission=submission)
-                judge_result.status = result['status']
-                judge_result.score = result['score']
-                judge_result.time_used = result.get('time_used')
-                judge_result.memory_used = result.get('memory_used')
-                judge_result.error_message = result.get('error_message') or ''
-                judge_result.test_results = result.get('test_results', [])
-                judge_result.save()
+                # 执行判题（期间心跳线程定期延长租约）
+                judge_start = time.monotonic()
+                with LeaseHeartbeat(queue_item.id, worker_id):
+                    result = judge_submission(judge_engine, submission)
+                judge_duration = int((time.monotonic() - judge_start) * 1000)
                 
-                # 更新提交记录
-                submission.status = result['status']
-                submission.time_used = result.get('time_used')
-                submission.memory_used = result.get('memory_used')
-                submission.score = result['score']
-                submission.error_message = result.get('error_message') or ''
-                submission.test_results = result.get('test_results', [])
-                submission.save()
-                
-                # 更新题目统计
-                problem = submission.problem
-                problem.total_submissions += 1
-                if result['status'] == 'accepted':
-                    problem.accepted_submissions += 1
-                problem.save()
-                
-                # 更新用户统计
-                user = submission.user
-                user.total_submissions += 1
-                if result['status'] == 'accepted':
-                    user.accepted_submissions += 1
-                user.save()
-                
-                # 更新队列状态
-                queue_item.status = 'completed'
-                queue_item.completed_at = timezone.now()
-                queue_item.save()
+                if not save_judge_result(queue_item, worker_id, result, judge_duration):
+                    logger.warning(f"提交 {submission.id} 的租约已失效，丢弃本次判题结果")
+                    continue
                 
                 processed_count += 1
                 logger.info(f"提交 {submission.id} 判题完成，状态: {result['status']}")
                 
             except Exception as e:
                 logger.error(f"处理提交 {queue_item.submission.id} 失败: {str(e)}")
-                
-                # 更新状态为失败
-                queue_item.status = 'failed'
-                queue_item.error_message = str(e)
-                queue_item.completed_at = timezone.now()
-                queue_item.save()
-                
-                # 更新提交状态
-                submission = queue_item.submission
-                submission.status = 'system_error'
-                submission.error_message = f"判题失败: {str(e)}"
-                submission.save()
-                
-                # 更新判题结果
-                try:
-                    judge_result = JudgeResult.objects.get(submission=submission)
-                    judge_result.status = 'system_error'
-                    judge_result.error_message = f"判题失败: {str(e)}"
-                    judge_result.save()
-                except JudgeResult.DoesNotExist:
-                    pass
+                if not fail_queue_item(queue_item, worker_id, e):
+                    logger.warning(f"提交 {queue_item.submission.id} 的租约已失效，不标记为失败")
         
         return processed_count
         
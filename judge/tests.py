@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+from django.test import SimpleTestCase
+from .sandbox_engine import SandboxEngine
+
+
+class SandboxMemoryLimitTests(SimpleTestCase):
+    """沙箱引擎的内存超限判定"""
+
+    def run_python(self, code: str, memory_limit: int = 64):
+        return SandboxEngine().run_secure_process([sys.executable, '-c', code], '', 2000, memory_limit)
+
+    def test_peak_memory_over_limit(self):
+        # 峰值内存超过限制（在地址空间余量之内）
+        result = self.run_python('data = bytearray(96 * 1024 * 1024)')
+        self.assertEqual(result['status'], 'memory_limit_exceeded')
+
+    def test_allocation_beyond_address_space(self):
+        # 分配超出地址空间限制，程序以 MemoryError 退出
+        result = self.run_python('data = bytearray(1024 * 1024 * 1024)')
+        self.assertEqual(result['status'], 'memory_limit_exceeded')
+
+    def test_within_limit(self):
+        result = self.run_python('data = bytearray(16 * 1024 * 1024)')
+        self.assertEqual(result['status'], 'accepted')
+
+
+class SandboxOutputLimitTests(SimpleTestCase):
+    """输出限制大于默认文件大小限制时的判定"""
+
+    def run_python(self, code: str, output_limit: int):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_file = os.path.join(temp_dir, 'input')
+            open(input_file, 'wb').close()
+            return SandboxEngine().run_limited_process(
+                [sys.executable, '-c', code], None, 5000, 256, output_limit,
+                input_file, os.path.join(temp_dir, 'output')
+            )
+
+    def test_output_above_default_file_size_limit(self):
+        code = 'import sys\nsys.stdout.buffer.write(b"x" * (120 * 1024 * 1024))'
+        self.assertEqual(self.run_python(code, 150)['status'], 'accepted')
+        self.assertEqual(self.run_python(code, 110)['status'], 'output_limit_exceeded')
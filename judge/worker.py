@@ -0,0 +1,92 @@
+"""
+判题工作进程主循环 - 由 judge_worker 命令直接运行，或由 supervisor.JudgeSupervisor 在子进程中运行
+"""
+import logging
+from typing import Optional
+from .notify import QueueListener
+from .tasks import get_worker_id, process_judge_queue
+
+logger = logging.getLogger(__name__)
+
+
+class JudgeWorker:
+    """领取并判题，空闲时等待入队通知"""
+
+    def __init__(self, worker_id: Optional[str] = None, interval: float = 2, max_interval: float = 30,
+                 max_iterations: Optional[int] = None, max_submissions: Optional[int] = None, stdout=None):
+        self.worker_id = worker_id or get_worker_id()
+        self.interval = interval
+        self.max_interval = max(interval, max_interval)
+        self.max_iterations = max_iterations
+        # 处理了这么多提交后退出，由监督进程重新启动（回收内存）
+        self.max_submissions = max_submissions
+        self.stdout = stdout
+        self.total_processed = 0
+        self.stopping = False
+        self.listener: Optional[QueueListener] = None
+
+    @property
+    def recycled(self) -> bool:
+        """是否因达到 max_submissions 而退出"""
+        return bool(self.max_submissions) and self.total_processed >= self.max_submissions
+
+    def stop(self):
+        """
+        请求停止: 正在判的提交判完后退出，不再领取新的提交
+        可在信号处理函数中调用
+        """
+        self.stopping = True
+        if self.listener is not None:
+            self.listener.interrupt()
+
+    def _should_stop(self) -> bool:
+        return self.stopping or self.recycled
+
+    def run(self) -> int:
+        """运行主循环，返回处理的提交总数"""
+        # 新提交入队时通过 LISTEN/NOTIFY 或本机套接字唤醒，轮询只作为兜底
+        self.listener = QueueListener(self.worker_id)
+        self._write(
+            f'判题工作进程 {self.worker_id} 启动，唤醒方式: {self.listener.mode}，'
+            f'轮询间隔: {self.interval}~{self.max_interval}秒'
+        )
+
+        iteration = 0
+        wait_interval = self.interval
+
+        try:
+            while not self._should_stop():
+                if self.max_iterations and iteration >= self.max_iterations:
+                    break
+
+                # 处理判题队列（设置了 max_submissions 时最多再领取剩余数量）
+                max_items = 10
+                if self.max_submissions:
+                    max_items = min(max_items, self.max_submissions - self.total_processed)
+                processed = process_judge_queue(self.worker_id, max_items, should_stop=self._should_stop)
+                self.total_processed += processed
+
+                if processed > 0:
+                    self._write(f'处理了 {processed} 个提交，总计: {self.total_processed}')
+
+                iteration += 1
+                if processed > 0:
+                    # 队列中可能还有待判题的提交，立即继续
+                    wait_interval = self.interval
+                    continue
+
+                # 等待入队通知；超时说明队列空闲，延长下一次轮询间隔
+                if self.listener.wait(wait_interval):
+                    wait_interval = self.interval
+                else:
+                    wait_interval = min(wait_interval * 2, self.max_interval)
+        finally:
+            self.listener.close()
+
+        return self.total_processed
+
+    def _write(self, message: str):
+        if self.stdout is not None:
+            self.stdout.write(message)
+        else:
+            logger.info(message)
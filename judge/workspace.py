@@ -0,0 +1,284 @@
+"""
+判题工作区池 - 在 tmpfs 上预先创建工作区，提交判完后清空并复用，判题过程不产生磁盘 I/O
+
+每个提交使用一个工作区:
+    <workspace>/code   源代码和编译产物
+    <workspace>/data   解压的测试数据和用户输出
+
+每个判题进程在 <JUDGE_WORKSPACE_ROOT>/worker-<主机名>-<pid> 下保留 JUDGE_WORKSPACE_POOL_SIZE 个工作区，
+同时判题的提交更多时临时创建，归还后超出的部分删除。进程退出时删除自己的工作区，
+启动时清理本机已退出的判题进程遗留的工作区。多个容器共享同一个根目录时（如挂载同一个 judge_temp），
+各容器的进程号会重复，目录名中的主机名使它们互不冲突，也不会清理其他主机的工作区。
+
+大小限制（JUDGE_WORKSPACE_QUOTA）: 以 root 运行时每个工作区挂载为独立的 tmpfs（size=限制），由内核保证；
+无法挂载时在编译后检查工作区的大小，超出限制按编译错误处理。
+工作区根目录默认在 JUDGE_DIR 下；显式配置为 tmpfs（如 /dev/shm）且不挂载时，该 tmpfs 必须不小于
+JUDGE_WORKSPACE_QUOTA，否则写满后正确的程序也会因 ENOSPC 得到错误的结果，见 check_workspace_root。
+"""
+import atexit
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import threading
+from typing import List, Optional
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CODE_DIR = 'code'
+DATA_DIR = 'data'
+PROCESS_DIR_PREFIX = 'worker-'
+
+
+def get_process_dir_name(pid: Optional[int] = None) -> str:
+    """判题进程的工作区目录名: worker-<主机名>-<pid>（与 get_worker_id 一样用主机名区分容器）"""
+    return f'{PROCESS_DIR_PREFIX}{_get_host_name()}-{pid or os.getpid()}'
+
+
+def _get_host_name() -> str:
+    return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in socket.gethostname())
+
+
+def get_filesystem_type(path: str) -> Optional[str]:
+    """path 所在文件系统的类型（读取 /proc/mounts，非 Linux 返回 None）"""
+    path = os.path.realpath(path)
+    best, fs_type = '', None
+    try:
+        with open('/proc/mounts') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1].replace('\\040', ' ')
+                if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) and \
+                        len(mount_point) >= len(best):
+                    best, fs_type = mount_point, fields[2]
+    except OSError:
+        return None
+    return fs_type
+
+
+def _mount_tmpfs(path: str, size: int) -> bool:
+    try:
+        result = subprocess.run(
+            ['mount', '-t', 'tmpfs', '-o', f'size={size},mode=0755,nosuid,nodev', 'tmpfs', path],
+            capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0
+
+
+def _unmount(path: str):
+    try:
+        subprocess.run(['umount', '-l', path], capture_output=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        pass
+
+
+def _remove_tree(path: str):
+    """删除目录，其中挂载的 tmpfs 先卸载"""
+    if not os.path.isdir(path):
+        return
+    for dirpath, dirnames, _ in os.walk(path, topdown=False):
+        for name in dirnames:
+            child = os.path.join(dirpath, name)
+            if os.path.ismount(child):
+                _unmount(child)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+class Workspace:
+    """一个判题工作区"""
+
+    def __init__(self, path: str, quota: int, mounted: bool):
+        """quota: 大小限制(字节)，mounted: 是否为独立挂载的 tmpfs"""
+        self.path = path
+        self.quota = quota
+        self.mounted = mounted
+        self.code_dir = os.path.join(path, CODE_DIR)
+        self.data_dir = os.path.join(path, DATA_DIR)
+
+    def usage(self) -> int:
+        """已使用的大小(字节)"""
+        total = 0
+        for dirpath, _, filenames in os.walk(self.path):
+            for name in filenames:
+                try:
+                    total += os.lstat(os.path.join(dirpath, name)).st_blocks * 512
+                except OSError:
+                    pass
+        return total
+
+    def within_quota(self) -> bool:
+        """是否未超出大小限制（独立挂载的 tmpfs 由内核限制，无需检查）"""
+        return self.mounted or not self.quota or self.usage() <= self.quota
+
+    def scrub(self) -> bool:
+        """清空工作区，返回是否成功"""
+        try:
+            for directory in (self.code_dir, self.data_dir):
+                for entry in os.scandir(directory):
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path)
+                    else:
+                        os.remove(entry.path)
+            return True
+        except OSError as e:
+            logger.warning(f"清空工作区 {self.path} 失败: {str(e)}")
+            return False
+
+
+class WorkspacePool:
+    """当前判题进程的工作区池"""
+
+    def __init__(self, root: Optional[str] = None, size: Optional[int] = None, quota: Optional[int] = None):
+        """
+        root: 工作区根目录（应位于 tmpfs），size: 保留的工作区数量，quota: 每个工作区的大小限制(MB)
+        """
+        self.root = str(root or get_workspace_root())
+        self.size = size if size is not None else getattr(settings, 'JUDGE_WORKSPACE_POOL_SIZE', 2)
+        if quota is None:
+            quota = getattr(settings, 'JUDGE_WORKSPACE_QUOTA', 512)
+        self.quota = quota * 1024 * 1024
+        self.mount = _should_mount()
+        self.process_dir = os.path.join(self.root, get_process_dir_name())
+        self.free: List[Workspace] = []
+        self.lock = threading.Lock()
+        self.counter = 0
+
+        check_workspace_root(self.root, self.quota, self.mount)
+        self.remove_stale()
+        _remove_tree(self.process_dir)
+        os.makedirs(self.process_dir)
+        for _ in range(self.size):
+            self.free.append(self._create())
+
+    def _create(self) -> Workspace:
+        with self.lock:
+            self.counter += 1
+            path = os.path.join(self.process_dir, str(self.counter))
+        os.makedirs(path)
+        mounted = False
+        if self.mount and self.quota:
+            mounted = _mount_tmpfs(path, self.quota)
+            if not mounted:
+                # 没有挂载权限，之后改为检查大小
+                logger.warning("无法为判题工作区挂载 tmpfs，改为在编译后检查工作区大小")
+                self.mount = False
+        os.makedirs(os.path.join(path, CODE_DIR))
+        os.makedirs(os.path.join(path, DATA_DIR))
+        return Workspace(path, self.quota, mounted)
+
+    def _destroy(self, workspace: Workspace):
+        if workspace.mounted:
+            _unmount(workspace.path)
+        shutil.rmtree(workspace.path, ignore_errors=True)
+
+    def acquire(self) -> Workspace:
+        """取得一个空的工作区，没有空闲的工作区时新建"""
+        with self.lock:
+            if self.free:
+                return self.free.pop()
+        return self._create()
+
+    def release(self, workspace: Workspace):
+        """归还工作区: 清空后放回池中，池已满或清空失败时删除"""
+        if workspace.scrub():
+            with self.lock:
+                if len(self.free) < self.size:
+                    self.free.append(workspace)
+                    return
+        self._destroy(workspace)
+
+    def close(self):
+        """删除当前进程的全部工作区"""
+        with self.lock:
+            free, self.free = self.free, []
+        for workspace in free:
+            self._destroy(workspace)
+        _remove_tree(self.process_dir)
+
+    def remove_stale(self):
+        """删除本机已退出的判题进程遗留的工作区（其他主机的进程号在本机无法检查，不清理）"""
+        host_name = _get_host_name()
+        for name in os.listdir(self.root):
+            if not name.startswith(PROCESS_DIR_PREFIX):
+                continue
+            host, _, pid = name[len(PROCESS_DIR_PREFIX):].rpartition('-')
+            if host != host_name or not pid.isdigit():
+                continue
+            if int(pid) == os.getpid() or _process_exists(int(pid)):
+                continue
+            _remove_tree(os.path.join(self.root, name))
+
+
+def _process_exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _should_mount() -> bool:
+    """JUDGE_WORKSPACE_MOUNT: auto（以 root 运行时挂载）、true、false"""
+    mode = str(getattr(settings, 'JUDGE_WORKSPACE_MOUNT', 'auto')).lower()
+    if mode == 'auto':
+        return hasattr(os, 'geteuid') and os.geteuid() == 0
+    return mode == 'true'
+
+
+def check_workspace_root(root: Optional[str] = None, quota: Optional[int] = None,
+                         mount: Optional[bool] = None):
+    """
+    创建并检查工作区根目录（quota 单位为字节，默认读取配置）
+    根目录在 tmpfs 上、工作区不单独挂载且 tmpfs 小于 quota 时抛出 RuntimeError
+    """
+    root = str(root or get_workspace_root())
+    if quota is None:
+        quota = getattr(settings, 'JUDGE_WORKSPACE_QUOTA', 512) * 1024 * 1024
+    if mount is None:
+        mount = _should_mount()
+    os.makedirs(root, exist_ok=True)
+    fs_type = get_filesystem_type(root)
+    if fs_type == 'tmpfs' and not mount and quota:
+        stat = os.statvfs(root)
+        size = stat.f_blocks * stat.f_frsize
+        if size < quota:
+            raise RuntimeError(
+                f"判题工作区目录 {root} 所在的 tmpfs 只有 {size // (1024 * 1024)}MB，"
+                f"小于 JUDGE_WORKSPACE_QUOTA（{quota // (1024 * 1024)}MB），"
+                f"请增大 tmpfs（容器中配置 shm_size）或把 JUDGE_WORKSPACE_ROOT 设为磁盘目录"
+            )
+    elif fs_type not in (None, 'tmpfs') and not mount:
+        logger.info(f"判题工作区目录 {root} 不在 tmpfs 上，判题过程会读写磁盘")
+
+
+def get_workspace_root() -> str:
+    judge_dir = getattr(settings, 'JUDGE_DIR', '/tmp/judge')
+    return str(getattr(settings, 'JUDGE_WORKSPACE_ROOT', '') or os.path.join(judge_dir, 'workspaces'))
+
+
+_pool: Optional[WorkspacePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_workspace_pool() -> WorkspacePool:
+    """当前进程的工作区池（fork 出的子进程使用自己的池）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.process_dir != os.path.join(_pool.root, get_process_dir_name()):
+            _pool = WorkspacePool()
+        return _pool
+
+
+@atexit.register
+def close_workspace_pool():
+    with _pool_lock:
+        if _pool is not None and os.path.basename(_pool.process_dir) == get_process_dir_name():
+            _pool.close()
@@ -0,0 +1,249 @@
+"""
+Python 预热运行器（zygote）- 省去每个测试用例的解释器启动和模块导入时间
+
+JudgeConfig.warm_runner 开启时，判题进程用该语言的运行命令启动一个常驻的 zygote_server.py，
+之后每个测试用例由 zygote fork 出子进程运行用户代码，资源限制在 fork 之后、执行用户代码之前设置。
+每个判题进程按运行命令各保留一个 zygote，进程退出时关闭；zygote 异常退出后下次使用时重新启动。
+
+通信使用 SOCK_SEQPACKET 套接字: 判题进程发送一条 JSON 请求，并通过 SCM_RIGHTS 传递
+标准输入、标准输出、标准错误和结果管道四个文件描述符；运行器在用户程序结束后向结果管道写入
+退出状态和 rusage（JSON）。请求之间互不依赖，可以并发运行多个测试用例。
+"""
+import atexit
+import json
+import logging
+import math
+import os
+import resource
+import select
+import signal
+import socket
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from .affinity import get_run_cpus
+from .runner import get_output_limit_bytes, get_result_status, get_wall_time_limit, _read_stream
+
+logger = logging.getLogger(__name__)
+
+ZYGOTE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zygote_server.py')
+START_TIMEOUT = 10  # 秒
+# 运行器在墙钟超时后会杀死用户程序，结果超过这么多秒仍未返回说明 zygote 出现异常
+RESULT_GRACE = 5
+
+
+class ZygoteError(RuntimeError):
+    """zygote 启动失败或运行异常"""
+
+
+class Zygote:
+    """一个常驻的 zygote 进程"""
+
+    def __init__(self, command: List[str], cwd: str):
+        parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            self.process = subprocess.Popen(
+                command,
+                cwd=cwd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                pass_fds=(child_sock.fileno(),),
+                env=dict(os.environ, JUDGE_ZYGOTE_FD=str(child_sock.fileno())),
+                start_new_session=True
+            )
+        except OSError as e:
+            parent_sock.close()
+            raise ZygoteError(f'启动 zygote 失败: {str(e)}')
+        finally:
+            child_sock.close()
+
+        self.sock = parent_sock
+        self.lock = threading.Lock()
+        try:
+            self.sock.settimeout(START_TIMEOUT)
+            ready = self.sock.recv(16)
+            self.sock.settimeout(None)
+        except OSError as e:
+            self.close()
+            raise ZygoteError(f'zygote 未就绪: {str(e)}')
+        if ready != b'ready':
+            self.close()
+            raise ZygoteError('zygote 启动失败')
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def submit(self, request: Dict, fds: List[int]):
+        """发送运行请求"""
+        try:
+            with self.lock:
+                socket.send_fds(self.sock, [json.dumps(request).encode('utf-8')], fds)
+        except OSError as e:
+            raise ZygoteError(f'发送请求失败: {str(e)}')
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+_zygotes: Dict[Tuple[str, ...], Zygote] = {}
+_zygotes_lock = threading.Lock()
+
+
+def get_zygote(command: List[str], cwd: str) -> Optional[Zygote]:
+    """获取（必要时启动）指定运行命令的 zygote，启动失败时返回 None"""
+    key = tuple(command)
+    with _zygotes_lock:
+        zygote = _zygotes.get(key)
+        if zygote is not None:
+            if zygote.alive():
+                return zygote
+            zygote.close()
+            del _zygotes[key]
+
+        try:
+            zygote = Zygote(command, cwd)
+        except ZygoteError as e:
+            logger.warning(f"预热运行器不可用，使用普通方式运行: {str(e)}")
+            return None
+        _zygotes[key] = zygote
+        return zygote
+
+
+def discard_zygote(zygote: Zygote):
+    """关闭出现异常的 zygote，下次使用时重新启动"""
+    with _zygotes_lock:
+        for key, value in list(_zygotes.items()):
+            if value is zygote:
+                del _zygotes[key]
+    zygote.close()
+
+
+@atexit.register
+def close_zygotes():
+    with _zygotes_lock:
+        for zygote in _zygotes.values():
+            zygote.close()
+        _zygotes.clear()
+
+
+class WarmProgram:
+    """在 zygote 中运行的用户程序"""
+
+    def __init__(self, zygote: Zygote, code_file: str):
+        self.zygote = zygote
+        self.code_file = code_file
+
+    def run(self, cwd: str, time_limit: int, memory_limit: int, output_limit: Optional[int],
+            input_file: str, output_file: str, rlimits: List[Tuple[int, int, int]], cgroup=None) -> Dict:
+        """
+        运行一次，参数和返回值与 runner.run_process 相同（只支持文件作为标准输入/输出）
+        rlimits: 在用户程序进程中设置的资源限制 [(resource.RLIMIT_*, soft, hard), ...]
+        zygote 异常时抛出 ZygoteError 并关闭该 zygote
+        """
+        wall_time_limit = get_wall_time_limit(time_limit)
+        output_limit_bytes = get_output_limit_bytes(output_limit)
+        stderr_limit = getattr(settings, 'JUDGE_STDERR_LIMIT', 64 * 1024)
+
+        # 与 run_process 相同: CPU 时间硬限制兜底，标准输出文件最多比输出限制多一个字节（用于判定超限）
+        cpu_seconds = max(1, math.ceil(time_limit / 1000.0))
+        limits = [(resource.RLIMIT_CPU, cpu_seconds + 1, cpu_seconds + 2)] + list(rlimits)
+        fsize = min([output_limit_bytes + 1] + [soft for res, soft, _ in limits if res == resource.RLIMIT_FSIZE])
+        limits = [limit for limit in limits if limit[0] != resource.RLIMIT_FSIZE]
+        limits.append((resource.RLIMIT_FSIZE, fsize, max(fsize, output_limit_bytes + 1)))
+
+        request = {
+            'code': self.code_file,
+            'cwd': cwd,
+            'rlimits': [list(limit) for limit in limits],
+            'wall_time': wall_time_limit / 1000.0,
+            'cgroup_procs': cgroup.procs_path if cgroup is not None else None,
+            'cpus': get_run_cpus(),
+        }
+
+        stderr_read, stderr_write = os.pipe()
+        result_read, result_write = os.pipe()
+        start_time = time.monotonic()
+        try:
+            with open(input_file, 'rb') as stdin, open(output_file, 'wb') as stdout:
+                self.zygote.submit(request, [stdin.fileno(), stdout.fileno(), stderr_write, result_write])
+        except Exception:
+            os.close(stderr_read)
+            os.close(result_read)
+            raise
+        finally:
+            os.close(stderr_write)
+            os.close(result_write)
+
+        stderr_chunks: List[bytes] = []
+        stderr_thread = threading.Thread(
+            target=_read_stream,
+            args=(os.fdopen(stderr_read, 'rb'), stderr_chunks, stderr_limit),
+            daemon=True
+        )
+        stderr_thread.start()
+
+        try:
+            data = self._read_result(result_read, wall_time_limit / 1000.0 + RESULT_GRACE)
+        finally:
+            os.close(result_read)
+        if cgroup is not None:
+            cgroup.kill()
+        stderr_thread.join(timeout=1)
+
+        try:
+            result = json.loads(data)
+        except ValueError:
+            discard_zygote(self.zygote)
+            raise ZygoteError('zygote 未返回运行结果')
+
+        wall_time = int((time.monotonic() - start_time) * 1000)
+        returncode = os.waitstatus_to_exitcode(result['status'])
+        cpu_time = int((result['utime'] + result['stime']) * 1000)
+        memory_used = result['maxrss']
+        oom_killed = False
+        if cgroup is not None:
+            usage = cgroup.usage()
+            cpu_time = usage['cpu_time']
+            oom_killed = usage['oom_killed']
+
+        # 被 SIGXFSZ 终止或超过限制即视为输出超限（恰好等于限制不算超限，与 run_process 一致）
+        output_exceeded = (returncode == -signal.SIGXFSZ or
+                           os.path.getsize(output_file) > output_limit_bytes)
+        status = get_result_status(output_exceeded, result['timed_out'], cpu_time, time_limit,
+                                   memory_used, memory_limit, returncode, oom_killed)
+
+        return {
+            'stdout': b'',
+            'stderr': b''.join(stderr_chunks),
+            'time_used': cpu_time,
+            'wall_time': wall_time,
+            'memory_used': memory_used,
+            'returncode': returncode,
+            'status': status,
+        }
+
+    def _read_result(self, fd: int, timeout: float) -> bytes:
+        """读取运行器写入结果管道的内容，直到运行器退出（管道关闭）"""
+        chunks = []
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                discard_zygote(self.zygote)
+                raise ZygoteError('等待运行结果超时')
+            readable, _, _ = select.select([fd], [], [], remaining)
+            if not readable:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
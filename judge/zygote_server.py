@@ -0,0 +1,169 @@
+"""
+Python 预热运行器（zygote）服务端 - 由判题进程用 Python 语言配置的运行命令启动（见 zygote.py）
+
+启动时预先导入常用的标准库模块，之后对每个运行请求:
+    zygote --fork--> 运行器 --fork--> 用户程序
+运行器在子进程中设置资源限制、加入 cgroup、绑定 CPU、重定向标准输入/输出后用 runpy 执行用户代码，
+然后用 wait4 等待用户程序结束并把退出状态和 rusage 写回判题进程。zygote 本身从不执行用户代码。
+
+本文件由用户程序所用的解释器直接执行，不能依赖 Django 和项目中的其他模块。
+"""
+import json
+import os
+import resource
+import signal
+import socket
+import sys
+
+PRELOAD_MODULES = (
+    'array', 'bisect', 'collections', 'copy', 'dataclasses', 'datetime', 'decimal', 'enum',
+    'fractions', 'functools', 'heapq', 'io', 'itertools', 'math', 'operator', 'queue',
+    'random', 're', 'runpy', 'statistics', 'string', 'time', 'traceback', 'typing',
+)
+
+MAX_REQUEST_SIZE = 65536
+FD_COUNT = 4  # 标准输入、标准输出、标准错误、结果管道
+
+
+def preload():
+    for name in PRELOAD_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+
+def run_user_code(request, stdin_fd, stdout_fd, stderr_fd):
+    """在用户程序进程中执行，不返回"""
+    exit_code = 1
+    try:
+        if request.get('cgroup_procs'):
+            with open(request['cgroup_procs'], 'w') as f:
+                f.write(str(os.getpid()))
+        if request.get('cpus'):
+            os.sched_setaffinity(0, request['cpus'])
+        os.setsid()
+        os.dup2(stdin_fd, 0)
+        os.dup2(stdout_fd, 1)
+        os.dup2(stderr_fd, 2)
+        os.closerange(3, resource.getrlimit(resource.RLIMIT_NOFILE)[0])
+        for res, soft, hard in request['rlimits']:
+            resource.setrlimit(res, (soft, hard))
+        os.chdir(request['cwd'])
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+        # 预先导入的 random 在 zygote 中已经播种，每次运行重新播种
+        import random
+        random.seed()
+
+        import runpy
+        code_file = request['code']
+        sys.argv = [code_file]
+        sys.path[0] = os.path.dirname(code_file)
+        try:
+            runpy.run_path(code_file, run_name='__main__')
+            exit_code = 0
+        except SystemExit as e:
+            # 与解释器处理 SystemExit 的方式一致
+            if e.code is None:
+                exit_code = 0
+            elif isinstance(e.code, int):
+                exit_code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                exit_code = 1
+        except BaseException as e:
+            # 与解释器直接运行时一样，回溯从用户代码开始
+            import traceback
+            tb = e.__traceback__
+            while tb is not None and tb.tb_frame.f_code.co_filename != code_file:
+                tb = tb.tb_next
+            traceback.print_exception(type(e), e, tb or e.__traceback__)
+            exit_code = 1
+
+        try:
+            sys.stdout.flush()
+        except BaseException:
+            exit_code = 120
+        try:
+            sys.stderr.flush()
+        except BaseException:
+            pass
+    finally:
+        os._exit(exit_code)
+
+
+def run_request(request, fds):
+    """在运行器进程中执行: 启动用户程序，等待它结束并回传结果，不返回"""
+    stdin_fd, stdout_fd, stderr_fd, result_fd = fds
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        pid = os.fork()
+        if pid == 0:
+            os.close(result_fd)
+            run_user_code(request, stdin_fd, stdout_fd, stderr_fd)
+
+        for fd in (stdin_fd, stdout_fd, stderr_fd):
+            os.close(fd)
+
+        # 墙钟超时后杀死用户程序所在的进程组
+        timed_out = []
+
+        def on_alarm(signum, frame):
+            timed_out.append(True)
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+        signal.signal(signal.SIGALRM, on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, request['wall_time'])
+        _, status, rusage = os.wait4(pid, 0)
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+        result = {
+            'status': status,
+            'utime': rusage.ru_utime,
+            'stime': rusage.ru_stime,
+            'maxrss': rusage.ru_maxrss,
+            'timed_out': bool(timed_out),
+        }
+        os.write(result_fd, json.dumps(result).encode('utf-8'))
+    finally:
+        os._exit(0)
+
+
+def main():
+    sock = socket.socket(fileno=int(os.environ['JUDGE_ZYGOTE_FD']))
+    # 运行器退出后自动回收
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    preload()
+    sock.send(b'ready')
+
+    while True:
+        try:
+            message, fds, _, _ = socket.recv_fds(sock, MAX_REQUEST_SIZE, FD_COUNT)
+        except InterruptedError:
+            continue
+        if not message:
+            break  # 判题进程已关闭连接
+
+        if len(fds) != FD_COUNT:
+            for fd in fds:
+                os.close(fd)
+            continue
+
+        pid = os.fork()
+        if pid == 0:
+            sock.close()
+            run_request(json.loads(message), fds)
+        for fd in fds:
+            os.close(fd)
+
+
+if __name__ == '__main__':
+    main()
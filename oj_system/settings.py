@@ -189,10 +189,121 @@ LOGOUT_REDIRECT_URL = '/'
 # 判题系统配置
 JUDGE_DIR = BASE_DIR / 'judge_temp'
 
+# 测试数据存储（按内容哈希保存，数据库中只记录哈希和大小），可选 gzip 压缩
+TEST_DATA_DIR = os.environ.get('TEST_DATA_DIR', str(BASE_DIR / 'testdata'))
+TEST_DATA_COMPRESS = os.environ.get('TEST_DATA_COMPRESS', 'False').lower() == 'true'
+TEST_DATA_PREVIEW_SIZE = int(os.environ.get('TEST_DATA_PREVIEW_SIZE', '4096'))  # 预览字节数
+
 # 判题引擎配置
-JUDGE_ENGINE = os.environ.get('JUDGE_ENGINE', 'auto')  # auto, docker, sandbox, basic
+JUDGE_ENGINE = os.environ.get('JUDGE_ENGINE', 'auto')  # auto, docker, cgroup, sandbox, basic
 SANDBOX_ENABLED = os.environ.get('SANDBOX_ENABLED', 'True').lower() == 'true'
 
+# cgroup 引擎: 临时 cgroup 的父目录（为空时使用判题进程所在的 cgroup，需要可写），
+# 每次运行可使用的 CPU 核数和最大进程/线程数
+JUDGE_CGROUP_ROOT = os.environ.get('JUDGE_CGROUP_ROOT', '')
+JUDGE_CGROUP_CPUS = float(os.environ.get('JUDGE_CGROUP_CPUS', '1'))
+JUDGE_CGROUP_PIDS_MAX = int(os.environ.get('JUDGE_CGROUP_PIDS_MAX', '64'))
+
+# 语言配置缓存: 每隔 CHECK_INTERVAL 秒检查一次共享缓存中的版本号，最长 MAX_AGE 秒强制重新加载
+JUDGE_CONFIG_CACHE_CHECK_INTERVAL = float(os.environ.get('JUDGE_CONFIG_CACHE_CHECK_INTERVAL', '5'))
+JUDGE_CONFIG_CACHE_MAX_AGE = float(os.environ.get('JUDGE_CONFIG_CACHE_MAX_AGE', '60'))
+
+# 编译缓存配置（按 源码+语言+编译命令 缓存编译产物和编译错误）
+JUDGE_COMPILE_CACHE_ENABLED = os.environ.get('JUDGE_COMPILE_CACHE_ENABLED', 'True').lower() == 'true'
+JUDGE_COMPILE_CACHE_DIR = os.environ.get('JUDGE_COMPILE_CACHE_DIR', str(JUDGE_DIR / 'compile_cache'))
+JUDGE_COMPILE_CACHE_MAX_SIZE = int(os.environ.get('JUDGE_COMPILE_CACHE_MAX_SIZE', '1024'))  # MB
+
+# 判题工作区池: 源代码、编译产物和测试数据放在预先创建的工作区中，判完后清空复用。
+# POOL_SIZE 为每个判题进程保留的工作区数量，QUOTA 为每个工作区的大小限制(MB)，
+# MOUNT 为 auto 时以 root 运行则为每个工作区挂载独立的 tmpfs（由内核限制大小）。
+# 不能挂载时可以把 ROOT 显式设为足够大的 tmpfs（如 /dev/shm/oj-judge，容器默认的 /dev/shm 只有 64MB，
+# 需要配置 shm_size）；tmpfs 小于 QUOTA 时判题进程拒绝启动
+JUDGE_WORKSPACE_ROOT = os.environ.get('JUDGE_WORKSPACE_ROOT', str(JUDGE_DIR / 'workspaces'))
+JUDGE_WORKSPACE_POOL_SIZE = int(os.environ.get('JUDGE_WORKSPACE_POOL_SIZE', '2'))
+JUDGE_WORKSPACE_QUOTA = int(os.environ.get('JUDGE_WORKSPACE_QUOTA', '512'))
+JUDGE_WORKSPACE_MOUNT = os.environ.get('JUDGE_WORKSPACE_MOUNT', 'auto')  # auto, true, false
+
+# C/C++ 预编译头: 为常用头文件（逗号分隔）按编译器和编译参数生成 GCC 预编译头，
+# 源码以这些头文件开头时使用（编译器升级或编译命令修改后重新生成）
+JUDGE_PCH_ENABLED = os.environ.get('JUDGE_PCH_ENABLED', 'True').lower() == 'true'
+JUDGE_PCH_DIR = os.environ.get('JUDGE_PCH_DIR', str(JUDGE_DIR / 'pch'))
+JUDGE_PCH_HEADERS = os.environ.get('JUDGE_PCH_HEADERS', 'bits/stdc++.h')
+
+# Java: 为 JDK 常用类生成 AppCDS 归档以加快 JVM 启动（每台判题机生成一次，JDK 变化后重新生成），
+# JVM_OPTIONS 为每次运行附加的参数（面向短时间运行的进程），
+# MEMORY_OVERHEAD 为不计入内存限制的 JVM 自身开销(MB)，0 表示使用生成归档时测得的值
+JUDGE_JVM_CDS_ENABLED = os.environ.get('JUDGE_JVM_CDS_ENABLED', 'True').lower() == 'true'
+JUDGE_JVM_DIR = os.environ.get('JUDGE_JVM_DIR', str(JUDGE_DIR / 'jvm'))
+JUDGE_JVM_OPTIONS = os.environ.get('JUDGE_JVM_OPTIONS', '-XX:+UseSerialGC -XX:TieredStopAtLevel=1 -XX:-UsePerfData')
+JUDGE_JVM_MEMORY_OVERHEAD = int(os.environ.get('JUDGE_JVM_MEMORY_OVERHEAD', '0'))
+
+# 单个提交内测试用例的并发数（1 表示顺序执行）
+JUDGE_CASE_PARALLELISM = int(os.environ.get('JUDGE_CASE_PARALLELISM', '1'))
+
+# 沙箱引擎的 RLIMIT_AS = 内存限制 × 倍数；留出余量使超出内存限制的程序由峰值内存判为内存超限
+JUDGE_ADDRESS_SPACE_FACTOR = float(os.environ.get('JUDGE_ADDRESS_SPACE_FACTOR', '2.0'))
+
+# 墙钟时间限制 = max(CPU时间限制 × 倍数, CPU时间限制 + 1秒)，TLE 按 CPU 时间判定
+JUDGE_WALL_TIME_FACTOR = float(os.environ.get('JUDGE_WALL_TIME_FACTOR', '3.0'))
+
+# 输出限制: 题目未设置时的标准输出上限(MB)，以及每个测试用例保留的标准错误字节数
+JUDGE_DEFAULT_OUTPUT_LIMIT = int(os.environ.get('JUDGE_DEFAULT_OUTPUT_LIMIT', '64'))
+JUDGE_STDERR_LIMIT = int(os.environ.get('JUDGE_STDERR_LIMIT', str(64 * 1024)))
+
+# 判题结果中保存的用户输出预览字节数（完整输出写入临时文件并直接与标准答案文件比较）
+JUDGE_OUTPUT_PREVIEW_SIZE = int(os.environ.get('JUDGE_OUTPUT_PREVIEW_SIZE', '4096'))
+
+# 判题队列租约: 判题进程每隔 HEARTBEAT_INTERVAL 秒延长租约，租约过期（进程崩溃）的队列项重新入队，
+# 超过 MAX_ATTEMPTS 次后标记为失败
+JUDGE_QUEUE_LEASE_SECONDS = int(os.environ.get('JUDGE_QUEUE_LEASE_SECONDS', '60'))
+JUDGE_QUEUE_HEARTBEAT_INTERVAL = int(os.environ.get('JUDGE_QUEUE_HEARTBEAT_INTERVAL', '15'))
+JUDGE_QUEUE_MAX_ATTEMPTS = int(os.environ.get('JUDGE_QUEUE_MAX_ATTEMPTS', '3'))
+
+# 判题队列唤醒方式: auto（PostgreSQL 使用 LISTEN/NOTIFY，否则使用本机 Unix 套接字）、postgres、socket、none
+JUDGE_QUEUE_NOTIFY = os.environ.get('JUDGE_QUEUE_NOTIFY', 'auto')
+JUDGE_NOTIFY_DIR = os.environ.get('JUDGE_NOTIFY_DIR', str(JUDGE_DIR / 'notify'))
+
+# 判题队列调度: fair（按用户公平轮转、竞赛优先、短任务优先）或 fifo
+JUDGE_SCHEDULER = os.environ.get('JUDGE_SCHEDULER', 'fair')
+JUDGE_SCHEDULER_USER_MAX_INFLIGHT = int(os.environ.get('JUDGE_SCHEDULER_USER_MAX_INFLIGHT', '2'))  # 0 表示不限制；达到上限的用户排在其他用户之后
+JUDGE_SCHEDULER_MAX_WAIT = int(os.environ.get('JUDGE_SCHEDULER_MAX_WAIT', '120'))  # 秒，超过后优先调度
+JUDGE_SCHEDULER_USER_WINDOW = int(os.environ.get('JUDGE_SCHEDULER_USER_WINDOW', '5'))
+
+# 判题监督进程（judge_worker --processes）: 自动计算进程数时每个判题进程预留的内存(MB)，
+# 以及子进程处理多少个提交后重启（0 表示不重启）
+JUDGE_WORKER_MEMORY = int(os.environ.get('JUDGE_WORKER_MEMORY', '1024'))
+JUDGE_WORKER_MAX_SUBMISSIONS = int(os.environ.get('JUDGE_WORKER_MAX_SUBMISSIONS', '500'))
+
+# 异步判题进程（judge_worker --async）的流水线: 运行池并发数（0 表示按 CPU 数和内存自动计算）、
+# 编译池并发数（0 表示运行池的一半）、各阶段队列容量（0 表示与该阶段的并发数相同）、
+# 每批保存的结果数、执行数据库读写的线程数，以及各阶段指标写入日志的间隔（秒，0 表示不输出）
+JUDGE_ASYNC_CONCURRENCY = int(os.environ.get('JUDGE_ASYNC_CONCURRENCY', '0'))
+JUDGE_ASYNC_COMPILE_CONCURRENCY = int(os.environ.get('JUDGE_ASYNC_COMPILE_CONCURRENCY', '0'))
+JUDGE_ASYNC_QUEUE_SIZE = int(os.environ.get('JUDGE_ASYNC_QUEUE_SIZE', '0'))
+JUDGE_ASYNC_PERSIST_BATCH = int(os.environ.get('JUDGE_ASYNC_PERSIST_BATCH', '20'))
+JUDGE_ASYNC_DB_THREADS = int(os.environ.get('JUDGE_ASYNC_DB_THREADS', '2'))
+JUDGE_ASYNC_STATS_INTERVAL = int(os.environ.get('JUDGE_ASYNC_STATS_INTERVAL', '60'))
+
+# 运行准入控制: 同时运行的用户程序按 内存限制 × 内存限制倍数 + 运行时开销 预留内存、每个占用一个 CPU 槽位，
+# 放不下时等待。内存总量(MB) 和 CPU 槽位数为 0 时按主机可用内存的 80% 和可用 CPU 数计算
+# （监督进程模式下由各子进程平分）；语言并发上限格式为 "java:4,python:8"；
+# 等待超过 JUDGE_ADMISSION_MAX_WAIT 秒的运行不再被后来的运行插队
+JUDGE_ADMISSION_ENABLED = os.environ.get('JUDGE_ADMISSION_ENABLED', 'True').lower() == 'true'
+JUDGE_ADMISSION_MEMORY = int(os.environ.get('JUDGE_ADMISSION_MEMORY', '0'))
+JUDGE_ADMISSION_CPUS = int(os.environ.get('JUDGE_ADMISSION_CPUS', '0'))
+JUDGE_ADMISSION_LANGUAGE_LIMITS = os.environ.get('JUDGE_ADMISSION_LANGUAGE_LIMITS', '')
+JUDGE_ADMISSION_MAX_WAIT = int(os.environ.get('JUDGE_ADMISSION_MAX_WAIT', '5'))
+
+# CPU 绑定（需开启运行准入控制）: 每次运行独占一个判题 CPU；保留的 CPU（格式同 taskset，如 "0" 或 "0-1"）
+# 不分配给用户程序，留给判题进程本身（调度、编译、数据库读写），判题进程不绑定 CPU；SMT_EXCLUSIVE 开启时每个物理核心只用一个逻辑 CPU 判题，
+# 同核的超线程兄弟闲置。开启后 JUDGE_ADMISSION_CPUS 不再生效，CPU 槽位数等于判题 CPU 数
+JUDGE_CPU_PINNING = os.environ.get('JUDGE_CPU_PINNING', 'False').lower() == 'true'
+JUDGE_CPU_RESERVED = os.environ.get('JUDGE_CPU_RESERVED', '0')
+JUDGE_CPU_SMT_EXCLUSIVE = os.environ.get('JUDGE_CPU_SMT_EXCLUSIVE', 'False').lower() == 'true'
+
+# 默认判题策略: run_all（运行全部测试点）或 stop_on_failure（遇错即停），可被题目/竞赛设置覆盖
+JUDGE_DEFAULT_POLICY = os.environ.get('JUDGE_DEFAULT_POLICY', 'run_all')
+
 # Redis缓存配置
 if os.environ.get('REDIS_URL'):
     CACHES = {
@@ -1,3 +1,5 @@
+from django import forms
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from django.shortcuts import render
@@ -10,16 +12,68 @@ from django.utils.html import format_html
 from django.db.models import Count
 import json
 import csv
-from .models import Problem, ProblemTemplate, GlobalTemplate
+from .models import Problem, ProblemTemplate, GlobalTemplate, TestCase
 from .markdown_parser import parse_problem_markdown
 
 
+class TestCaseForm(forms.ModelForm):
+    """测试用例表单 - 文本或上传的文件写入测试数据存储"""
+    input = forms.CharField(label='输入数据', required=False, strip=False,
+                            widget=forms.Textarea(attrs={'rows': 3}))
+    output = forms.CharField(label='期望输出', required=False, strip=False,
+                             widget=forms.Textarea(attrs={'rows': 3}))
+    input_file = forms.FileField(label='输入文件', required=False, help_text='上传后忽略输入数据文本框')
+    output_file = forms.FileField(label='输出文件', required=False, help_text='上传后忽略期望输出文本框')
+
+    class Meta:
+        model = TestCase
+        fields = ('is_sample', 'order')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 较小的数据直接在文本框中编辑；较大的数据不回填，留空表示不修改
+        limit = getattr(settings, 'TEST_DATA_PREVIEW_SIZE', 4096)
+        if self.instance.pk:
+            for name, size, getter in (
+                ('input', self.instance.input_size, 'input_data'),
+                ('output', self.instance.output_size, 'expected_output'),
+            ):
+                if size <= limit:
+                    self.initial[name] = getattr(self.instance, getter)
+                else:
+                    self.fields[name].help_text = f'数据较大（{size} 字节），留空表示不修改'
+
+    def save(self, commit=True):
+        test_case = super().save(commit=False)
+        is_new = test_case.pk is None
+        if self.cleaned_data.get('input_file'):
+            test_case.set_input_file(self.cleaned_data['input_file'])
+        elif is_new or 'input' in self.changed_data:
+            test_case.input_data = self.cleaned_data.get('input', '')
+        if self.cleaned_data.get('output_file'):
+            test_case.set_output_file(self.cleaned_data['output_file'])
+        elif is_new or 'output' in self.changed_data:
+            test_case.expected_output = self.cleaned_data.get('output', '')
+        if commit:
+            test_case.save()
+        return test_case
+
+
+class TestCaseInline(admin.StackedInline):
+    model = TestCase
+    form = TestCaseForm
+    extra = 0
+    readonly_fields = ('input_size', 'output_size')
+    fields = ('order', 'is_sample', 'input', 'input_file', 'output', 'output_file', 'input_size', 'output_size')
+
+
 @admin.register(Problem)
 class ProblemAdmin(admin.ModelAdmin):
     list_display = ('title', 'difficulty', 'is_public', 'author', 'created_at')
     list_filter = ('difficulty', 'is_public', 'created_at')
     search_fields = ('title', 'author__username')
     readonly_fields = ('created_at', 'updated_at')
+    inlines = [TestCaseInline]
     
     fieldsets = (
         ('基本信息', {
@@ -29,7 +83,7 @@ class ProblemAdmin(admin.ModelAdmin):
             'fields': ('input_format', 'output_format', 'sample_input', 'sample_output', 'hint')
         }),
         ('限制条件', {
-            'fields': ('time_limit', 'memory_limit', 'difficulty')
+            'fields': ('time_limit', 'memory_limit', 'output_limit', 'difficulty', 'judge_policy')
         }),
         ('分类标签', {
             'fields': ('category', 'tags')
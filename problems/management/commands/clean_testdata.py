@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from problems.models import TestCase
+from problems.testdata import get_test_data_store
+
+
+class Command(BaseCommand):
+    help = '删除测试数据存储中不再被任何测试用例引用的数据'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=float,
+            default=24,
+            help='只删除超过指定小时数未修改的数据（默认24小时）'
+        )
+
+    def handle(self, *args, **options):
+        referenced = set()
+        for input_hash, output_hash in TestCase.objects.values_list('input_hash', 'output_hash').iterator():
+            referenced.add(input_hash)
+            referenced.add(output_hash)
+
+        removed = get_test_data_store().remove_unreferenced(referenced, options['min_age'] * 3600)
+        self.stdout.write(self.style.SUCCESS(f'已删除 {removed} 个未引用的测试数据'))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-17 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0003_category_tag_alter_globaltemplate_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='judge_policy',
+            field=models.CharField(choices=[('default', '跟随竞赛/系统设置'), ('run_all', '运行全部测试点（OI）'), ('stop_on_failure', '遇错即停（ACM）')], default='default', max_length=20, verbose_name='判题策略'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-17 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0004_problem_judge_policy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='output_limit',
+            field=models.PositiveIntegerField(default=64, verbose_name='输出限制(MB)'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.24 on 2026-10-17 19:05
+
+from django.db import migrations, models
+
+
+def move_test_data_to_store(apps, schema_editor):
+    """把已有测试用例的输入和期望输出写入测试数据存储"""
+    from problems.testdata import get_test_data_store
+
+    store = get_test_data_store()
+    TestCase = apps.get_model('problems', 'TestCase')
+    for test_case in TestCase.objects.only('id', 'input_data', 'expected_output').iterator(chunk_size=100):
+        test_case.input_hash, test_case.input_size = store.put_text(test_case.input_data)
+        test_case.output_hash, test_case.output_size = store.put_text(test_case.expected_output)
+        test_case.save(update_fields=['input_hash', 'input_size', 'output_hash', 'output_size'])
+
+
+def restore_test_data_from_store(apps, schema_editor):
+    """回滚: 从测试数据存储读回文本字段"""
+    from problems.testdata import get_test_data_store
+
+    store = get_test_data_store()
+    TestCase = apps.get_model('problems', 'TestCase')
+    for test_case in TestCase.objects.only('id', 'input_hash', 'output_hash').iterator(chunk_size=100):
+        test_case.input_data = store.read_text(test_case.input_hash)
+        test_case.expected_output = store.read_text(test_case.output_hash)
+        test_case.save(update_fields=['input_data', 'expected_output'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0005_problem_output_limit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testcase',
+            name='input_hash',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='输入数据哈希'),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='input_size',
+            field=models.BigIntegerField(default=0, verbose_name='输入数据大小(字节)'),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='output_hash',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='期望输出哈希'),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='output_size',
+            field=models.BigIntegerField(default=0, verbose_name='期望输出大小(字节)'),
+        ),
+        # 回滚时重新添加的文本字段需要默认值
+        migrations.AlterField(
+            model_name='testcase',
+            name='input_data',
+            field=models.TextField(default='', verbose_name='输入数据'),
+        ),
+        migrations.AlterField(
+            model_name='testcase',
+            name='expected_output',
+            field=models.TextField(default='', verbose_name='期望输出'),
+        ),
+        migrations.RunPython(move_test_data_to_store, restore_test_data_from_store),
+        migrations.RemoveField(
+            model_name='testcase',
+            name='input_data',
+        ),
+        migrations.RemoveField(
+            model_name='testcase',
+            name='expected_output',
+        ),
+    ]
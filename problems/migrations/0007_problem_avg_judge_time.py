@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-17 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0006_testcase_test_data_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='avg_judge_time',
+            field=models.PositiveIntegerField(default=0, verbose_name='平均判题耗时(ms)'),
+        ),
+    ]
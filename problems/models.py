@@ -1,5 +1,7 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
+from .testdata import get_test_data_store
 
 User = get_user_model()
 
@@ -42,6 +44,12 @@ class Problem(models.Model):
         ('hard', '困难'),
     ]
 
+    JUDGE_POLICY_CHOICES = [
+        ('default', '跟随竞赛/系统设置'),
+        ('run_all', '运行全部测试点（OI）'),
+        ('stop_on_failure', '遇错即停（ACM）'),
+    ]
+
     title = models.CharField(max_length=200, verbose_name='题目标题')
     description = models.TextField(verbose_name='题目描述')
     input_format = models.TextField(verbose_name='输入格式')
@@ -51,13 +59,16 @@ class Problem(models.Model):
     hint = models.TextField(blank=True, verbose_name='提示')
     time_limit = models.PositiveIntegerField(default=1000, verbose_name='时间限制(ms)')
     memory_limit = models.PositiveIntegerField(default=256, verbose_name='内存限制(MB)')
+    output_limit = models.PositiveIntegerField(default=64, verbose_name='输出限制(MB)')
     difficulty = models.CharField(max_length=10, choices=DIFFICULTY_CHOICES, default='easy', verbose_name='难度')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='分类')
     tags = models.ManyToManyField(Tag, blank=True, verbose_name='标签')
     author = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='作者', null=True, blank=True)
     is_public = models.BooleanField(default=True, verbose_name='是否公开')
+    judge_policy = models.CharField(max_length=20, choices=JUDGE_POLICY_CHOICES, default='default', verbose_name='判题策略')
     total_submissions = models.PositiveIntegerField(default=0, verbose_name='总提交数')
     accepted_submissions = models.PositiveIntegerField(default=0, verbose_name='通过提交数')
+    avg_judge_time = models.PositiveIntegerField(default=0, verbose_name='平均判题耗时(ms)')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
 
@@ -78,10 +89,12 @@ class Problem(models.Model):
 
 
 class TestCase(models.Model):
-    """测试用例"""
+    """测试用例（输入和期望输出保存在测试数据存储中，这里只记录哈希和大小）"""
     problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='test_cases', verbose_name='题目')
-    input_data = models.TextField(verbose_name='输入数据')
-    expected_output = models.TextField(verbose_name='期望输出')
+    input_hash = models.CharField(max_length=64, blank=True, default='', verbose_name='输入数据哈希')
+    input_size = models.BigIntegerField(default=0, verbose_name='输入数据大小(字节)')
+    output_hash = models.CharField(max_length=64, blank=True, default='', verbose_name='期望输出哈希')
+    output_size = models.BigIntegerField(default=0, verbose_name='期望输出大小(字节)')
     is_sample = models.BooleanField(default=False, verbose_name='是否为样例')
     order = models.PositiveIntegerField(default=0, verbose_name='顺序')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
@@ -94,6 +107,46 @@ class TestCase(models.Model):
     def __str__(self):
         return f"{self.problem.title} - 测试用例 {self.order}"
 
+    @property
+    def input_data(self) -> str:
+        """完整的输入数据（大数据请使用预览或直接读取测试数据存储）"""
+        return get_test_data_store().read_text(self.input_hash)
+
+    @input_data.setter
+    def input_data(self, value: str):
+        self.input_hash, self.input_size = get_test_data_store().put_text(value)
+
+    @property
+    def expected_output(self) -> str:
+        """完整的期望输出"""
+        return get_test_data_store().read_text(self.output_hash)
+
+    @expected_output.setter
+    def expected_output(self, value: str):
+        self.output_hash, self.output_size = get_test_data_store().put_text(value)
+
+    def set_input_file(self, stream):
+        """从二进制流（如上传文件）保存输入数据"""
+        self.input_hash, self.input_size = get_test_data_store().put_stream(stream)
+
+    def set_output_file(self, stream):
+        """从二进制流保存期望输出"""
+        self.output_hash, self.output_size = get_test_data_store().put_stream(stream)
+
+    def get_input_preview(self) -> str:
+        """输入数据预览（最多 TEST_DATA_PREVIEW_SIZE 字节）"""
+        return _preview(self.input_hash, self.input_size)
+
+    def get_output_preview(self) -> str:
+        """期望输出预览"""
+        return _preview(self.output_hash, self.output_size)
+
+
+def _preview(data_hash: str, size: int) -> str:
+    limit = getattr(settings, 'TEST_DATA_PREVIEW_SIZE', 4096)
+    text = get_test_data_store().read_text(data_hash, limit)
+    return text + '\n...' if size > limit else text
+
 
 class GlobalTemplate(models.Model):
     """全局代码模板"""
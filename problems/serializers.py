@@ -15,9 +15,13 @@ class TagSerializer(serializers.ModelSerializer):
 
 
 class TestCaseSerializer(serializers.ModelSerializer):
+    # 测试数据保存在测试数据存储中，这里只返回预览，完整大小见 input_size/output_size
+    input_data = serializers.CharField(source='get_input_preview', read_only=True)
+    expected_output = serializers.CharField(source='get_output_preview', read_only=True)
+    
     class Meta:
         model = TestCase
-        fields = ['id', 'input_data', 'expected_output', 'is_sample', 'order']
+        fields = ['id', 'input_data', 'expected_output', 'input_size', 'output_size', 'is_sample', 'order']
 
 
 class GlobalTemplateSerializer(serializers.ModelSerializer):
@@ -67,7 +71,7 @@ class ProblemDetailSerializer(serializers.ModelSerializer):
         model = Problem
         fields = ['id', 'title', 'description', 'input_format', 'output_format',
                  'sample_input', 'sample_output', 'hint', 'time_limit', 
-                 'memory_limit', 'difficulty', 'category', 'tags', 'author',
+                 'memory_limit', 'output_limit', 'difficulty', 'judge_policy', 'category', 'tags', 'author',
                  'total_submissions', 'accepted_submissions', 'acceptance_rate',
                  'test_cases', 'templates', 'created_at', 'updated_at']
 
@@ -77,7 +81,7 @@ class ProblemCreateSerializer(serializers.ModelSerializer):
         model = Problem
         fields = ['title', 'description', 'input_format', 'output_format',
                  'sample_input', 'sample_output', 'hint', 'time_limit',
-                 'memory_limit', 'difficulty', 'category', 'tags', 'is_public']
+                 'memory_limit', 'output_limit', 'difficulty', 'judge_policy', 'category', 'tags', 'is_public']
     
     def create(self, validated_data):
         validated_data['author'] = self.context['request'].user
@@ -0,0 +1,187 @@
+"""
+测试数据存储 - 以内容的 SHA-256 为键保存在磁盘上，数据库中只保存哈希和大小
+
+目录结构:
+    <TEST_DATA_DIR>/<hash[:2]>/<hash>       未压缩的数据
+    <TEST_DATA_DIR>/<hash[:2]>/<hash>.gz    gzip 压缩的数据（TEST_DATA_COMPRESS 开启时写入）
+
+哈希始终按未压缩的内容计算，压缩与否不影响引用。写入时先写临时文件再原子 rename，
+相同内容只保存一份。判题时未压缩的数据直接作为标准输入文件使用，压缩的数据先解压到判题临时目录。
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from typing import BinaryIO, Iterable, Optional, Set, Tuple
+from django.conf import settings
+
+CHUNK_SIZE = 1024 * 1024
+GZIP_SUFFIX = '.gz'
+
+
+class TestDataStore:
+    """内容寻址的测试数据存储"""
+
+    def __init__(self, root: Optional[str] = None, compress: Optional[bool] = None):
+        self.root = str(root or getattr(settings, 'TEST_DATA_DIR', os.path.join(settings.BASE_DIR, 'testdata')))
+        if compress is None:
+            compress = getattr(settings, 'TEST_DATA_COMPRESS', False)
+        self.compress = compress
+
+    def _blob_path(self, data_hash: str) -> str:
+        return os.path.join(self.root, data_hash[:2], data_hash)
+
+    def find(self, data_hash: str) -> Optional[Tuple[str, bool]]:
+        """
+        查找数据文件
+        返回: (文件路径, 是否压缩)，不存在时返回 None
+        """
+        path = self._blob_path(data_hash)
+        if os.path.exists(path):
+            return path, False
+        if os.path.exists(path + GZIP_SUFFIX):
+            return path + GZIP_SUFFIX, True
+        return None
+
+    def exists(self, data_hash: str) -> bool:
+        return self.find(data_hash) is not None
+
+    def put_stream(self, stream: BinaryIO) -> Tuple[str, int]:
+        """
+        分块读取二进制流并保存
+        返回: (哈希, 未压缩大小)
+        """
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(prefix='.tmp-', dir=self.root)
+        try:
+            with os.fdopen(fd, 'wb') as raw:
+                out = gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) if self.compress else raw
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    out.write(chunk)
+                if out is not raw:
+                    out.close()
+
+            data_hash = digest.hexdigest()
+            found = self.find(data_hash)
+            if found is not None:
+                # 已有相同内容，更新修改时间以免被 clean_testdata 当作陈旧数据删除
+                os.remove(temp_path)
+                os.utime(found[0])
+            else:
+                target = self._blob_path(data_hash) + (GZIP_SUFFIX if self.compress else '')
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.chmod(temp_path, 0o644)
+                os.replace(temp_path, target)
+            return data_hash, size
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def put_text(self, text: str) -> Tuple[str, int]:
+        """保存文本（UTF-8 编码），返回: (哈希, 字节数)"""
+        return self.put_stream(_TextReader(text or ''))
+
+    def open(self, data_hash: str) -> BinaryIO:
+        """以二进制流打开数据（自动解压）"""
+        found = self.find(data_hash)
+        if found is None:
+            raise FileNotFoundError(f'测试数据不存在: {data_hash}')
+        path, compressed = found
+        return gzip.open(path, 'rb') if compressed else open(path, 'rb')
+
+    def local_path(self, data_hash: str, temp_dir: str) -> str:
+        """
+        获取可直接打开的未压缩文件路径
+        未压缩的数据直接返回存储中的文件；压缩的数据解压到 temp_dir 中（由调用方清理）
+        """
+        found = self.find(data_hash)
+        if found is None:
+            raise FileNotFoundError(f'测试数据不存在: {data_hash}')
+        path, compressed = found
+        if not compressed:
+            return path
+
+        fd, temp_path = tempfile.mkstemp(prefix=data_hash[:16] + '-', dir=temp_dir)
+        with os.fdopen(fd, 'wb') as out, gzip.open(path, 'rb') as src:
+            shutil.copyfileobj(src, out, CHUNK_SIZE)
+        return temp_path
+
+    def read_text(self, data_hash: str, limit: Optional[int] = None) -> str:
+        """读取文本，指定 limit 时最多读取 limit 字节"""
+        if not data_hash:
+            return ''
+        try:
+            with self.open(data_hash) as f:
+                data = f.read() if limit is None else f.read(limit)
+        except FileNotFoundError:
+            return ''
+        return data.decode('utf-8', errors='ignore' if limit is not None else 'replace')
+
+    def iter_hashes(self) -> Iterable[str]:
+        """遍历存储中的全部哈希"""
+        if not os.path.isdir(self.root):
+            return
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if shard.startswith('.') or not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                yield name[:-len(GZIP_SUFFIX)] if name.endswith(GZIP_SUFFIX) else name
+
+    def remove(self, data_hash: str):
+        """删除数据（压缩和未压缩的副本）"""
+        path = self._blob_path(data_hash)
+        for candidate in (path, path + GZIP_SUFFIX):
+            try:
+                os.remove(candidate)
+            except FileNotFoundError:
+                pass
+
+    def remove_unreferenced(self, referenced: Set[str], min_age: float = 0) -> int:
+        """
+        删除未被引用的数据，返回删除的数量
+        min_age: 只删除修改时间早于 min_age 秒之前的文件，避免误删刚写入、尚未保存到数据库的数据
+        """
+        removed = 0
+        now = time.time()
+        for data_hash in list(self.iter_hashes()):
+            if data_hash in referenced:
+                continue
+            found = self.find(data_hash)
+            if found is None or now - os.path.getmtime(found[0]) < min_age:
+                continue
+            self.remove(data_hash)
+            removed += 1
+        return removed
+
+
+class _TextReader:
+    """把 str 按块编码为 UTF-8 的只读流，避免生成整段文本的 bytes 副本"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.position = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if self.position >= len(self.text):
+            return b''
+        # 按字符切分，一个字符最多 4 个字节
+        count = len(self.text) - self.position if size < 0 else max(1, size // 4)
+        chunk = self.text[self.position:self.position + count]
+        self.position += len(chunk)
+        return chunk.encode('utf-8')
+
+
+def get_test_data_store() -> TestDataStore:
+    """按配置创建测试数据存储"""
+    return TestDataStore()
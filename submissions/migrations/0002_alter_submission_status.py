@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-17 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='submission',
+            name='status',
+            field=models.CharField(choices=[('pending', '等待中'), ('judging', '评测中'), ('accepted', '通过'), ('wrong_answer', '答案错误'), ('time_limit_exceeded', '超时'), ('memory_limit_exceeded', '内存超限'), ('output_limit_exceeded', '输出超限'), ('runtime_error', '运行时错误'), ('compile_error', '编译错误'), ('system_error', '系统错误')], default='pending', max_length=25, verbose_name='状态'),
+        ),
+    ]
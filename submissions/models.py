@@ -20,6 +20,7 @@ class Submission(models.Model):
         ('wrong_answer', '答案错误'),
         ('time_limit_exceeded', '超时'),
         ('memory_limit_exceeded', '内存超限'),
+        ('output_limit_exceeded', '输出超限'),
         ('runtime_error', '运行时错误'),
         ('compile_error', '编译错误'),
         ('system_error', '系统错误'),